@@ -1,16 +1,18 @@
 from django_filters import rest_framework as filters
+from common.filters import TrigramSimilarityFilter
 from user import models as user_model
 from blog import models
 
 
 class BasePostFilter(filters.FilterSet):
     title = filters.CharFilter(lookup_expr='icontains', label='title')
+    fuzzy_title = TrigramSimilarityFilter(field_name='title', label='fuzzy title')
     date_create = filters.DateFromToRangeFilter(label='time of writing')
     date_change = filters.DateFromToRangeFilter(label='time of change')
 
     class Meta:
         model = models.Post
-        fields = ('title', 'date_create', 'date_change')
+        fields = ('title', 'fuzzy_title', 'date_create', 'date_change')
 
 
 class AnyPostFilter(BasePostFilter):
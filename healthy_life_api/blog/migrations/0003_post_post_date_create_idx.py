@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['date_create', 'id'], name='post_date_create_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:28
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_post_date_create_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='post_title_trgm_idx', opclasses=('gin_trgm_ops',)),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from healthy_life_api.settings import AUTH_USER_MODEL
+from django.contrib.postgres.indexes import GinIndex
 from common.models import IMessage
 from pharmacy.models import Goods
 from django.db.models import Q
@@ -13,6 +14,10 @@ class StatusRecord(models.IntegerChoices):
 
 class Post(models.Model):
     class Meta:
+        indexes = [
+            models.Index(fields=('date_create', 'id',), name='post_date_create_idx'),
+            GinIndex(fields=('title',), name='post_title_trgm_idx', opclasses=('gin_trgm_ops',)),
+        ]
         verbose_name = 'post'
         verbose_name_plural = 'posts'
 
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from rest_framework.test import APITestCase
+from user.models import User
+from blog import models
 
-# Create your tests here.
+
+class PostFuzzySearchTest(APITestCase):
+    def setUp(self):
+        self.blogger = User.objects.create(username='blogger', email='blogger@mail.com')
+
+        # info! самое похожее название создается первым, чтобы сортировка по дате дала обратный порядок
+        for title in ('paracetamol dosage', 'paracetamol dosage for children', 'paracetamol and coffee'):
+            models.Post.objects.create(title=title, wrote=self.blogger, text='text',
+                                       status=models.StatusRecord.PUBLISHED)
+
+    def _titles(self, url):
+        response = self.client.get(url, {'fuzzy_title': 'paracetamol dossage'})
+
+        self.assertEqual(response.status_code, 200)
+
+        return [post['title'] for post in response.data['results']]
+
+    def test_misspelled_title_is_ordered_by_similarity(self):
+        expected = ['paracetamol dosage', 'paracetamol dosage for children', 'paracetamol and coffee']
+
+        self.assertEqual(self._titles('/api/v1/blog/posts/'), expected)
+        self.assertEqual(self._titles(f'/api/v1/blog/blogger/{self.blogger.username}/'), expected)
+
+    def test_posts_without_fuzzy_title_are_ordered_by_date(self):
+        response = self.client.get('/api/v1/blog/posts/')
+
+        self.assertEqual([post['title'] for post in response.data['results']],
+                         ['paracetamol and coffee', 'paracetamol dosage for children', 'paracetamol dosage'])
+
+    def test_post_lists_are_validated_by_etag_only(self):
+        for url, title in (('/api/v1/blog/posts/', 'paracetamol and coffee'),
+                           (f'/api/v1/blog/blogger/{self.blogger.username}/', 'paracetamol dosage')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+
+                self.assertIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+                models.Post.objects.filter(title=title).delete()
+
+                self.assertNotEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
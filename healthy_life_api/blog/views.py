@@ -4,7 +4,8 @@ from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import generics, viewsets, status
 from blog import serializers, models, filters
 from rest_framework.response import Response
-from common import models as common_models
+from common import models as common_models, conditional
+from common.filters import order_by_default
 from django.db import models as dj_models
 from user import models as user_models
 from django.db import IntegrityError
@@ -18,15 +19,23 @@ class PostListAPIView(generics.ListAPIView):
 
     def list(self, request, *args, **kwargs):
         me = request.user
-        queryset = self.get_queryset()
+        queryset = order_by_default(self.filter_queryset(self.get_queryset()), '-date_create')
 
         if me.is_authenticated and not me.settings_fk.display_bloggers_in_blacklisted:
             blacklist_ids = user_models.BlackList.objects.filter(user_black_list=me).values('in_black_list')
             queryset = queryset.filter(~dj_models.Q(wrote__in=blacklist_ids))
 
-        serializer = self.get_serializer(queryset, many=True)
+        state = queryset.aggregate(last_change=dj_models.Max('date_change'), total=dj_models.Count('pk'))
+        etag = conditional.make_etag(request.build_absolute_uri(), me.pk, state['last_change'], state['total'])
+        not_modified = conditional.get_not_modified(request, 'post_list', etag)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if not_modified is not None:
+            return not_modified
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+
+        return conditional.set_validators(self.get_paginated_response(serializer.data), etag)
 
 
 class BloggerViewSet(viewsets.ModelViewSet):
@@ -65,10 +74,20 @@ class BloggerViewSet(viewsets.ModelViewSet):
         except ObjectDoesNotExist:
             return Response({'detail': 'blogger not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        queryset = self.get_queryset_blogger(request, blogger_username).filter(wrote=blogger)
-        serializer = self.get_serializer(queryset, many=True)
+        queryset = order_by_default(self.filter_queryset(self.get_queryset_blogger(request, blogger_username))
+                                    .filter(wrote=blogger), '-date_create')
+        state = queryset.aggregate(last_change=dj_models.Max('date_change'), total=dj_models.Count('pk'))
+        etag = conditional.make_etag(request.build_absolute_uri(), request.user.pk,
+                                     state['last_change'], state['total'])
+        not_modified = conditional.get_not_modified(request, 'blogger_post_list', etag)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if not_modified is not None:
+            return not_modified
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+
+        return conditional.set_validators(self.get_paginated_response(serializer.data), etag)
 
     def retrieve(self, request, *args, **kwargs):
         title_post = kwargs.get('title', None)
@@ -83,9 +102,15 @@ class BloggerViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'you can\'t view someone else\'s post that is in draft'},
                             status=status.HTTP_403_FORBIDDEN)
 
+        etag = conditional.make_etag(post.pk, post.date_change)
+        not_modified = conditional.get_not_modified(request, 'post_detail', etag, post.date_change)
+
+        if not_modified is not None:
+            return not_modified
+
         serializer = self.get_serializer(post)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional.set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, post.date_change)
 
     def create(self, request, *args, **kwargs):
         serializer = serializers.PostSerializer(data=request.data)
@@ -165,9 +190,10 @@ class GoodsPostViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         goods_post = self.get_queryset().filter(post_with_goods=post)
-        serializer = self.get_serializer(goods_post, many=True)
+        page = self.paginate_queryset(goods_post)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         title_post = kwargs.get('title', None)
@@ -243,9 +269,10 @@ class PostCommentViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         queryset = self.get_queryset().filter(comment_in_post=post)
-        serializer = self.get_serializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         pk = kwargs.get('pk', None)
@@ -336,9 +363,10 @@ class MySubscriptionsAPIView(generics.ListAPIView):
         me = request.user
 
         queryset = self.get_queryset().filter(subscriber=me)
-        serializer = self.get_serializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
 
 class SubscriberViewSet(viewsets.ModelViewSet):
@@ -358,9 +386,10 @@ class SubscriberViewSet(viewsets.ModelViewSet):
         queryset = (self.get_queryset().select_related('subscriber__settings_fk')
                     .filter(dj_models.Q(blogger=blogger) &
                             dj_models.Q(subscriber__settings_fk__hide_yourself_subscriptions=False)))
-        serializer = self.get_serializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         username_blogger = kwargs.get('username', None)
@@ -0,0 +1,73 @@
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.core.cache import cache
+import hashlib
+
+
+# info! имена точек, для которых собирается статистика условных запросов (команда conditionalstats)
+ENDPOINTS = (
+    'goods_list',
+    'goods_detail',
+    'goods_facets',
+    'post_list',
+    'blogger_post_list',
+    'post_detail',
+    'notification_list',
+    'notification_detail',
+)
+
+METRIC_KEY = 'conditional:{endpoint}:{metric}'
+METRICS = ('requests', 'conditional', 'not_modified',)
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+# info! ответ 304 собирается до сериализации, вызывающему коду достаточно посчитать etag.
+#  last_modified стоит передавать только если он меняется при любом изменении ответа (не подходит для списков с удалением)
+def get_not_modified(request, endpoint, etag, last_modified=None):
+    conditional = 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=int(last_modified.timestamp()) if last_modified else None)
+
+    _incr(endpoint, 'requests')
+
+    if conditional:
+        _incr(endpoint, 'conditional')
+
+    if response is not None:
+        _incr(endpoint, 'not_modified')
+        set_validators(response, etag, last_modified)
+
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+
+    return response
+
+
+def get_metrics(endpoint):
+    values = cache.get_many([METRIC_KEY.format(endpoint=endpoint, metric=metric) for metric in METRICS])
+
+    return {metric: values.get(METRIC_KEY.format(endpoint=endpoint, metric=metric), 0) for metric in METRICS}
+
+
+def reset_metrics():
+    cache.delete_many([METRIC_KEY.format(endpoint=endpoint, metric=metric)
+                       for endpoint in ENDPOINTS for metric in METRICS])
+
+
+def _incr(endpoint, metric):
+    key = METRIC_KEY.format(endpoint=endpoint, metric=metric)
+
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
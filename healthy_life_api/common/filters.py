@@ -0,0 +1,24 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django_filters import rest_framework as filters
+from django.db.models.functions import Cast
+from django.db.models import FloatField
+
+
+# info! упорядочивание по умолчанию, если фильтры не задали свое (по релевантности)
+def order_by_default(queryset, *ordering):
+    return queryset if queryset.query.order_by else queryset.order_by(*ordering)
+
+
+# info! нечеткий поиск по триграммам, порог похожести задается settings.TRIGRAM_SIMILARITY_THRESHOLD.
+#  Оператор % использует GIN индекс с gin_trgm_ops, результаты упорядочены по похожести,
+#  если другой фильтр уже не упорядочил их по своей релевантности
+class TrigramSimilarityFilter(filters.CharFilter):
+    def filter(self, qs, value):
+        if not value:
+            return qs
+
+        # info! similarity возвращает real, приведение к double нужно для точного сравнения в курсоре пагинации
+        qs = (qs.filter(**{f'{self.field_name}__trigram_similar': value})
+              .annotate(similarity=Cast(TrigramSimilarity(self.field_name, value), output_field=FloatField())))
+
+        return order_by_default(qs, '-similarity')
@@ -0,0 +1,140 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.response import Response
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from django.utils import timezone
+from django.conf import settings
+from common import models
+import functools
+import datetime
+import hashlib
+import json
+
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+
+
+def get_ttl():
+    return datetime.timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def get_lease():
+    return datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE_SECONDS)
+
+
+# info! ответ хранится до конца TTL, незавершенный запрос держит ключ только на срок аренды
+def _is_active(stored):
+    lifetime = get_ttl() if stored.status_code is not None else get_lease()
+
+    return stored.date_create > timezone.now() - lifetime
+
+
+def make_fingerprint(request):
+    payload = json.dumps((request.method, request.get_full_path(), request.data), sort_keys=True, cls=DjangoJSONEncoder)
+
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# info! повтор запроса с тем же Idempotency-Key получает сохраненный ответ, метод при этом не выполняется.
+#  Ключи действуют в пределах пользователя, без входа заголовок не учитывается.
+#  Ответы 5xx и исключения не сохраняются, такой запрос можно повторить с тем же ключом
+def idempotent(view_method):
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = make_fingerprint(request)
+        stored = _claim(request.user, key, fingerprint)
+
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            _release(request.user, key)
+            raise
+
+        if response.status_code >= 500 or not isinstance(response, Response):
+            _release(request.user, key)
+        else:
+            (models.IdempotencyKey.objects
+             .filter(user=request.user, key=key)
+             .update(status_code=response.status_code,
+                     response=json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))))
+
+        return response
+
+    return wrapper
+
+
+# info! возвращает уже существующую запись или None, если ключ занят текущим запросом.
+#  Просроченная запись, которую еще не удалила clearidempotencykeys, и брошенная упавшим процессом
+#  незавершенная запись занимаются заново
+def _claim(user, key, fingerprint):
+    stored = models.IdempotencyKey.objects.filter(user=user, key=key).first()
+
+    if stored is not None and _is_active(stored):
+        return stored
+
+    try:
+        with transaction.atomic():
+            models.IdempotencyKey.objects.create(user=user, key=key, fingerprint=fingerprint)
+            return None
+    except IntegrityError:
+        pass
+
+    with transaction.atomic():
+        stored = models.IdempotencyKey.objects.select_for_update().filter(user=user, key=key).first()
+
+        if stored is None:
+            models.IdempotencyKey.objects.create(user=user, key=key, fingerprint=fingerprint)
+            return None
+
+        if _is_active(stored):
+            return stored
+
+        stored.fingerprint = fingerprint
+        stored.status_code = None
+        stored.response = None
+        stored.date_create = timezone.now()
+        stored.save()
+
+    return None
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return Response({'detail': 'Idempotency-Key has already been used with a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    if stored.status_code is None:
+        return Response({'detail': 'a request with this Idempotency-Key is still in progress'},
+                        status=status.HTTP_409_CONFLICT)
+
+    response = Response(stored.response, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+
+    return response
+
+
+def _release(user, key):
+    models.IdempotencyKey.objects.filter(user=user, key=key).delete()
+
+
+def clear_expired(batch_size=10_000):
+    deleted = 0
+    expired = models.IdempotencyKey.objects.filter(date_create__lt=timezone.now() - get_ttl())
+
+    while batch := list(expired.values_list('pk', flat=True)[:batch_size]):
+        deleted += models.IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+
+    return deleted
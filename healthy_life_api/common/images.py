@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.db.models.signals import post_init, post_save
+from django.core.files.base import ContentFile
+from django.dispatch import Signal
+from django.db import transaction
+from django.conf import settings
+from PIL import Image, ImageOps
+import multiprocessing
+import logging
+import io
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# info! варианты изображения: (наибольшая сторона, формат, окончание имени файла)
+VARIANTS = {
+    'thumbnail': (128, 'JPEG', '.thumbnail.jpg'),
+    'medium': (640, 'JPEG', '.medium.jpg'),
+    'webp': (1280, 'WEBP', '.webp'),
+}
+
+# info! отправляется после создания вариантов, например чтобы сбросить закешированные ответы со ссылками
+variants_ready = Signal()
+
+_registry = {}
+_executor = None
+
+
+def variant_name(name, variant):
+    directory, file_name = os.path.split(name)
+    stem = os.path.splitext(file_name)[0]
+
+    return os.path.join(directory, 'variants', f'{stem}{VARIANTS[variant][2]}')
+
+
+def get_variant_urls(field_file):
+    if not field_file:
+        return None
+
+    storage = field_file.storage
+    urls = {'original': field_file.url}
+
+    # info! ссылки строятся по имени без обращения к хранилищу: варианты создаются в фоне в первые секунды
+    #  после загрузки, до этого клиент показывает исходное изображение
+    for variant in VARIANTS:
+        urls[variant] = storage.url(variant_name(field_file.name, variant))
+
+    return urls
+
+
+# info! выполняется в отдельном процессе без настроенного django, поэтому получает и возвращает только байты
+def render_variants(content):
+    rendered = {}
+
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+
+        for variant, (max_side, image_format, _) in VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+            if image_format == 'JPEG' and resized.mode != 'RGB':
+                background = Image.new('RGB', resized.size, 'white')
+                background.paste(resized, mask=resized.convert('RGBA').getchannel('A'))
+                resized = background
+
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=82, optimize=True)
+            rendered[variant] = buffer.getvalue()
+
+    return rendered
+
+
+def get_executor():
+    global _executor
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+
+    return _executor
+
+
+# info! проверяет хранилище по каждому варианту, используется только командой buildimagevariants
+def needs_variants(field_file):
+    return bool(field_file) and not all(field_file.storage.exists(variant_name(field_file.name, variant))
+                                        for variant in VARIANTS)
+
+
+# info! обработка идет в пуле процессов после фиксации транзакции, запрос не ждет пересжатия
+def schedule_variants(field_file):
+    model = type(field_file.instance)
+    transaction.on_commit(lambda: submit_variants(model, field_file))
+
+
+# info! файлы читаются и записываются через хранилище поля, поэтому работает и с нелокальными хранилищами
+def submit_variants(model, field_file):
+    storage, name = field_file.storage, field_file.name
+
+    with storage.open(name, 'rb') as source:
+        content = source.read()
+
+    future = get_executor().submit(render_variants, content)
+    future.add_done_callback(lambda done: _finish(model, storage, name, done))
+
+    return future
+
+
+def _finish(model, storage, name, future):
+    if future.exception() is not None:
+        logger.error('image variants were not created', exc_info=future.exception())
+        return
+
+    for variant, content in future.result().items():
+        target_name = variant_name(name, variant)
+
+        # info! при повторном создании хранилище иначе сохранило бы файл под другим именем
+        if storage.exists(target_name):
+            storage.delete(target_name)
+
+        storage.save(target_name, ContentFile(content))
+
+    variants_ready.send(sender=model, name=name)
+
+
+def register(model, *field_names):
+    _registry[model] = field_names
+    dispatch_uid = f'image_variants_{model._meta.label}'
+    post_init.connect(_remember_images, sender=model, dispatch_uid=dispatch_uid)
+    post_save.connect(_schedule_changed_images, sender=model, dispatch_uid=dispatch_uid)
+
+
+def get_registry():
+    return _registry.items()
+
+
+def _get_name(instance, field_name):
+    value = instance.__dict__.get(field_name)
+
+    return getattr(value, 'name', value)
+
+
+# info! имена файлов запоминаются при загрузке строки, чтобы после сохранения создавать варианты только
+#  для замененных изображений. Отложенные через only() поля не читаются и не отслеживаются, пропущенные
+#  варианты досоздает команда buildimagevariants
+def _remember_images(sender, instance, **kwargs):
+    instance._image_names = {field_name: _get_name(instance, field_name) for field_name in _registry[sender]
+                             if field_name in instance.__dict__}
+
+
+# info! у изображений по умолчанию варианты лежат в репозитории рядом с ними
+def _schedule_changed_images(sender, instance, created, **kwargs):
+    names = {} if created else getattr(instance, '_image_names', {})
+
+    for field_name in _registry[sender]:
+        if field_name not in instance.__dict__ or not (created or field_name in names):
+            continue
+
+        field_file = getattr(instance, field_name)
+
+        if (field_file and field_file.name != names.get(field_name) and
+                field_file.name != instance._meta.get_field(field_name).default):
+            schedule_variants(field_file)
+
+        names[field_name] = field_file.name
+
+    instance._image_names = names
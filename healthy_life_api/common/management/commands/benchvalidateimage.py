@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from common import validators
+from PIL import Image
+import statistics
+import tempfile
+import tracemalloc
+import random
+import time
+import os
+
+
+class Command(BaseCommand):
+    help = 'comparing peak memory and latency of header-only image validation with validation through Pillow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', nargs='?', help='directory with jpg/png files, by default a corpus is generated')
+        parser.add_argument('--repeat', type=int, default=20, help='runs of every validation')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as generated:
+            corpus = options['corpus'] or self._generate_corpus(generated)
+
+            if not os.path.isdir(corpus):
+                raise CommandError(f'corpus {corpus} is not a directory')
+
+            paths = sorted(os.path.join(corpus, name) for name in os.listdir(corpus)
+                           if os.path.splitext(name)[1].lower() in validators.EXTENSION_FORMATS)
+
+            for path in paths:
+                pillow = self._measure(self._validate_with_pillow, path, options['repeat'])
+                header = self._measure(validators.validate_image, path, options['repeat'])
+
+                self.stdout.write(f'{os.path.basename(path)} ({os.path.getsize(path) / 1024:.0f} KB): '
+                                  f'pillow {pillow[0]:.3f} ms / {pillow[1] / 1024:.1f} KB peak, '
+                                  f'header {header[0]:.3f} ms / {header[1] / 1024:.1f} KB peak')
+
+    @staticmethod
+    def _generate_corpus(directory):
+        rnd = random.Random(0)
+
+        for width, height in ((200, 200), (1920, 1080), (4000, 3000)):
+            image = Image.effect_noise((width, height), rnd.randint(32, 96)).convert('RGB')
+            image.save(os.path.join(directory, f'noise_{width}x{height}.jpg'), 'JPEG', quality=90)
+            image.save(os.path.join(directory, f'noise_{width}x{height}.png'), 'PNG')
+
+        return directory
+
+    # info! прежняя проверка: расширение, размер файла и Image.open с чтением размеров
+    @staticmethod
+    def _validate_with_pillow(image, size_file_MB, max_len_name, max_x, max_y):
+        if os.path.splitext(image.name)[1].lower() not in validators.EXTENSION_FORMATS:
+            raise ValidationError('file must be a jpg, jpeg, or png')
+
+        if image.size > size_file_MB * 1024 * 1024 or len(image.name) > max_len_name:
+            raise ValidationError('invalid image')
+
+        image_file = Image.open(image)
+        if image_file.size[0] > max_x or image_file.size[1] > max_y:
+            raise ValidationError(f'maximum image size {max_x}x{max_y} pixels')
+
+        return image
+
+    @staticmethod
+    def _measure(validate, path, repeat):
+        timings = []
+        peaks = []
+
+        for _ in range(repeat):
+            with open(path, 'rb') as stream:
+                image = File(stream, name=os.path.basename(path))
+                tracemalloc.start()
+                start = time.perf_counter()
+                validate(image, 1024, 1024, 100_000, 100_000)
+                timings.append((time.perf_counter() - start) * 1_000)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+        return statistics.median(timings), max(peaks)
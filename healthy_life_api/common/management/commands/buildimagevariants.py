@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from concurrent.futures import wait
+from common import images
+
+
+class Command(BaseCommand):
+    help = 'creating missing image variants (thumbnail, medium, webp) for already uploaded images'
+
+    def handle(self, *args, **options):
+        futures = []
+        scheduled = set()
+
+        for model, field_names in images.get_registry():
+            for instance in model.objects.only(*field_names).iterator(chunk_size=1_000):
+                for field_name in field_names:
+                    field_file = getattr(instance, field_name)
+
+                    if field_file.name not in scheduled and images.needs_variants(field_file):
+                        scheduled.add(field_file.name)
+                        futures.append(images.submit_variants(model, field_file))
+
+        done, _ = wait(futures)
+        failed = sum(future.exception() is not None for future in done)
+
+        self.stdout.write(self.style.SUCCESS(f'variants created for {len(done) - failed} images, failed {failed}'))
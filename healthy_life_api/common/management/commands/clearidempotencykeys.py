@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from common import idempotency
+
+
+class Command(BaseCommand):
+    help = 'deleting stored responses of idempotent requests older than IDEMPOTENCY_KEY_TTL_HOURS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000, help='rows deleted in one query')
+
+    def handle(self, *args, **options):
+        deleted = idempotency.clear_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{deleted} idempotency keys deleted'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from common import conditional
+
+
+class Command(BaseCommand):
+    help = 'showing the share of conditional GET requests answered with 304 Not Modified'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='reset the counters after output')
+
+    def handle(self, *args, **options):
+        for endpoint in conditional.ENDPOINTS:
+            metrics = conditional.get_metrics(endpoint)
+            hit_ratio = metrics['not_modified'] / metrics['requests'] if metrics['requests'] else 0
+            revalidation_ratio = metrics['not_modified'] / metrics['conditional'] if metrics['conditional'] else 0
+
+            self.stdout.write(f'{endpoint}: requests {metrics['requests']}, conditional {metrics['conditional']}, '
+                              f'304 {metrics['not_modified']}, hit ratio {hit_ratio:.1%}, '
+                              f'revalidation hit ratio {revalidation_ratio:.1%}')
+
+        if options['reset']:
+            conditional.reset_metrics()
+            self.stdout.write(self.style.SUCCESS('counters reset'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='idempotency key')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='request fingerprint')),
+                ('status_code', models.PositiveSmallIntegerField(null=True, verbose_name='response status code')),
+                ('response', models.JSONField(null=True, verbose_name='response body')),
+                ('date_create', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='time of creation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_key_fk', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'idempotency key',
+                'verbose_name_plural': 'idempotency keys',
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='idempotency_key_user_UQ')],
+            },
+        ),
+    ]
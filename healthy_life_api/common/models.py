@@ -29,3 +29,26 @@ class IMessage(models.Model):
 
     def __str__(self):
         return f'@\'{self.pk}\''
+
+
+# info! ответ на запрос с заголовком Idempotency-Key, пока status_code пустой запрос еще выполняется
+class IdempotencyKey(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'key'), name='idempotency_key_user_UQ'),
+        ]
+        verbose_name = 'idempotency key'
+        verbose_name_plural = 'idempotency keys'
+
+    user = models.ForeignKey(AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_key_fk',
+                             verbose_name='user')
+    key = models.CharField(max_length=255, verbose_name='idempotency key')
+    fingerprint = models.CharField(max_length=64, verbose_name='request fingerprint')
+    status_code = models.PositiveSmallIntegerField(null=True, verbose_name='response status code')
+    response = models.JSONField(null=True, verbose_name='response body')
+    date_create = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='time of creation')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.pk}\''
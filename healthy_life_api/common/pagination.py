@@ -0,0 +1,152 @@
+from rest_framework.pagination import BasePagination
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from django.db.models import F, Q
+import datetime
+import binascii
+import base64
+import json
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # info! DjangoJSONEncoder обрезает время до миллисекунд, для курсора нужна полная точность
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+
+        return super().default(o)
+
+
+# info! страница N стоит столько же, сколько первая: курсор хранит значение колонки сортировки и pk последней записи.
+#  Колонка берётся из явного order_by queryset (например '-date_create'), иначе используется ordering.
+#  NULL в колонке сортировки идут последними по возрастанию и первыми по убыванию, как в postgres по умолчанию
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    ordering = 'pk'
+
+    invalid_cursor_message = 'invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(queryset)
+        self.nullable = self.field != 'pk' and self._is_nullable(queryset, self.field)
+
+        if self.field == 'pk':
+            queryset = queryset.order_by('-pk' if self.descending else 'pk')
+        elif self.descending:
+            queryset = queryset.order_by(F(self.field).desc(nulls_first=True), '-pk')
+        else:
+            queryset = queryset.order_by(F(self.field).asc(nulls_last=True), 'pk')
+
+        cursor = self.decode_cursor(request, queryset)
+
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(*cursor))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = queryset.query.order_by[0] if queryset.query.order_by else self.ordering
+
+        if not isinstance(ordering, str):
+            raise ImproperlyConfigured('keyset pagination supports ordering only by field name')
+
+        field = ordering.lstrip('-')
+
+        return 'pk' if field == 'id' else field, ordering.startswith('-')
+
+    def get_cursor_filter(self, value, pk):
+        lookup = 'lt' if self.descending else 'gt'
+
+        if self.field == 'pk':
+            return Q(**{f'pk__{lookup}': pk})
+
+        if value is None:
+            after = Q(**{f'{self.field}__isnull': True, f'pk__{lookup}': pk})
+
+            return after | Q(**{f'{self.field}__isnull': False}) if self.descending else after
+
+        after = Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'pk__{lookup}': pk})
+
+        return after | Q(**{f'{self.field}__isnull': True}) if self.nullable and not self.descending else after
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        last = self.page[-1]
+        value = None if self.field == 'pk' else getattr(last, self.field)
+        cursor = json.dumps([value, last.pk], cls=_CursorEncoder, separators=(',', ':'))
+
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   base64.urlsafe_b64encode(cursor.encode()).decode())
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if encoded is None:
+            return None
+
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+
+            if self.field != 'pk':
+                value = self._get_output_field(queryset, self.field).to_python(value)
+
+            return value, queryset.model._meta.pk.to_python(pk)
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError, FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @classmethod
+    def _is_nullable(cls, queryset, field):
+        try:
+            return cls._get_output_field(queryset, field).null
+        except FieldDoesNotExist:
+            return False
+
+    @staticmethod
+    def _get_output_field(queryset, field):
+        if field in queryset.query.annotations:
+            return queryset.query.annotations[field].output_field
+
+        return queryset.model._meta.get_field(field)
@@ -0,0 +1,13 @@
+from rest_framework import serializers
+from common import images
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        urls = images.get_variant_urls(value)
+        request = self.context.get('request', None)
+
+        if urls is None or request is None:
+            return urls
+
+        return {variant: request.build_absolute_uri(url) for variant, url in urls.items()}
@@ -1,3 +1,202 @@
-from django.test import TestCase
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework.request import Request
+from django.core.files.storage import FileSystemStorage, InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from common.uploads import MaxSizeUploadHandler, UploadTooLarge
+from common.pagination import KeysetPagination
+from concurrent.futures import Future
+from common import images, validators
+from unittest import mock
+from PIL import Image
+from django.utils import timezone
+from django.urls import reverse
+from urllib.parse import parse_qs, urlparse
+from user.models import User
+import datetime
+import io
 
-# Create your tests here.
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        now = timezone.now()
+        # info! повторяющиеся и пустые last_login проверяют равные значения сортировки и NULL
+        logins = (now, None, now - datetime.timedelta(days=1), now, None, now + datetime.timedelta(days=1), now)
+
+        for i, last_login in enumerate(logins):
+            User.objects.create(username=f'user_{i}', email=f'user_{i}@mail.com', last_login=last_login)
+
+    @staticmethod
+    def _paginate(queryset, params):
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get('/users/', params)))
+
+        return page, paginator
+
+    def _walk(self, queryset, page_size=2):
+        params, pks = {'limit': page_size}, []
+
+        while True:
+            page, paginator = self._paginate(queryset, params)
+            pks += [user.pk for user in page]
+            next_link = paginator.get_next_link()
+
+            if next_link is None:
+                return pks
+
+            params = {'limit': page_size, 'cursor': parse_qs(urlparse(next_link).query)['cursor'][0]}
+
+    def test_cursor_round_trip_in_both_directions(self):
+        users = list(User.objects.all())
+
+        self.assertEqual(self._walk(User.objects.order_by('username')),
+                         [user.pk for user in sorted(users, key=lambda user: (user.username, user.pk))])
+        self.assertEqual(self._walk(User.objects.order_by('-username')),
+                         [user.pk for user in sorted(users, key=lambda user: (user.username, user.pk), reverse=True)])
+
+    def test_ties_and_nulls_in_ordering_column(self):
+        users = list(User.objects.all())
+        ascending = sorted(users, key=lambda user: (user.last_login is None, user.last_login or timezone.now(),
+                                                    user.pk))
+
+        for page_size in (1, 2, 3):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self._walk(User.objects.order_by('last_login'), page_size),
+                                 [user.pk for user in ascending])
+                self.assertEqual(self._walk(User.objects.order_by('-last_login'), page_size),
+                                 [user.pk for user in reversed(ascending)])
+
+    def test_invalid_cursor_is_not_found(self):
+        self.client.force_authenticate(User.objects.get(username='user_0'))
+
+        for cursor in ('not-base64!', 'bm90IGpzb24=', 'WzEsMiwzXQ=='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('chats'), {'cursor': cursor})
+
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_limited(self):
+        for limit, page_size in (('3', 3), ('0', 25), ('-1', 25), ('abc', 25), ('1000', 100)):
+            with self.subTest(limit=limit):
+                _, paginator = self._paginate(User.objects.all(), {'limit': limit})
+
+                self.assertEqual(paginator.page_size, page_size)
+
+
+class ImageVariantsTest(APITestCase):
+    @staticmethod
+    def _png(size):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, 'red').save(buffer, 'PNG')
+
+        return buffer.getvalue()
+
+    def test_every_variant_is_resized(self):
+        rendered = images.render_variants(self._png((3000, 1500)))
+
+        for variant, (max_side, image_format, _) in images.VARIANTS.items():
+            with self.subTest(variant=variant), Image.open(io.BytesIO(rendered[variant])) as image:
+                self.assertEqual((image.format, image.size), (image_format, (max_side, max_side // 2)))
+
+    def test_variants_are_saved_through_storage(self):
+        storage = InMemoryStorage()
+        name = storage.save('goods/photo.png', ContentFile(self._png((300, 300))))
+        future = Future()
+        future.set_result(images.render_variants(self._png((300, 300))))
+
+        for _ in range(2):
+            images._finish(User, storage, name, future)
+
+        self.assertEqual(sorted(storage.listdir('goods/variants')[1]),
+                         ['photo.medium.jpg', 'photo.thumbnail.jpg', 'photo.webp'])
+
+    def test_variant_urls_do_not_touch_storage(self):
+        user = User.objects.create(username='user', email='user@mail.com')
+
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            urls = images.get_variant_urls(user.avatar)
+
+        exists.assert_not_called()
+        self.assertEqual(urls['thumbnail'], '/media/default/variants/avatar.thumbnail.jpg')
+
+    def test_variants_are_scheduled_only_for_replaced_images(self):
+        with mock.patch.object(images, 'submit_variants') as submit_variants:
+            with self.captureOnCommitCallbacks(execute=True):
+                user = User.objects.create(username='user', email='user@mail.com')
+                user.save()
+
+            submit_variants.assert_not_called()
+
+            user = User.objects.get(pk=user.pk)
+            user.avatar = 'users/avatars/avatar.png'
+
+            with self.captureOnCommitCallbacks(execute=True):
+                user.save()
+                user.save()
+                User.objects.only('pk').get(pk=user.pk).save()
+
+        self.assertEqual([call.args[1].name for call in submit_variants.call_args_list], ['users/avatars/avatar.png'])
+
+
+class ImageValidationTest(APITestCase):
+    @staticmethod
+    def _image(name, size, image_format, **options):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, image_format, **options)
+
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    @staticmethod
+    def _validate(image):
+        return validators.validate_image(image, 1, 64, 200, 100)
+
+    def test_image_size_is_read_from_header(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'camera'
+
+        for image in (self._image('image.png', (200, 100), 'PNG'),
+                      self._image('image.JPG', (200, 100), 'JPEG', exif=exif.tobytes()),
+                      self._image('image.jpeg', (200, 100), 'JPEG', progressive=True)):
+            with self.subTest(image=image.name):
+                self.assertIs(self._validate(image), image)
+                self.assertEqual(image.tell(), 0)
+
+    def test_invalid_images_are_rejected(self):
+        png = self._image('image.png', (10, 10), 'PNG').read()
+        jpeg = self._image('image.jpg', (10, 10), 'JPEG').read()
+
+        for image, message in ((self._image('image.jpg', (10, 10), 'PNG'), 'file must be a jpg, jpeg, or png'),
+                               (SimpleUploadedFile('image.png', b'not an image'), 'file must be a jpg, jpeg, or png'),
+                               (self._image('image.png', (201, 100), 'PNG'), 'maximum image size 200x100 pixels'),
+                               (self._image('image.jpg', (200, 101), 'JPEG'), 'maximum image size 200x100 pixels'),
+                               (SimpleUploadedFile('image.png', png[:20]), 'image header is damaged'),
+                               (SimpleUploadedFile('image.jpg', jpeg[:30]), 'image header is damaged'),
+                               (SimpleUploadedFile(f'{"a" * 61}.png', png), 'file name must not exceed 64 characters')):
+            with self.subTest(image=image.name[:20], message=message):
+                with self.assertRaisesMessage(ValidationError, message):
+                    self._validate(image)
+
+
+class UploadSizeLimitTest(APITestCase):
+    def test_oversize_body_is_rejected_before_parsing(self):
+        user = User.objects.create(username='user', email='user@mail.com')
+        self.client.force_authenticate(user)
+        avatar = SimpleUploadedFile('avatar.png', b'\0' * 7 * 1024 * 1024)
+
+        response = self.client.put(reverse('profile', kwargs={'username': user.username}), {'avatar': avatar},
+                                   format='multipart')
+
+        self.assertEqual(response.status_code, 413)
+        user.refresh_from_db()
+        self.assertEqual(user.avatar.name, 'default/avatar.png')
+
+    def test_body_without_content_length_is_cut_at_limit(self):
+        handler = MaxSizeUploadHandler(max_size_MB=1)
+        chunk = b'\0' * 256 * 1024
+
+        for start in range(0, 1024 * 1024, len(chunk)):
+            self.assertEqual(handler.receive_data_chunk(chunk, start), chunk)
+
+        with self.assertRaises(UploadTooLarge):
+            handler.receive_data_chunk(b'\0', 1024 * 1024)
@@ -0,0 +1,46 @@
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework.exceptions import APIException
+from rest_framework import status
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'upload is too large'
+    default_code = 'upload_too_large'
+
+
+# info! запрос отклоняется по Content-Length до чтения тела, а без него - на первом фрагменте сверх лимита.
+#  Сам обработчик ничего не сохраняет, файлы принимают следующие обработчики из FILE_UPLOAD_HANDLERS
+class MaxSizeUploadHandler(FileUploadHandler):
+    # info! запас на остальные поля multipart формы
+    form_overhead = 64 * 1024
+
+    def __init__(self, request=None, max_size_MB: float = 5):
+        super().__init__(request)
+        self.max_size = int(max_size_MB * 1024 * 1024)
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.max_size + self.form_overhead:
+            raise UploadTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+
+        if self.received > self.max_size:
+            raise UploadTooLarge()
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class UploadSizeLimitMixin:
+    max_upload_size_MB = None
+
+    def initial(self, request, *args, **kwargs):
+        if self.max_upload_size_MB is not None:
+            request.upload_handlers.insert(0, MaxSizeUploadHandler(request, self.max_upload_size_MB))
+
+        super().initial(request, *args, **kwargs)
@@ -1,16 +1,25 @@
 from django.core.exceptions import ValidationError
 from typing import Union
-from PIL import Image
+import struct
 import os
 
 
-def validate_image(image, size_file_MB: float, max_len_name: int, max_x: int, max_y: int):
-    valid_extensions = {'.jpg', '.jpeg', '.png'}
-    file_extension = os.path.splitext(image.name)[1].lower()
+IMAGE_SIGNATURES = {
+    'png': b'\x89PNG\r\n\x1a\n',
+    'jpeg': b'\xff\xd8\xff',
+}
+EXTENSION_FORMATS = {
+    '.jpg': 'jpeg',
+    '.jpeg': 'jpeg',
+    '.png': 'png',
+}
+# info! маркеры SOF jpeg, после которых записаны размеры изображения
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
 
-    if file_extension not in valid_extensions:
-        raise ValidationError(f'file must be a jpg, jpeg, or png')
 
+# info! формат определяется по сигнатуре, размеры читаются из заголовка (IHDR или SOF) без декодирования пикселей,
+#  из файла читаются только заголовки сегментов, остальное пропускается через seek
+def validate_image(image, size_file_MB: float, max_len_name: int, max_x: int, max_y: int):
     size_to_bits = size_file_MB * 1024 * 1024
     if image.size > size_to_bits:
         raise ValidationError(f'image size should not exceed {size_file_MB} MB')
@@ -18,13 +27,91 @@ def validate_image(image, size_file_MB: float, max_len_name: int, max_x: int, ma
     if len(image.name) > max_len_name:
         raise ValidationError(f'file name must not exceed {max_len_name} characters')
 
-    image_file = Image.open(image)
-    if image_file.size[0] > max_x or image_file.size[1] > max_y:
+    file_extension = os.path.splitext(image.name)[1].lower()
+    image.seek(0)
+
+    try:
+        image_format = sniff_image_format(image)
+
+        if image_format is None or EXTENSION_FORMATS.get(file_extension) != image_format:
+            raise ValidationError(f'file must be a jpg, jpeg, or png')
+
+        dimensions = read_image_size(image, image_format)
+    finally:
+        image.seek(0)
+
+    if dimensions is None:
+        raise ValidationError('image header is damaged')
+
+    if dimensions[0] > max_x or dimensions[1] > max_y:
         raise ValidationError(f'maximum image size {max_x}x{max_y} pixels')
 
     return image
 
 
+def sniff_image_format(stream):
+    header = stream.read(max(len(signature) for signature in IMAGE_SIGNATURES.values()))
+
+    for image_format, signature in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+
+    return None
+
+
+def read_image_size(stream, image_format):
+    if image_format == 'png':
+        stream.seek(len(IMAGE_SIGNATURES['png']))
+        chunk = stream.read(16)
+
+        if len(chunk) < 16 or chunk[4:8] != b'IHDR':
+            return None
+
+        return struct.unpack('>II', chunk[8:16])
+
+    stream.seek(2)
+
+    while True:
+        marker = stream.read(2)
+
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+
+        while marker[1] == 0xFF:
+            marker = marker[1:] + stream.read(1)
+
+            if len(marker) < 2:
+                return None
+
+        if marker[1] in (0xD9, 0xDA):
+            return None
+
+        if marker[1] == 0x01 or 0xD0 <= marker[1] <= 0xD7:
+            continue
+
+        length = stream.read(2)
+
+        if len(length) < 2:
+            return None
+
+        if marker[1] in JPEG_SOF_MARKERS:
+            frame = stream.read(5)
+
+            if len(frame) < 5:
+                return None
+
+            height, width = struct.unpack('>HH', frame[1:5])
+
+            return width, height
+
+        segment_length = struct.unpack('>H', length)[0]
+
+        if segment_length < 2:
+            return None
+
+        stream.seek(segment_length - 2, os.SEEK_CUR)
+
+
 def number_between(value: Union[float, int], number_a: Union[float, int], number_b: Union[float, int]):
     if number_a <= value <= number_b:
         return value
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'common.apps.CommonConfig',
     'user.apps.UserConfig',
@@ -65,7 +66,7 @@ MIDDLEWARE = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'common.pagination.KeysetPagination',
     'PAGE_SIZE': 25,
 
     'DEFAULT_FILTER_BACKENDS': (
@@ -114,6 +115,9 @@ WSGI_APPLICATION = 'healthy_life_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# info! порог похожести для нечеткого поиска, передается в pg_trgm.similarity_threshold каждого подключения
+TRIGRAM_SIMILARITY_THRESHOLD = float(os.getenv('TRIGRAM_SIMILARITY_THRESHOLD', '0.3'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -122,9 +126,44 @@ DATABASES = {
         'PASSWORD': os.getenv('PASSWORD_DB'),
         'HOST': os.getenv('HOST_DB'),
         'PORT': os.getenv('PORT_DB'),
+        'OPTIONS': {
+            'options': f'-c pg_trgm.similarity_threshold={TRIGRAM_SIMILARITY_THRESHOLD}',
+        },
+    }
+}
+
+# info! общий кеш нужен, чтобы смена версии каталога была видна всем воркерам, без REDIS_URL кеш локальный
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    } if os.getenv('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# info! без общего кеша воркер не видит смену версии каталога в других воркерах и отдает устаревший каталог
+#  до истечения записи, поэтому без REDIS_URL время жизни записей по умолчанию всего несколько секунд
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '600' if os.getenv('REDIS_URL') else '5'))
+
+# info! на сколько минут товар в покупке откладывается для покупателя, см. pharmacy.reservations
+STOCK_RESERVATION_TTL_MINUTES = int(os.getenv('STOCK_RESERVATION_TTL_MINUTES', '15'))
+
+# info! сколько часов хранится ответ на запрос с заголовком Idempotency-Key, см. common.idempotency
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+# info! сколько секунд ключ считается занятым выполняющимся запросом. Если процесс упал, не освободив ключ,
+#  повтор запроса с этим ключом выполняется заново по истечении этого срока. Должен быть больше таймаута запроса
+IDEMPOTENCY_KEY_LEASE_SECONDS = int(os.getenv('IDEMPOTENCY_KEY_LEASE_SECONDS', '60'))
+
+# info! сколько процентов оплаченной деньгами суммы покупки возвращается бонусами, см. pharmacy.loyalty_bonus.
+#  Множители процента задаются по типу товара (значение TypeGoods) в виде "1:0,5:2", остальные типы умножаются на 1.
+#  Значения проверяются при начислении, ошибка в них дает ImproperlyConfigured
+LOYALTY_BONUS_PERCENT = os.getenv('LOYALTY_BONUS_PERCENT', '1')
+LOYALTY_BONUS_TYPE_MULTIPLIERS = os.getenv('LOYALTY_BONUS_TYPE_MULTIPLIERS', '')
+
+# info! нижние границы ценовых диапазонов для фасетов каталога, последний диапазон не ограничен сверху
+GOODS_PRICE_BUCKETS = ('0', '100', '500', '1000', '5000',)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -164,6 +203,25 @@ STATIC_URL = 'static/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# info! файлы для персонала, например отчеты об ошибках импорта. Не раздаются по MEDIA_URL, а отдаются
+#  представлениями с проверкой прав
+PRIVATE_MEDIA_ROOT = os.getenv('PRIVATE_MEDIA_ROOT', os.path.join(BASE_DIR, 'private'))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'private': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': PRIVATE_MEDIA_ROOT, 'base_url': None},
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# info! процессы для создания уменьшенных копий загруженных изображений, см. common.images
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -0,0 +1,112 @@
+from django.db import transaction
+from rest_framework import status
+from pharmacy import models, prices, reservations
+import decimal
+
+
+MAX_AMOUNT = 32_767
+MAX_OPERATIONS = 1_000
+
+
+class CartError(Exception):
+    def __init__(self, detail, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class CartAction:
+    ADD = 'add'
+    SET = 'set'
+    REMOVE = 'remove'
+
+    choices = (ADD, SET, REMOVE,)
+
+
+# info! операции применяются по порядку к текущему составу покупки: add прибавляет количество, set заменяет,
+#  remove убирает товар. Товары находятся одним запросом по именам, итоговые количества проверяются по остатку
+#  без резервов других покупок и откладываются под эту покупку.
+#  Если хотя бы одна операция ошибочна, покупка не меняется и возвращаются ошибки по номерам операций.
+#  Оплата проверяется повторно под блокировкой покупки: параллельная оплата могла завершиться раньше
+def edit_cart(purchase, operations):
+    names = {operation['name'] for operation in operations}
+
+    with transaction.atomic():
+        purchase = models.Purchase.objects.select_for_update().filter(pk=purchase.pk).first()
+
+        if purchase is None:
+            raise CartError('purchase not found', status.HTTP_404_NOT_FOUND)
+
+        if purchase.is_paid:
+            raise CartError('paid purchase cannot be changed')
+
+        goods_by_name = {goods.name: goods for goods in (models.Goods.objects
+                                                         .filter(name__in=names)
+                                                         .order_by('pk')
+                                                         .select_for_update()
+                                                         .annotate(held=reservations.held_by_others(purchase))
+                                                         .only('pk', 'name', 'amount_in_stock'))}
+        lines = {line.goods_purchase_id: line for line in models.PurchaseGoods.objects.filter(purchase=purchase)}
+        amounts = {goods_id: line.amount for goods_id, line in lines.items()}
+        errors = {}
+
+        for position, operation in enumerate(operations):
+            goods = goods_by_name.get(operation['name'])
+
+            if goods is None:
+                errors[position] = 'goods not found'
+                continue
+
+            if operation['action'] == CartAction.REMOVE:
+                amounts.pop(goods.pk, None)
+                continue
+
+            amount = operation['amount'] + (amounts.get(goods.pk, 0) if operation['action'] == CartAction.ADD else 0)
+
+            if amount > min(goods.amount_in_stock - goods.held, MAX_AMOUNT):
+                errors[position] = 'there is not enough goods in stock'
+                continue
+
+            amounts[goods.pk] = amount
+
+        if errors:
+            return errors
+
+        new_lines = [models.PurchaseGoods(purchase=purchase, goods_purchase_id=goods_id, amount=amount)
+                     for goods_id, amount in amounts.items() if goods_id not in lines]
+        changed_lines = [line for goods_id, line in lines.items()
+                         if goods_id in amounts and amounts[goods_id] != line.amount]
+        removed_lines = [line.pk for goods_id, line in lines.items() if goods_id not in amounts]
+
+        for line in changed_lines:
+            line.amount = amounts[line.goods_purchase_id]
+
+        if new_lines:
+            models.PurchaseGoods.objects.bulk_create(new_lines)
+
+        if changed_lines:
+            models.PurchaseGoods.objects.bulk_update(changed_lines, ('amount',))
+
+        if removed_lines:
+            models.PurchaseGoods.objects.filter(pk__in=removed_lines).delete()
+
+        touched = {goods.pk for goods in goods_by_name.values()}
+        reservations.place(purchase, {goods_id: amounts[goods_id] for goods_id in touched if goods_id in amounts})
+        reservations.release(purchase, [goods_id for goods_id in touched if goods_id not in amounts])
+
+    return None
+
+
+def get_cart(purchase):
+    lines = (models.PurchaseGoods.objects
+             .filter(purchase=purchase)
+             .order_by('pk')
+             .values_list('goods_purchase__name', 'amount')
+             .annotate(unit_price=prices.current_price('goods_purchase__')))
+    goods = [{'name': name, 'amount': amount, 'unit_price': unit_price, 'total_price': amount * unit_price}
+             for name, amount, unit_price in lines]
+
+    return {'purchase': purchase.pk,
+            'goods': goods,
+            'total_amount': sum(line['amount'] for line in goods),
+            'total_price': sum((line['total_price'] for line in goods), decimal.Decimal('0.00'))}
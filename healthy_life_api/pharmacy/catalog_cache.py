@@ -0,0 +1,90 @@
+from django.db.models.functions import Now
+from django.core.cache import cache
+from django.db.models import Min
+from django.conf import settings
+from django.db import transaction
+from common import conditional
+from pharmacy import models
+import hashlib
+import time
+
+
+VERSION_KEY = 'pharmacy:catalog:version'
+EXPIRY_KEY = 'pharmacy:catalog:{version}:expiry'
+ENTRY_KEY = 'pharmacy:catalog:{version}:{digest}'
+
+
+# info! версия каталога входит в ключ каждой записи, поэтому смена версии делает все старые записи недоступными.
+#  Начальное значение берется от времени, чтобы после вытеснения ключа версии не вернуться к старым записям.
+#  Версия живет не дольше записей: с локальным кешем воркер, не увидевший смену версии в другом воркере,
+#  иначе отвечал бы 304 по устаревшему etag бессрочно
+def get_version():
+    version = cache.get(VERSION_KEY)
+
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=settings.CATALOG_CACHE_TIMEOUT)
+        version = cache.get(VERSION_KEY)
+
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+
+# info! версия меняется после фиксации транзакции, иначе параллельный запрос закеширует еще не зафиксированное состояние
+def bump_version_on_commit():
+    transaction.on_commit(bump_version)
+
+
+def make_key(request, *parts):
+    params = sorted((key, values) for key, values in request.query_params.lists() if any(values))
+    raw = repr((request.get_host(), parts, params))
+
+    return ENTRY_KEY.format(version=get_version(), digest=hashlib.md5(raw.encode()).hexdigest())
+
+
+def load(key):
+    return cache.get(key)
+
+
+def store(key, data):
+    timeout = get_timeout()
+
+    if timeout:
+        cache.set(key, data, timeout)
+
+
+# info! записи живут не дольше ближайшего окончания акции, так что истечение акции сбрасывает кеш без записи в базу
+def get_timeout():
+    expiry = get_expiry()
+
+    if not expiry:
+        return settings.CATALOG_CACHE_TIMEOUT
+
+    return max(min(int(expiry - time.time()), settings.CATALOG_CACHE_TIMEOUT), 0)
+
+
+# info! etag меняется вместе с версией каталога и при окончании ближайшей акции
+def get_etag(key):
+    expiry = get_expiry()
+
+    return conditional.make_etag(key, expiry, bool(expiry) and expiry <= time.time())
+
+
+def get_expiry():
+    expiry_key = EXPIRY_KEY.format(version=get_version())
+    expiry = cache.get(expiry_key)
+
+    if expiry is None:
+        nearest_end = (models.Promotion.objects
+                       .filter(time_end_promotion__gt=Now())
+                       .aggregate(nearest_end=Min('time_end_promotion'))['nearest_end'])
+        expiry = nearest_end.timestamp() if nearest_end else 0
+        expiry_timeout = int(expiry - time.time()) + 1 if expiry else settings.CATALOG_CACHE_TIMEOUT
+        cache.set(expiry_key, expiry, min(expiry_timeout, settings.CATALOG_CACHE_TIMEOUT))
+
+    return expiry
@@ -0,0 +1,139 @@
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+from rest_framework import status
+from django.utils import timezone
+from user import models as user_models
+from django.db import models as dj_model
+from pharmacy import models, catalog_cache, prices, reservations
+import decimal
+
+
+# info! только 25% покупки можно оплатить бонусами
+MAX_BONUS_SHARE = decimal.Decimal('0.25')
+
+
+class CheckoutError(Exception):
+    def __init__(self, detail, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+# info! оплата идет в одной транзакции и не зависит от числа позиций: блокировка покупки, позиции с ценами и резервами
+#  одним запросом, один UPDATE остатков, списание баланса и бонусов через F().
+#  Строки товаров блокируются только перед списанием: наличие обеспечивают резервы (pharmacy.reservations),
+#  а условие в UPDATE под блокировкой повторяет проверку наличия с учетом чужих резервов, чтобы параллельные
+#  оплаты без резервов не забрали отложенный для других товар. Любая ошибка откатывает все изменения
+def pay(purchase_pk, user, paid_with_bonuses):
+    with transaction.atomic():
+        purchase = models.Purchase.objects.select_for_update().filter(pk=purchase_pk).first()
+        own_holds = models.StockReservation.objects.filter(purchase=purchase_pk,
+                                                           goods_reservation=OuterRef('goods_purchase'),
+                                                           expires_at__gt=Now())
+
+        if purchase is None:
+            raise CheckoutError('purchase not found', status.HTTP_404_NOT_FOUND)
+
+        if purchase.user_buy_id != user.pk:
+            raise CheckoutError('you can\'t pay for someone else\'s purchase', status.HTTP_403_FORBIDDEN)
+
+        if purchase.is_paid:
+            raise CheckoutError('the purchase has already been paid for')
+
+        lines = list(models.PurchaseGoods.objects
+                     .filter(purchase=purchase)
+                     .order_by('goods_purchase_id')
+                     .values_list('pk', 'amount', 'goods_purchase__amount_in_stock')
+                     .annotate(unit_price=prices.current_price('goods_purchase__'),
+                               held=reservations.held_by_others(purchase, 'goods_purchase'),
+                               reserved=Coalesce(Subquery(own_holds.values('amount')[:1]), 0)))
+
+        total_price = sum((line[1] * line[3] for line in lines), decimal.Decimal('0'))
+        total_price = total_price.quantize(decimal.Decimal('0.01'))
+        paid_in_bonuses = paid_with_bonuses * models.LoyaltyCard.BONUS_IN_CURRENCY
+
+        if total_price * MAX_BONUS_SHARE < paid_in_bonuses:
+            raise CheckoutError('no more than 25% of the purchase can be paid with bonuses')
+
+        # info! позиция с действующим резервом уже учтена в остатке, без резерва сверяется с остатком без чужих резервов
+        not_available = [pk for pk, amount, amount_in_stock, _, held, reserved in lines
+                         if reserved < amount and amount_in_stock - held < amount]
+
+        if not_available:
+            raise CheckoutError(f'the following items are not available in such quantities in the purchase: '
+                                f'{not_available}', status.HTTP_409_CONFLICT)
+
+        charge = total_price - paid_in_bonuses
+
+        if not user_models.User.objects.filter(pk=user.pk, balance__gte=charge).update(
+                balance=dj_model.F('balance') - charge):
+            raise CheckoutError('insufficient funds to purchase')
+
+        if paid_with_bonuses and not models.LoyaltyCard.objects.filter(user_card=user,
+                                                                       bonuses__gte=paid_with_bonuses).update(
+                bonuses=dj_model.F('bonuses') - paid_with_bonuses):
+            raise CheckoutError('you don\'t have that many bonuses on your loyalty card')
+
+        # info! остатки списываются последним изменением, чтобы строки товаров были заблокированы как можно меньше
+        if lines:
+            _take_from_stock(purchase.pk, {line[0] for line in lines})
+            reservations.release(purchase)
+            # info! цены фиксируются в позициях для сводок продаж, см. pharmacy.sales_rollup
+            (models.PurchaseGoods.objects
+             .filter(purchase=purchase)
+             .update(unit_price=dj_model.Case(*(dj_model.When(pk=line[0], then=dj_model.Value(line[3]))
+                                               for line in lines),
+                                             output_field=dj_model.DecimalField(max_digits=8, decimal_places=2))))
+
+        purchase.is_paid = True
+        purchase.paid_at = timezone.now()
+        purchase.date_buy = purchase.paid_at
+        purchase.paid_with_bonuses = paid_with_bonuses
+        purchase.total_price = charge
+        purchase.save(update_fields=('is_paid', 'paid_at', 'date_buy', 'paid_with_bonuses', 'total_price',))
+
+        catalog_cache.bump_version_on_commit()
+
+    return purchase
+
+
+# info! строки товаров блокируются в порядке id, чтобы параллельные оплаты одних товаров не взаимоблокировались.
+#  Блокировка берется отдельным запросом: UPDATE после нее видит резервы и остатки, зафиксированные до блокировки.
+#  Позиция списывается, если ее покрывает свой действующий резерв или остаток без действующих чужих резервов
+def _take_from_stock(purchase_pk, line_pks):
+    goods_table = models.Goods._meta.db_table
+    purchase_goods_table = models.PurchaseGoods._meta.db_table
+    reservation_table = models.StockReservation._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            SELECT goods.id
+            FROM {goods_table} AS goods
+            JOIN {purchase_goods_table} AS purchase_goods ON purchase_goods.goods_purchase_id = goods.id
+            WHERE purchase_goods.purchase_id = %s
+            ORDER BY goods.id
+            FOR UPDATE OF goods
+        ''', (purchase_pk,))
+        cursor.execute(f'''
+            UPDATE {goods_table} AS goods
+            SET amount_in_stock = goods.amount_in_stock - purchase_goods.amount
+            FROM {purchase_goods_table} AS purchase_goods
+            WHERE purchase_goods.goods_purchase_id = goods.id
+              AND purchase_goods.purchase_id = %s
+              AND goods.amount_in_stock >= purchase_goods.amount
+              AND (EXISTS (SELECT 1 FROM {reservation_table} AS reservation
+                           WHERE reservation.goods_reservation_id = goods.id AND reservation.purchase_id = %s
+                             AND reservation.expires_at > NOW() AND reservation.amount >= purchase_goods.amount)
+                   OR goods.amount_in_stock - (SELECT COALESCE(SUM(reservation.amount), 0)
+                                               FROM {reservation_table} AS reservation
+                                               WHERE reservation.goods_reservation_id = goods.id
+                                                 AND reservation.purchase_id <> %s
+                                                 AND reservation.expires_at > NOW()) >= purchase_goods.amount)
+            RETURNING purchase_goods.id
+        ''', (purchase_pk, purchase_pk, purchase_pk))
+        not_available = line_pks - {pk for pk, in cursor.fetchall()}
+
+        if not_available:
+            raise CheckoutError(f'the following items are not available in such quantities in the purchase: '
+                                f'{sorted(not_available)}', status.HTTP_409_CONFLICT)
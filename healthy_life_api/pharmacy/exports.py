@@ -0,0 +1,93 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from pharmacy import models
+import csv
+
+
+FORMATS = ('jsonl', 'csv',)
+CHUNK_SIZE = 2_000
+CONTENT_TYPES = {
+    'jsonl': 'application/jsonl',
+    'csv': 'text/csv',
+}
+
+# info! набор данных: (модель, [(колонка в выгрузке, поле модели)])
+DATASETS = {
+    'goods': (models.Goods, (
+        ('pk', 'pk'),
+        ('name', 'name'),
+        ('type_goods', 'type_goods'),
+        ('goods_info', 'goods_info'),
+        ('price', 'price'),
+        ('effective_price', 'effective_price'),
+        ('amount_in_stock', 'amount_in_stock'),
+    )),
+    'purchases': (models.Purchase, (
+        ('pk', 'pk'),
+        ('user_buy', 'user_buy'),
+        ('date_buy', 'date_buy'),
+        ('paid_at', 'paid_at'),
+        ('total_price', 'total_price'),
+        ('paid_with_bonuses', 'paid_with_bonuses'),
+        ('is_paid', 'is_paid'),
+        ('goods_is_received', 'goods_is_received'),
+    )),
+    'purchase_goods': (models.PurchaseGoods, (
+        ('pk', 'pk'),
+        ('purchase', 'purchase'),
+        ('goods', 'goods_purchase'),
+        ('goods_name', 'goods_purchase__name'),
+        ('amount', 'amount'),
+        ('unit_price', 'unit_price'),
+    )),
+    'reviews': (models.GoodsReview, (
+        ('pk', 'pk'),
+        ('goods', 'goods_review'),
+        ('goods_name', 'goods_review__name'),
+        ('wrote', 'wrote'),
+        ('grade', 'grade'),
+        ('message', 'message'),
+        ('date_create', 'date_create'),
+        ('date_change', 'date_change'),
+    )),
+}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+# info! строки читаются серверным курсором пачками по chunk_size и сразу отдаются,
+#  в памяти держится только текущая пачка. Курсор открывается внутри транзакции: вне ее django объявляет
+#  курсор WITH HOLD, и postgres материализует весь результат до выдачи первой строки
+def stream_rows(dataset, file_format, chunk_size=CHUNK_SIZE):
+    model, columns = DATASETS[dataset]
+    names = tuple(name for name, _ in columns)
+
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(names)
+        render = writer.writerow
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        render = lambda row: encoder.encode(dict(zip(names, row))) + '\n'
+
+    batch = []
+
+    with transaction.atomic():
+        # info! без сортировки первые строки отдаются сразу, сортировка всей таблицы задержала бы первый байт
+        rows = (model.objects
+                .order_by()
+                .values_list(*(lookup for _, lookup in columns))
+                .iterator(chunk_size=chunk_size))
+
+        for row in rows:
+            batch.append(render(row))
+
+            if len(batch) == chunk_size:
+                yield ''.join(batch)
+                batch.clear()
+
+    if batch:
+        yield ''.join(batch)
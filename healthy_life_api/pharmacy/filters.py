@@ -1,19 +1,53 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django_filters import rest_framework as filters
-from pharmacy import models
+from django.db.models.functions import Cast
+from django.db.models import F, FloatField
+from common.filters import TrigramSimilarityFilter, order_by_default
+from pharmacy import models, prices
+import re
 
 
 class GoodsListFilter(filters.FilterSet):
     name = filters.CharFilter(lookup_expr='icontains', label='name')
     type_goods = filters.ChoiceFilter(choices=models.TypeGoods.choices, label='type')
-    price = filters.RangeFilter(label='price')
+    price = filters.RangeFilter(method='filter_price', label='price')
     in_stock = filters.BooleanFilter(method='filter_in_stock', label='in stock')
+    search = filters.CharFilter(method='filter_search', label='search')
+    fuzzy_name = TrigramSimilarityFilter(field_name='name', label='fuzzy name')
 
     class Meta:
         model = models.Goods
-        fields = ('name', 'type_goods', 'price', 'in_stock',)
+        fields = ('name', 'type_goods', 'price', 'in_stock', 'search', 'fuzzy_name',)
+
+    # info! цена сравнивается так же, как ее показывает каталог, см. prices.price_filter
+    def filter_price(self, queryset, name, value):
+        lookups = {}
+
+        if value.start is not None:
+            lookups['gte'] = value.start
+
+        if value.stop is not None:
+            lookups['lte'] = value.stop
+
+        return queryset.filter(prices.price_filter(**lookups)) if lookups else queryset
 
     def filter_in_stock(self, queryset, name, value):
         if value:
             return queryset.filter(amount_in_stock__gt=0)
         return queryset.filter(amount_in_stock=0)
 
+    # info! каждое слово ищется как префикс, результаты упорядочены по релевантности.
+    #  Полнотекстовый поиск применяется раньше fuzzy_name, при обоих фильтрах порядок задает его ранг
+    def filter_search(self, queryset, name, value):
+        terms = re.findall(r'\w+', value)
+
+        if not terms:
+            return queryset
+
+        query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
+
+        # info! ts_rank возвращает real, приведение к double нужно для точного сравнения в курсоре пагинации
+        queryset = (queryset.filter(search_vector=query)
+                    .annotate(search_rank=Cast(SearchRank(F('search_vector'), query), output_field=FloatField())))
+
+        return order_by_default(queryset, '-search_rank')
@@ -0,0 +1,215 @@
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from pharmacy import models, prices, catalog_cache
+import itertools
+import decimal
+import json
+import csv
+
+
+FORMATS = ('csv', 'jsonl',)
+CHUNK_SIZE = 10_000
+
+# info! в файле поставщика колонки могут называться короче, чем поля модели
+FIELD_ALIASES = {
+    'name': 'name',
+    'type': 'type_goods',
+    'type_goods': 'type_goods',
+    'info': 'goods_info',
+    'goods_info': 'goods_info',
+    'price': 'price',
+    'stock': 'amount_in_stock',
+    'amount_in_stock': 'amount_in_stock',
+}
+
+TYPE_BY_LABEL = {label: value for value, label in models.TypeGoods.choices}
+MAX_PRICE = decimal.Decimal('999999.99')
+MAX_STOCK = 32_767
+
+STAGING_TABLE = 'pharmacy_goods_import'
+ERRORS_STORAGE = 'private'
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def errors_file_name(report):
+    return f'imports/goods/{report}.errors.csv'
+
+
+def detect_format(file_name, default='csv'):
+    extension = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+
+    return extension if extension in FORMATS else default
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield line_num, ImportRowError(f'invalid json: {error.msg}')
+                continue
+
+            yield line_num, row if isinstance(row, dict) else ImportRowError('row must be a json object')
+
+
+def validate_row(row):
+    if isinstance(row, ImportRowError):
+        raise row
+
+    values = {FIELD_ALIASES[key.strip().lower()]: value for key, value in row.items()
+              if key is not None and key.strip().lower() in FIELD_ALIASES}
+
+    name = str(values.get('name') or '').strip()
+    goods_info = str(values.get('goods_info') or '').strip()
+
+    if not name or len(name) > 1024:
+        raise ImportRowError('name must contain from 1 to 1024 characters')
+
+    if len(goods_info) > 2048:
+        raise ImportRowError('info must not exceed 2048 characters')
+
+    return (name, _parse_type(values.get('type_goods')), goods_info,
+            _parse_price(values.get('price')), _parse_stock(values.get('amount_in_stock')))
+
+
+def _parse_type(value):
+    if value in (None, ''):
+        return models.TypeGoods.OTHER
+
+    if str(value).strip().lower() in TYPE_BY_LABEL:
+        return TYPE_BY_LABEL[str(value).strip().lower()]
+
+    try:
+        type_goods = _parse_int(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f'unknown type {value!r}')
+
+    if type_goods not in models.TypeGoods.values:
+        raise ImportRowError(f'unknown type {value!r}')
+
+    return type_goods
+
+
+# info! int() молча отбрасывает дробную часть 3.7 и превращает true в 1, такие значения из json отклоняются
+def _parse_int(value):
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError(f'{value!r} is not an integer')
+
+    return int(value)
+
+
+def _parse_price(value):
+    try:
+        price = decimal.Decimal(str(value).strip())
+    except (decimal.InvalidOperation, TypeError):
+        raise ImportRowError(f'price {value!r} is not a number')
+
+    if not price.is_finite() or not 0 <= price <= MAX_PRICE or price != price.quantize(decimal.Decimal('0.01')):
+        raise ImportRowError(f'price must be between 0 and {MAX_PRICE} with at most 2 decimal places')
+
+    return price
+
+
+def _parse_stock(value):
+    if value in (None, ''):
+        return 0
+
+    try:
+        stock = _parse_int(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f'stock {value!r} is not an integer')
+
+    if not 0 <= stock <= MAX_STOCK:
+        raise ImportRowError(f'stock must be between 0 and {MAX_STOCK}')
+
+    return stock
+
+
+# info! строки проверяются и загружаются пачками: COPY во временную таблицу и один INSERT ... ON CONFLICT по name.
+#  В памяти держится только текущая пачка, ошибки сразу пишутся в errors_stream как csv (line, error)
+def import_goods(stream, file_format, errors_stream, chunk_size=CHUNK_SIZE):
+    errors = csv.writer(errors_stream)
+    errors.writerow(('line', 'error'))
+    result = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0}
+    rows = read_rows(stream, file_format)
+
+    try:
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            valid = []
+
+            for line_num, row in chunk:
+                try:
+                    valid.append((line_num,) + validate_row(row))
+                except ImportRowError as error:
+                    errors.writerow((line_num, str(error)))
+                    result['failed'] += 1
+
+            result['rows'] += len(chunk)
+
+            if valid:
+                created, updated = _upsert_chunk(valid)
+                result['created'] += created
+                result['updated'] += updated
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+
+    return result
+
+
+def _upsert_chunk(rows):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'''
+            CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+                line bigint,
+                name varchar(1024),
+                type_goods smallint,
+                goods_info varchar(2048),
+                price numeric(8, 2),
+                amount_in_stock smallint
+            ) ON COMMIT DELETE ROWS
+        ''')
+
+        with cursor.copy(f'COPY {STAGING_TABLE} (line, name, type_goods, goods_info, price, amount_in_stock) '
+                         f'FROM STDIN') as copy:
+            for row in rows:
+                copy.write_row(row)
+
+        # info! при повторе названия в пачке берется последняя строка, иначе ON CONFLICT обновит строку дважды
+        cursor.execute(f'''
+            WITH upserted AS (
+                INSERT INTO {models.Goods._meta.db_table} (name, type_goods, goods_info, price, amount_in_stock, photo)
+                SELECT DISTINCT ON (name) name, type_goods, goods_info, price, amount_in_stock, %s
+                FROM {STAGING_TABLE}
+                ORDER BY name, line DESC
+                ON CONFLICT (name) DO UPDATE
+                SET type_goods = EXCLUDED.type_goods,
+                    goods_info = EXCLUDED.goods_info,
+                    price = EXCLUDED.price,
+                    amount_in_stock = EXCLUDED.amount_in_stock
+                RETURNING xmax = 0 AS created
+            )
+            SELECT COUNT(*) FILTER (WHERE created), COUNT(*) FILTER (WHERE NOT created) FROM upserted
+        ''', (models.Goods._meta.get_field('photo').default,))
+        created, updated = cursor.fetchone()
+
+        # info! у товаров со скидкой могла измениться цена, сигналы при массовой записи не вызываются
+        prices.refresh_effective_prices(models.Goods.objects.filter(
+            discount_until__isnull=False,
+            name__in=RawSQL(f'SELECT name FROM {STAGING_TABLE}', ()),
+        ).values('pk'))
+        catalog_cache.bump_version_on_commit()
+
+    return created, updated
@@ -0,0 +1,80 @@
+from django.db import connection, transaction
+from django.db.models import F
+from user import models as user_models
+from common.utils import Role
+from pharmacy import models
+
+
+MESSAGE_PREFIX = 'low stock: '
+MAX_MESSAGE_LENGTH = 512
+
+
+def get_low_stock():
+    return models.Goods.objects.filter(amount_in_stock__lte=F('low_stock_threshold'))
+
+
+def get_pharmacists():
+    return user_models.User.objects.filter(groups__name=Role.PHARMACIST.value, is_active=True).distinct()
+
+
+# info! товары, которые опустились до порога с прошлой проверки, отмечаются одним UPDATE по индексу goods_low_stock_idx
+#  и попадают в уведомления. Пополненные выше порога товары снова могут попасть в уведомление.
+#  Каждый фармацевт получает одно уведомление на пачку товаров, а не на каждый товар
+def notify():
+    goods_table = models.Goods._meta.db_table
+
+    with transaction.atomic():
+        models.Goods.objects.filter(low_stock_alerted=True,
+                                    amount_in_stock__gt=F('low_stock_threshold')).update(low_stock_alerted=False)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE {goods_table}
+                SET low_stock_alerted = TRUE
+                WHERE amount_in_stock <= low_stock_threshold AND NOT low_stock_alerted
+                RETURNING name, amount_in_stock
+            ''')
+            goods = sorted(cursor.fetchall())
+
+        if goods:
+            messages = list(_build_messages(goods))
+            pharmacists = list(get_pharmacists().values_list('pk', flat=True))
+
+            user_models.Notifications.objects.bulk_create([
+                user_models.Notifications(user_notify_id=pharmacist, message=message)
+                for pharmacist in pharmacists for message in messages
+            ])
+
+    return len(goods)
+
+
+def _build_messages(goods):
+    message = MESSAGE_PREFIX
+
+    for name, amount_in_stock in goods:
+        item = f'{name} ({amount_in_stock})'
+
+        if len(MESSAGE_PREFIX) + len(item) > MAX_MESSAGE_LENGTH:
+            item = f'{item[:MAX_MESSAGE_LENGTH - len(MESSAGE_PREFIX) - 3]}...'
+
+        separator = '' if message == MESSAGE_PREFIX else ', '
+
+        if len(message) + len(separator) + len(item) > MAX_MESSAGE_LENGTH:
+            yield message
+            message, separator = MESSAGE_PREFIX, ''
+
+        message += separator + item
+
+    yield message
+
+
+def set_threshold(threshold, name=None, type_goods=None):
+    goods = models.Goods.objects.all()
+
+    if name is not None:
+        goods = goods.filter(name=name)
+
+    if type_goods is not None:
+        goods = goods.filter(type_goods=type_goods)
+
+    return goods.update(low_stock_threshold=threshold)
@@ -0,0 +1,140 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+from django.conf import settings
+from pharmacy import models
+import datetime
+import decimal
+
+
+WATERMARK = 'loyalty_bonus'
+BATCH_SIZE = 5_000
+# info! оплаты моложе этого не учитываются: транзакция оплаты с более ранним paid_at могла еще не зафиксироваться
+SAFETY_LAG = datetime.timedelta(seconds=30)
+
+
+def _parse_rate(value, setting):
+    try:
+        rate = decimal.Decimal(value.strip())
+    except (decimal.InvalidOperation, AttributeError):
+        raise ImproperlyConfigured(f'{setting}: {value!r} is not a number')
+
+    if not rate.is_finite() or rate < 0:
+        raise ImproperlyConfigured(f'{setting}: {value!r} must be a non-negative number')
+
+    return rate
+
+
+def get_percent():
+    return _parse_rate(settings.LOYALTY_BONUS_PERCENT, 'LOYALTY_BONUS_PERCENT')
+
+
+# info! "1:0,5:2" -> {TypeGoods.MEDICINE: 0, TypeGoods.SUPPLEMENTS_VITAMINS: 2}
+def get_type_multipliers():
+    multipliers = {}
+
+    for item in filter(None, (item.strip() for item in settings.LOYALTY_BONUS_TYPE_MULTIPLIERS.split(','))):
+        type_goods, separator, multiplier = item.partition(':')
+
+        if not separator:
+            raise ImproperlyConfigured(f'LOYALTY_BONUS_TYPE_MULTIPLIERS: {item!r} '
+                                       f'must look like "<type>:<multiplier>"')
+
+        try:
+            type_goods = models.TypeGoods(int(type_goods))
+        except ValueError:
+            types = ', '.join(str(value) for value in models.TypeGoods.values)
+            raise ImproperlyConfigured(f'LOYALTY_BONUS_TYPE_MULTIPLIERS: {type_goods!r} is not a type of goods, '
+                                       f'expected one of {types}')
+
+        if type_goods in multipliers:
+            raise ImproperlyConfigured(f'LOYALTY_BONUS_TYPE_MULTIPLIERS: type {type_goods.value} is set twice')
+
+        multipliers[type_goods] = _parse_rate(multiplier, 'LOYALTY_BONUS_TYPE_MULTIPLIERS')
+
+    return multipliers
+
+
+# info! покупки после отметки (paid_at, id) берутся пачкой по индексу purchase_paid_at_idx. На каждую покупку
+#  с картой лояльности пишется строка BonusAccrual, а бонусы зачисляются на карты одним UPDATE ... FROM
+#  только по вставленным строкам, поэтому повторный запуск ничего не начисляет дважды.
+#  Процент считается от оплаченной деньгами суммы, доля каждой позиции умножается на множитель ее типа товара.
+#  Заблокированные карты получают запись с 0 бонусов
+def accrue(batch_size=BATCH_SIZE):
+    processed = accrued = 0
+    percent = get_percent()
+    multipliers = get_type_multipliers()
+
+    while True:
+        with transaction.atomic():
+            models.PaymentWatermark.objects.get_or_create(name=WATERMARK)
+            watermark = models.PaymentWatermark.objects.select_for_update().get(name=WATERMARK)
+            purchases, bonuses = _accrue_batch(watermark, batch_size, percent, multipliers)
+
+        processed += purchases
+        accrued += bonuses
+
+        if purchases < batch_size:
+            return processed, accrued
+
+
+def _accrue_batch(watermark, batch_size, percent, multipliers):
+    purchase_table = models.Purchase._meta.db_table
+    purchase_goods_table = models.PurchaseGoods._meta.db_table
+    goods_table = models.Goods._meta.db_table
+    card_table = models.LoyaltyCard._meta.db_table
+    accrual_table = models.BonusAccrual._meta.db_table
+    after = watermark.paid_at or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            WITH batch AS (
+                SELECT id, paid_at, user_buy_id, total_price
+                FROM {purchase_table}
+                WHERE is_paid AND (paid_at, id) > (%s, %s) AND paid_at < %s
+                ORDER BY paid_at, id
+                LIMIT %s
+            ),
+            weights AS (
+                SELECT batch.id AS purchase_id,
+                       SUM(purchase_goods.amount * purchase_goods.unit_price * COALESCE(multiplier.value, 1))
+                           / NULLIF(SUM(purchase_goods.amount * purchase_goods.unit_price), 0) AS weight
+                FROM batch
+                JOIN {purchase_goods_table} AS purchase_goods ON purchase_goods.purchase_id = batch.id
+                JOIN {goods_table} AS goods ON goods.id = purchase_goods.goods_purchase_id
+                LEFT JOIN UNNEST(%s::smallint[], %s::numeric[]) AS multiplier (type_goods, value)
+                       ON multiplier.type_goods = goods.type_goods
+                GROUP BY batch.id
+            ),
+            accrued AS (
+                INSERT INTO {accrual_table} (purchase_id, card_id, bonuses)
+                SELECT batch.id, card.uuid,
+                       CASE WHEN card.card_status = %s THEN 0
+                            ELSE FLOOR(batch.total_price * COALESCE(weights.weight, 0) * %s / 100 / %s)
+                       END
+                FROM batch
+                JOIN {card_table} AS card ON card.user_card_id = batch.user_buy_id
+                LEFT JOIN weights ON weights.purchase_id = batch.id
+                ON CONFLICT (purchase_id) DO NOTHING
+                RETURNING card_id, bonuses
+            ),
+            credited AS (
+                UPDATE {card_table} AS card
+                SET bonuses = card.bonuses + totals.bonuses
+                FROM (SELECT card_id, SUM(bonuses) AS bonuses FROM accrued GROUP BY card_id) AS totals
+                WHERE card.uuid = totals.card_id AND totals.bonuses > 0
+            )
+            SELECT COUNT(*), MAX(paid_at), (ARRAY_AGG(id ORDER BY paid_at DESC, id DESC))[1],
+                   (SELECT COALESCE(SUM(bonuses), 0) FROM accrued)
+            FROM batch
+        ''', (after, watermark.purchase_id, timezone.now() - SAFETY_LAG, batch_size,
+              [type_goods.value for type_goods in multipliers], list(multipliers.values()),
+              models.StatusCart.BLOCKED, percent, models.LoyaltyCard.BONUS_IN_CURRENCY))
+        purchases, paid_at, purchase_id, bonuses = cursor.fetchone()
+
+    if purchases:
+        watermark.paid_at = paid_at
+        watermark.purchase_id = purchase_id
+        watermark.save(update_fields=('paid_at', 'purchase_id',))
+
+    return purchases, int(bonuses)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from pharmacy import loyalty_bonus
+import time
+
+
+class Command(BaseCommand):
+    help = 'accruing loyalty bonuses for purchases paid since the last run, in watch mode new payments are awaited'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='keep running and accrue bonuses for new payments')
+        parser.add_argument('--interval', type=int, default=60, help='seconds between runs in watch mode')
+        parser.add_argument('--batch-size', type=int, default=loyalty_bonus.BATCH_SIZE,
+                            help='purchases processed in one transaction')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, accrued = loyalty_bonus.accrue(options['batch_size'])
+
+            if processed:
+                self.stdout.write(f'{processed} purchases processed, {accrued} bonuses accrued')
+
+            if not options['watch']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management import call_command
+from django.db import connection
+from pharmacy import models, filters
+from django.conf import settings
+from faker import Faker
+import statistics
+import decimal
+import time
+import os
+
+
+class Command(BaseCommand):
+    help = 'comparing full-text goods search with the name icontains filter on a seeded test catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500_000, help='catalog size to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='runs of every query')
+        parser.add_argument('--keep-data', action='store_true',
+                            help='keep the seeded goods in the test database for the next run')
+        parser.add_argument('terms', nargs='*', default=['para', 'vitamin', 'cream tab'], help='searched terms')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            raise CommandError('benchmark is available only in debug mode')
+
+        # info! каталог засевается сотнями тысяч товаров, поэтому только в отдельной базе
+        test_db = os.getenv('NAME_TEST_DB')
+
+        if not test_db:
+            raise CommandError('set NAME_TEST_DB to a separate database the benchmark may fill with goods')
+
+        if test_db == connection.settings_dict['NAME']:
+            raise CommandError('NAME_TEST_DB must differ from the main database')
+
+        connection.close()
+        connection.settings_dict['NAME'] = test_db
+        call_command('migrate', verbosity=0)
+
+        last_pk = models.Goods.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+        try:
+            self._seed_catalog(options['rows'])
+
+            for term in options['terms']:
+                icontains = self._measure(lambda: self._filter({'name': term}), options['repeat'])
+                search = self._measure(lambda: self._filter({'search': term}), options['repeat'])
+
+                self.stdout.write(f'{term!r}: icontains median {icontains:.2f} ms, search median {search:.2f} ms')
+        finally:
+            if not options['keep_data']:
+                self._drop_seeded(last_pk)
+
+    # info! засеянные товары создаются bulk_create без сигналов, связанных строк у них нет
+    def _drop_seeded(self, last_pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {models.Goods._meta.db_table} WHERE id > %s', (last_pk,))
+            self.stdout.write(f'{cursor.rowcount} seeded goods removed')
+
+    def _seed_catalog(self, rows):
+        exists = models.Goods.objects.count()
+        fake = Faker()
+        Faker.seed(0)
+        batch = []
+
+        for i in range(exists, rows):
+            batch.append(models.Goods(name=f'{fake.word()} {fake.word()} {i}',
+                                      goods_info=fake.sentence(nb_words=12),
+                                      type_goods=i % len(models.TypeGoods.choices),
+                                      price=decimal.Decimal(i % 10_000) / 100,
+                                      amount_in_stock=i % 100))
+
+            if len(batch) == 10_000:
+                models.Goods.objects.bulk_create(batch)
+                batch.clear()
+
+        models.Goods.objects.bulk_create(batch)
+        self.stdout.write(f'catalog contains {models.Goods.objects.count()} goods')
+
+    @staticmethod
+    def _filter(data):
+        queryset = filters.GoodsListFilter(data, queryset=models.Goods.objects.all()).qs
+
+        return list(queryset.order_by(*queryset.query.order_by, 'pk')[:settings.REST_FRAMEWORK['PAGE_SIZE']])
+
+    @staticmethod
+    def _measure(query, repeat):
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1_000)
+
+        return statistics.median(timings)
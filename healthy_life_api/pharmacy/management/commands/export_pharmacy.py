@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from pharmacy import exports
+import sys
+
+
+class Command(BaseCommand):
+    help = 'exporting goods, purchases, goods in purchases or reviews as json lines or csv'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=tuple(exports.DATASETS))
+        parser.add_argument('--format', choices=exports.FORMATS, default='jsonl', help='output format')
+        parser.add_argument('--output', help='output file, by default stdout')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE, help='rows fetched per batch')
+
+    def handle(self, *args, **options):
+        chunks = exports.stream_rows(options['dataset'], options['format'], options['chunk_size'])
+
+        if options['output'] is None:
+            sys.stdout.writelines(chunks)
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(chunks)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from pharmacy import promotion_fan_out
+import time
+
+
+class Command(BaseCommand):
+    help = 'sending notifications about new promotions to subscribed users, in watch mode new promotions are awaited'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='keep running and send new promotions')
+        parser.add_argument('--interval', type=int, default=5, help='seconds between checks in watch mode')
+        parser.add_argument('--chunk-size', type=int, default=promotion_fan_out.CHUNK_SIZE,
+                            help='notifications inserted in one transaction')
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            notified = promotion_fan_out.run_pending(options['chunk_size'])
+
+            if notified:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{notified} notifications sent in {elapsed:.1f} s '
+                                  f'({notified / elapsed:.0f} rows/s)')
+
+            if not options['watch']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from pharmacy import goods_import
+import csv
+
+
+class Command(BaseCommand):
+    help = 'importing goods from a csv or jsonl file, goods with an existing name are updated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='file with columns name, type, info, price, stock')
+        parser.add_argument('--format', choices=goods_import.FORMATS, help='file format, by default from extension')
+        parser.add_argument('--errors', help='file for rows that were not imported, by default <path>.errors.csv')
+        parser.add_argument('--chunk-size', type=int, default=goods_import.CHUNK_SIZE, help='rows per batch')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or goods_import.detect_format(path)
+        errors_path = options['errors'] or f'{path}.errors.csv'
+
+        try:
+            with (open(path, encoding='utf-8-sig', newline='') as stream,
+                  open(errors_path, 'w', encoding='utf-8', newline='') as errors_stream):
+                result = goods_import.import_goods(stream, file_format, errors_stream, options['chunk_size'])
+        except (OSError, UnicodeDecodeError, csv.Error) as error:
+            raise CommandError(f'import failed: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'rows {result['rows']}, created {result['created']}, '
+                                             f'updated {result['updated']}, failed {result['failed']}'))
+
+        if result['failed']:
+            self.stdout.write(self.style.WARNING(f'rows with errors are listed in {errors_path}'))
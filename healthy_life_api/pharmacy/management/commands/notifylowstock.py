@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from pharmacy import low_stock
+import time
+
+
+class Command(BaseCommand):
+    help = 'notifying pharmacists about goods whose stock has fallen to the low stock threshold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='keep running and check stock periodically')
+        parser.add_argument('--interval', type=int, default=300, help='seconds between checks in watch mode')
+
+    def handle(self, *args, **options):
+        while True:
+            notified = low_stock.notify()
+
+            if notified:
+                self.stdout.write(f'pharmacists notified about {notified} goods')
+
+            if not options['watch']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q, Sum
+from django.db import transaction
+from pharmacy import models, catalog_cache
+import decimal
+
+
+class Command(BaseCommand):
+    help = 'rebuilding the goods rating statistics from reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='only report goods whose statistics differ from the reviews')
+
+    def handle(self, *args, **options):
+        actual = {stats.rating_goods_id: stats for stats in self._aggregate_reviews()}
+
+        if options['check']:
+            self._check(actual)
+            return
+
+        with transaction.atomic():
+            models.GoodsRatingStats.objects.all().delete()
+            models.GoodsRatingStats.objects.bulk_create(actual.values(), batch_size=1_000)
+            catalog_cache.bump_version_on_commit()
+
+        self.stdout.write(self.style.SUCCESS(f'rating statistics rebuilt for {len(actual)} goods'))
+
+    @staticmethod
+    def _aggregate_reviews():
+        half = decimal.Decimal('0.5')
+        histogram = {
+            field: Count('pk', filter=Q(grade__gte=grade - half, grade__lt=grade + half))
+            for grade, field in enumerate(models.GoodsRatingStats.GRADE_FIELDS)
+        }
+
+        rows = (models.GoodsReview.objects
+                .values('goods_review')
+                .annotate(review_count=Count('pk'), grade_sum=Sum('grade'), **histogram)
+                .order_by())
+
+        for row in rows:
+            yield models.GoodsRatingStats(rating_goods_id=row.pop('goods_review'), **row)
+
+    def _check(self, actual):
+        fields = ('review_count', 'grade_sum',) + models.GoodsRatingStats.GRADE_FIELDS
+        stored = {stats.rating_goods_id: stats for stats in models.GoodsRatingStats.objects.all()}
+        drifted = []
+
+        for goods_id in actual.keys() | stored.keys():
+            expected = actual.get(goods_id, models.GoodsRatingStats(rating_goods_id=goods_id))
+            current = stored.get(goods_id, models.GoodsRatingStats(rating_goods_id=goods_id))
+
+            if any(getattr(expected, field) != getattr(current, field) for field in fields):
+                drifted.append(goods_id)
+
+        if drifted:
+            self.stdout.write(self.style.WARNING(f'rating statistics drifted for goods: {sorted(drifted)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('rating statistics are consistent with reviews'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pharmacy import prices
+import time
+
+
+class Command(BaseCommand):
+    help = 'refreshing goods prices with promotions, in watch mode prices are switched when promotions end'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='keep running and switch prices on promotion end')
+        parser.add_argument('--interval', type=int, default=60,
+                            help='maximum seconds between checks in watch mode')
+
+    def handle(self, *args, **options):
+        updated = prices.refresh_effective_prices()
+        self.stdout.write(self.style.SUCCESS(f'prices refreshed for {updated} goods'))
+
+        while options['watch']:
+            time.sleep(self._seconds_to_next_change(options['interval']))
+
+            expired = prices.expire_effective_prices()
+
+            if expired:
+                self.stdout.write(f'promotion prices expired for {expired} goods')
+
+    # info! ожидание до ближайшего окончания акции, но не дольше interval, чтобы подхватить новые акции
+    @staticmethod
+    def _seconds_to_next_change(interval):
+        next_change = prices.next_price_change()
+
+        if next_change is None:
+            return interval
+
+        return min(max((next_change - timezone.now()).total_seconds(), 0), interval)
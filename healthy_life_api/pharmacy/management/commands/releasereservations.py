@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from pharmacy import reservations
+import time
+
+
+class Command(BaseCommand):
+    help = 'deleting expired stock reservations, in watch mode the check is repeated'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='keep running and delete expired reservations')
+        parser.add_argument('--interval', type=int, default=60, help='seconds between checks in watch mode')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='reservations deleted in one query')
+
+    def handle(self, *args, **options):
+        while True:
+            released = reservations.release_expired(options['batch_size'])
+
+            if released:
+                self.stdout.write(f'{released} expired reservations released')
+
+            if not options['watch']:
+                break
+
+            time.sleep(options['interval'])
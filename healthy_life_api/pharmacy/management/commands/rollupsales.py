@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from pharmacy import sales_rollup
+import time
+
+
+class Command(BaseCommand):
+    help = 'adding purchases paid since the last run to the daily sales rollups, in watch mode new payments are awaited'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='keep running and roll up new payments')
+        parser.add_argument('--interval', type=int, default=60, help='seconds between runs in watch mode')
+        parser.add_argument('--batch-size', type=int, default=sales_rollup.BATCH_SIZE,
+                            help='purchases rolled up in one transaction')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = sales_rollup.roll_up(options['batch_size'])
+
+            if processed:
+                self.stdout.write(f'{processed} purchases rolled up')
+
+            if not options['watch']:
+                break
+
+            time.sleep(options['interval'])
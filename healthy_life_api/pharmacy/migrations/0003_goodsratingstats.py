@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoodsRatingStats',
+            fields=[
+                ('rating_goods', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats_fk', serialize=False, to='pharmacy.goods', verbose_name='rated goods')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='amount of reviews')),
+                ('grade_sum', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='sum of grades')),
+                ('amount_grade_0', models.PositiveIntegerField(default=0, verbose_name='amount of grades 0')),
+                ('amount_grade_1', models.PositiveIntegerField(default=0, verbose_name='amount of grades 1')),
+                ('amount_grade_2', models.PositiveIntegerField(default=0, verbose_name='amount of grades 2')),
+                ('amount_grade_3', models.PositiveIntegerField(default=0, verbose_name='amount of grades 3')),
+                ('amount_grade_4', models.PositiveIntegerField(default=0, verbose_name='amount of grades 4')),
+                ('amount_grade_5', models.PositiveIntegerField(default=0, verbose_name='amount of grades 5')),
+            ],
+            options={
+                'verbose_name': 'goods rating',
+                'verbose_name_plural': 'goods ratings',
+            },
+        ),
+    ]
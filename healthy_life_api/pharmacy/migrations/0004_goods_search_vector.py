@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:26
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0003_goodsratingstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector('goods_info', config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), output_field=django.contrib.postgres.search.SearchVectorField(), verbose_name='search vector'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='goods_search_vector_idx'),
+        ),
+    ]
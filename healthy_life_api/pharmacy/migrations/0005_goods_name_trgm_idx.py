@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:28
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0004_goods_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='goods',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='goods_name_trgm_idx', opclasses=('gin_trgm_ops',)),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:34
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0005_goods_name_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='discount_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='price with promotion'),
+        ),
+        migrations.AddField(
+            model_name='goods',
+            name='discount_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='time end of price with promotion'),
+        ),
+        migrations.AddField(
+            model_name='goods',
+            name='effective_price',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=django.db.models.functions.comparison.Coalesce('discount_price', 'price'), output_field=models.DecimalField(decimal_places=2, max_digits=8), verbose_name='effective price'),
+        ),
+        migrations.RunSQL(
+            sql='''
+                UPDATE pharmacy_goods AS goods
+                SET discount_price = ROUND(goods.price * (100 - promotion.promotion_percentage) / 100, 2),
+                    discount_until = promotion.time_end_promotion
+                FROM (
+                    SELECT DISTINCT ON (promotion_goods_id) promotion_goods_id, promotion_percentage, time_end_promotion
+                    FROM pharmacy_promotion
+                    WHERE time_end_promotion > NOW()
+                    ORDER BY promotion_goods_id, time_end_promotion DESC
+                ) AS promotion
+                WHERE promotion.promotion_goods_id = goods.id
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0006_goods_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromotionFanOut',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.CharField(max_length=512, verbose_name='notification message')),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, 'pending'), (1, 'running'), (2, 'done')], default=0, verbose_name='status fan-out')),
+                ('subscribers', models.PositiveIntegerField(blank=True, null=True, verbose_name='subscribers at start')),
+                ('notified', models.PositiveIntegerField(default=0, verbose_name='notified users')),
+                ('last_user', models.BigIntegerField(default=0, verbose_name='last notified user id')),
+                ('date_create', models.DateTimeField(auto_now_add=True, verbose_name='creation time')),
+                ('date_finish', models.DateTimeField(blank=True, null=True, verbose_name='finish time')),
+                ('promotion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fan_out_fk', to='pharmacy.promotion', verbose_name='promotion')),
+            ],
+            options={
+                'verbose_name': 'promotion notifications fan-out',
+                'verbose_name_plural': 'promotion notifications fan-outs',
+                'indexes': [models.Index(condition=models.Q(('status', 2), _negated=True), fields=['id'], name='promotion_fan_out_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0007_promotionfanout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveSmallIntegerField(verbose_name='amount')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='time end of reservation')),
+                ('goods_reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_goods_fk', to='pharmacy.goods', verbose_name='reserved goods')),
+                ('purchase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_purchase_fk', to='pharmacy.purchase', verbose_name='purchase')),
+            ],
+            options={
+                'verbose_name': 'stock reservation',
+                'verbose_name_plural': 'stock reservations',
+                'indexes': [models.Index(fields=['goods_reservation', 'expires_at'], include=('amount',), name='reservation_active_idx')],
+                'constraints': [models.UniqueConstraint(fields=('purchase', 'goods_reservation'), name='reservation_purchase_goods_UQ'), models.CheckConstraint(condition=models.Q(('amount__gte', 1)), name='reservation_amount_CK')],
+            },
+        ),
+    ]
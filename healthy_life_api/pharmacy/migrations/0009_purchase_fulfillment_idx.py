@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0008_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('goods_is_received', False), ('is_paid', True)), fields=['date_buy', 'id'], name='purchase_fulfillment_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0009_purchase_fulfillment_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('type_goods', models.PositiveSmallIntegerField(choices=[(0, 'other'), (1, 'medicine'), (2, 'medical products'), (3, 'cosmetics'), (4, 'hygiene'), (5, 'supplements/vitamins')], verbose_name='type goods')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='units sold')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='revenue')),
+                ('bonus_spend', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='paid with bonuses in currency')),
+            ],
+            options={
+                'verbose_name': 'daily sales',
+                'verbose_name_plural': 'daily sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='name rollup')),
+                ('paid_at', models.DateTimeField(null=True, verbose_name='payment time of last purchase')),
+                ('purchase_id', models.BigIntegerField(default=0, verbose_name='last purchase id')),
+            ],
+            options={
+                'verbose_name': 'sales watermark',
+                'verbose_name_plural': 'sales watermarks',
+            },
+        ),
+        migrations.AddField(
+            model_name='purchase',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='time of payment'),
+        ),
+        migrations.AddField(
+            model_name='purchasegoods',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='price per unit at payment'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('is_paid', True)), fields=['paid_at', 'id'], name='purchase_paid_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='salesdaily',
+            name='goods_sales',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_goods_fk', to='pharmacy.goods', verbose_name='sold goods'),
+        ),
+        migrations.AddIndex(
+            model_name='salesdaily',
+            index=models.Index(fields=['goods_sales', 'day'], name='sales_daily_goods_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesdaily',
+            constraint=models.UniqueConstraint(fields=('day', 'goods_sales'), name='sales_daily_day_goods_UQ'),
+        ),
+        # info! для покупок, оплаченных до появления полей:
+        #  - время оплаты берется из даты покупки и намеренно приходится на полночь. Порядок внутри дня и равенство
+        #    времени для отметки сводки продаж решает id покупки, а сводки строятся по дням, так что это не влияет
+        #  - цены на момент оплаты не сохранились, поэтому уплаченное (total_price и бонусы по 0.01, как
+        #    LoyaltyCard.BONUS_IN_CURRENCY) делится между строками пропорционально amount * текущая цена. Сумма
+        #    строк может отличаться от уплаченного на копейки округления. Строки покупок без total_price остаются
+        #    без цены и в сводки продаж не попадают
+        migrations.RunSQL(
+            sql='''
+                UPDATE pharmacy_purchase SET paid_at = date_buy::timestamptz WHERE is_paid AND paid_at IS NULL;
+                UPDATE pharmacy_purchasegoods AS purchase_goods
+                SET unit_price = COALESCE(ROUND(shares.paid * goods.price / NULLIF(shares.list_total, 0), 2), 0)
+                FROM pharmacy_goods AS goods, (
+                    SELECT purchase.id AS purchase_id,
+                           purchase.total_price + COALESCE(purchase.paid_with_bonuses, 0) * 0.01 AS paid,
+                           SUM(line.amount * line_goods.price) AS list_total
+                    FROM pharmacy_purchase AS purchase
+                    JOIN pharmacy_purchasegoods AS line ON line.purchase_id = purchase.id
+                    JOIN pharmacy_goods AS line_goods ON line_goods.id = line.goods_purchase_id
+                    WHERE purchase.is_paid AND purchase.total_price IS NOT NULL
+                    GROUP BY purchase.id
+                ) AS shares
+                WHERE goods.id = purchase_goods.goods_purchase_id
+                  AND shares.purchase_id = purchase_goods.purchase_id
+                  AND purchase_goods.unit_price IS NULL;
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
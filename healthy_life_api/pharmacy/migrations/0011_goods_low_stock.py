@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0010_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='low_stock_alerted',
+            field=models.BooleanField(db_default=False, verbose_name='low stock alert sent'),
+        ),
+        migrations.AddField(
+            model_name='goods',
+            name='low_stock_threshold',
+            field=models.PositiveSmallIntegerField(db_default=5, verbose_name='low stock threshold'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(condition=models.Q(('amount_in_stock__lte', models.F('low_stock_threshold'))), fields=['id'], name='goods_low_stock_idx'),
+        ),
+    ]
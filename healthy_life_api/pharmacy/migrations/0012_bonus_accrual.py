@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:08
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0011_goods_low_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BonusAccrual',
+            fields=[
+                ('purchase', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bonus_accrual_fk', serialize=False, to='pharmacy.purchase', verbose_name='purchase')),
+                ('bonuses', models.PositiveIntegerField(verbose_name='accrued bonuses')),
+                ('date_accrual', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), verbose_name='time of accrual')),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bonus_accrual_card_fk', to='pharmacy.loyaltycard', verbose_name='loyalty card')),
+            ],
+            options={
+                'verbose_name': 'bonus accrual',
+                'verbose_name_plural': 'bonus accruals',
+            },
+        ),
+        migrations.RenameModel(
+            old_name='SalesWatermark',
+            new_name='PaymentWatermark',
+        ),
+        migrations.AlterModelOptions(
+            name='paymentwatermark',
+            options={'verbose_name': 'payment watermark', 'verbose_name_plural': 'payment watermarks'},
+        ),
+        migrations.AlterField(
+            model_name='paymentwatermark',
+            name='name',
+            field=models.CharField(max_length=64, unique=True, verbose_name='name batch job'),
+        ),
+        # info! бонусы начисляются только за оплаты после установки, без всей истории покупок
+        migrations.RunSQL(
+            sql='''
+                INSERT INTO pharmacy_paymentwatermark (name, paid_at, purchase_id)
+                SELECT 'loyalty_bonus', paid_at, id
+                FROM pharmacy_purchase
+                WHERE is_paid AND paid_at IS NOT NULL
+                ORDER BY paid_at DESC, id DESC
+                LIMIT 1
+                ON CONFLICT (name) DO NOTHING;
+            ''',
+            reverse_sql="DELETE FROM pharmacy_paymentwatermark WHERE name = 'loyalty_bonus';",
+        ),
+    ]
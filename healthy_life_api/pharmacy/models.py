@@ -1,5 +1,9 @@
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from healthy_life_api.settings import AUTH_USER_MODEL
+from django.db.models.functions import Coalesce, Now, NullIf, Round
+from django.contrib.postgres.indexes import GinIndex
 from common.models import IMessage
+from django.utils import timezone
 from django.db import models
 import decimal
 import uuid
@@ -19,6 +23,12 @@ class StatusCart(models.IntegerChoices):
     BLOCKED = 1, 'blocked'
 
 
+class StatusFanOut(models.IntegerChoices):
+    PENDING = 0, 'pending'
+    RUNNING = 1, 'running'
+    DONE = 2, 'done'
+
+
 class Goods(models.Model):
     class Meta:
         constraints = [
@@ -27,6 +37,12 @@ class Goods(models.Model):
                 name='price_goods_CK',
             ),
         ]
+        indexes = [
+            GinIndex(fields=('search_vector',), name='goods_search_vector_idx'),
+            GinIndex(fields=('name',), name='goods_name_trgm_idx', opclasses=('gin_trgm_ops',)),
+            models.Index(fields=('id',), condition=models.Q(amount_in_stock__lte=models.F('low_stock_threshold')),
+                         name='goods_low_stock_idx'),
+        ]
         verbose_name = 'goods'
         verbose_name_plural = 'goods'
 
@@ -38,8 +54,61 @@ class Goods(models.Model):
     goods_info = models.CharField(max_length=2048, verbose_name='info of goods')
     price = models.DecimalField(max_digits=8, decimal_places=2, verbose_name='price')
     amount_in_stock = models.PositiveSmallIntegerField(default=0, verbose_name='amount in stock')
+    # info! при остатке не больше порога фармацевты получают уведомление (pharmacy.low_stock), повторно - только
+    #  после пополнения выше порога. Значения по умолчанию задаются в бд, чтобы их получали и товары из импорта
+    low_stock_threshold = models.PositiveSmallIntegerField(db_default=5, verbose_name='low stock threshold')
+    low_stock_alerted = models.BooleanField(db_default=False, verbose_name='low stock alert sent')
+    # info! поддерживается самой бд при любой записи названия или описания
+    search_vector = models.GeneratedField(
+        expression=(SearchVector('name', weight='A', config='simple') +
+                    SearchVector('goods_info', weight='B', config='simple')),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name='search vector'
+    )
+    # info! цена по действующей акции хранится в строке товара и обновляется pharmacy.prices
+    #  при изменении акций и по их окончании, effective_price - итоговая цена для индекса фильтров.
+    #  До сброса закончившейся акции она еще со скидкой, поэтому фильтры используют prices.price_filter
+    discount_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True,
+                                         verbose_name='price with promotion')
+    discount_until = models.DateTimeField(null=True, blank=True, db_index=True,
+                                          verbose_name='time end of price with promotion')
+    effective_price = models.GeneratedField(
+        expression=Coalesce('discount_price', 'price'),
+        output_field=models.DecimalField(max_digits=8, decimal_places=2),
+        db_persist=True,
+        db_index=True,
+        verbose_name='effective price'
+    )
+
+    # info! акция и рейтинг считаются в одном запросе вместе с товаром, без запросов на каждую строку.
+    #  Акция, закончившаяся до обновления цен планировщиком, уже не учитывается
+    class CatalogManager(models.Manager):
+        def get_queryset(self):
+            return super().get_queryset().annotate(
+                promotion_price=models.Case(
+                    models.When(discount_until__gt=Now(), then=models.F('discount_price')),
+                    default=None,
+                    output_field=models.DecimalField(max_digits=8, decimal_places=2)
+                ),
+                goods_rating=Round(
+                    models.ExpressionWrapper(
+                        models.F('rating_stats_fk__grade_sum') / NullIf(models.F('rating_stats_fk__review_count'), 0),
+                        output_field=models.DecimalField(max_digits=3, decimal_places=2)
+                    ),
+                    2
+                ),
+            )
 
     objects = models.Manager()
+    catalog = CatalogManager()
+
+    @property
+    def current_price(self):
+        if self.discount_until is not None and self.discount_until > timezone.now():
+            return self.discount_price
+
+        return self.price
 
     def __str__(self):
         return f'@\'{self.name}\''
@@ -71,6 +140,34 @@ class Promotion(models.Model):
         return f'@\'{self.pk}\''
 
 
+# info! рассылка уведомлений о новой акции, выполняется фоновым обработчиком (manage.py fanoutpromotions).
+#  last_user - id последнего уведомленного пользователя, рассылка продолжается с него после перезапуска
+class PromotionFanOut(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=('id',), condition=~models.Q(status=StatusFanOut.DONE),
+                         name='promotion_fan_out_pending_idx'),
+        ]
+        verbose_name = 'promotion notifications fan-out'
+        verbose_name_plural = 'promotion notifications fan-outs'
+
+    promotion = models.OneToOneField(Promotion, on_delete=models.CASCADE, related_name='fan_out_fk',
+                                     verbose_name='promotion')
+    message = models.CharField(max_length=512, verbose_name='notification message')
+    status = models.PositiveSmallIntegerField(choices=StatusFanOut.choices, default=StatusFanOut.PENDING,
+                                              verbose_name='status fan-out')
+    subscribers = models.PositiveIntegerField(null=True, blank=True, verbose_name='subscribers at start')
+    notified = models.PositiveIntegerField(default=0, verbose_name='notified users')
+    last_user = models.BigIntegerField(default=0, verbose_name='last notified user id')
+    date_create = models.DateTimeField(auto_now_add=True, verbose_name='creation time')
+    date_finish = models.DateTimeField(null=True, blank=True, verbose_name='finish time')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.pk}\''
+
+
 # info! отзыв может существать только один на человека, но его можно изменить и удалить
 class GoodsReview(IMessage):
     class Meta:
@@ -94,6 +191,63 @@ class GoodsReview(IMessage):
     status = None  # info! либо существует, либо нет
 
 
+# info! агрегаты отзывов поддерживаются при создании, изменении и удалении отзыва,
+#  пересобираются командой rebuildgoodsrating
+class GoodsRatingStats(models.Model):
+    GRADE_FIELDS = tuple(f'amount_grade_{grade}' for grade in range(6))
+
+    class Meta:
+        verbose_name = 'goods rating'
+        verbose_name_plural = 'goods ratings'
+
+    rating_goods = models.OneToOneField(Goods,
+                                        primary_key=True,
+                                        on_delete=models.CASCADE,
+                                        related_name='rating_stats_fk',
+                                        verbose_name='rated goods')
+    review_count = models.PositiveIntegerField(default=0, verbose_name='amount of reviews')
+    grade_sum = models.DecimalField(default=0, max_digits=12, decimal_places=2, verbose_name='sum of grades')
+    # info! гистограмма оценок, оценка округляется до целого
+    amount_grade_0 = models.PositiveIntegerField(default=0, verbose_name='amount of grades 0')
+    amount_grade_1 = models.PositiveIntegerField(default=0, verbose_name='amount of grades 1')
+    amount_grade_2 = models.PositiveIntegerField(default=0, verbose_name='amount of grades 2')
+    amount_grade_3 = models.PositiveIntegerField(default=0, verbose_name='amount of grades 3')
+    amount_grade_4 = models.PositiveIntegerField(default=0, verbose_name='amount of grades 4')
+    amount_grade_5 = models.PositiveIntegerField(default=0, verbose_name='amount of grades 5')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.pk}\''
+
+    @classmethod
+    def grade_field(cls, grade):
+        return cls.GRADE_FIELDS[int(grade.quantize(decimal.Decimal('1'), rounding=decimal.ROUND_HALF_UP))]
+
+    # info! вызывается внутри транзакции вместе с сохранением или удалением отзыва
+    @classmethod
+    def apply_review(cls, goods_id, old_grade=None, new_grade=None):
+        changes = {'review_count': 0, 'grade_sum': decimal.Decimal('0')}
+
+        if old_grade is not None:
+            changes['review_count'] -= 1
+            changes['grade_sum'] -= old_grade
+            changes[cls.grade_field(old_grade)] = changes.get(cls.grade_field(old_grade), 0) - 1
+
+        if new_grade is not None:
+            changes['review_count'] += 1
+            changes['grade_sum'] += new_grade
+            changes[cls.grade_field(new_grade)] = changes.get(cls.grade_field(new_grade), 0) + 1
+
+        changes = {field: models.F(field) + delta for field, delta in changes.items() if delta}
+
+        if not changes:
+            return
+
+        cls.objects.bulk_create([cls(rating_goods_id=goods_id)], ignore_conflicts=True)
+        cls.objects.filter(rating_goods_id=goods_id).update(**changes)
+
+
 class LoyaltyCard(models.Model):
     BONUS_IN_CURRENCY = decimal.Decimal('0.01')
 
@@ -128,6 +282,12 @@ class Purchase(models.Model):
                 name='price_purchase_CK',
             ),
         ]
+        # info! очередь выдачи (оплаченные, но еще не полученные покупки) и новые оплаты для сводок продаж
+        indexes = [
+            models.Index(fields=('date_buy', 'id'), condition=models.Q(is_paid=True, goods_is_received=False),
+                         name='purchase_fulfillment_idx'),
+            models.Index(fields=('paid_at', 'id'), condition=models.Q(is_paid=True), name='purchase_paid_at_idx'),
+        ]
         verbose_name = 'purchase'
         verbose_name_plural = 'purchases'
 
@@ -136,6 +296,7 @@ class Purchase(models.Model):
                                  related_name='user_buy_fk',
                                  verbose_name='buyer')
     date_buy = models.DateField(null=True, verbose_name='timestamp of buy')
+    paid_at = models.DateTimeField(null=True, blank=True, verbose_name='time of payment')
     total_price = models.DecimalField(null=True, max_digits=8, decimal_places=2,
                                       verbose_name='total price')
     # info! не более половины покупки можно оплатить 1бонусами
@@ -170,5 +331,114 @@ class PurchaseGoods(models.Model):
                                        related_name='goods_purchase_fk',
                                        verbose_name='goods in purchase')
     amount = models.PositiveSmallIntegerField(default=1, verbose_name='amount')
+    # info! цена за штуку на момент оплаты, до оплаты пусто. Для покупок до появления поля восстановлена
+    #  миграцией 0010_sales_rollup из уплаченной суммы
+    unit_price = models.DecimalField(null=True, blank=True, max_digits=8, decimal_places=2,
+                                     verbose_name='price per unit at payment')
 
     objects = models.Manager()
+
+
+# info! товар, отложенный под покупку до expires_at. Доступный остаток - amount_in_stock без действующих резервов
+#  других покупок, см. pharmacy.reservations. Просроченные резервы не учитываются и удаляются командой releasereservations
+class StockReservation(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('purchase', 'goods_reservation'), name='reservation_purchase_goods_UQ'),
+            models.CheckConstraint(
+                check=models.Q(amount__gte=1),
+                name='reservation_amount_CK',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('goods_reservation', 'expires_at'), include=('amount',),
+                         name='reservation_active_idx'),
+        ]
+        verbose_name = 'stock reservation'
+        verbose_name_plural = 'stock reservations'
+
+    purchase = models.ForeignKey(Purchase,
+                                 on_delete=models.CASCADE,
+                                 related_name='reservation_purchase_fk',
+                                 verbose_name='purchase')
+    goods_reservation = models.ForeignKey(Goods,
+                                          on_delete=models.CASCADE,
+                                          related_name='reservation_goods_fk',
+                                          verbose_name='reserved goods')
+    amount = models.PositiveSmallIntegerField(verbose_name='amount')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='time end of reservation')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.pk}\''
+
+
+# info! продажи за день по товару, заполняются pharmacy.sales_rollup только по новым оплатам после отметки PaymentWatermark.
+#  type_goods копируется из товара, чтобы выручка по типам считалась без соединения с товарами
+class SalesDaily(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('day', 'goods_sales'), name='sales_daily_day_goods_UQ'),
+        ]
+        indexes = [
+            models.Index(fields=('goods_sales', 'day'), name='sales_daily_goods_day_idx'),
+        ]
+        verbose_name = 'daily sales'
+        verbose_name_plural = 'daily sales'
+
+    day = models.DateField(verbose_name='day')
+    goods_sales = models.ForeignKey(Goods,
+                                    on_delete=models.CASCADE,
+                                    related_name='sales_goods_fk',
+                                    verbose_name='sold goods')
+    type_goods = models.PositiveSmallIntegerField(choices=TypeGoods.choices, verbose_name='type goods')
+    units = models.PositiveIntegerField(default=0, verbose_name='units sold')
+    revenue = models.DecimalField(default=0, max_digits=14, decimal_places=2, verbose_name='revenue')
+    bonus_spend = models.DecimalField(default=0, max_digits=14, decimal_places=2,
+                                      verbose_name='paid with bonuses in currency')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.pk}\''
+
+
+# info! последняя обработанная пакетной задачей оплата: (paid_at, id) покупки, своя отметка у каждой задачи
+class PaymentWatermark(models.Model):
+    class Meta:
+        verbose_name = 'payment watermark'
+        verbose_name_plural = 'payment watermarks'
+
+    name = models.CharField(unique=True, max_length=64, verbose_name='name batch job')
+    paid_at = models.DateTimeField(null=True, verbose_name='payment time of last purchase')
+    purchase_id = models.BigIntegerField(default=0, verbose_name='last purchase id')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.name}\''
+
+
+# info! начисление бонусов за покупку, по одной строке на покупку. Для заблокированных карт пишется 0 бонусов
+class BonusAccrual(models.Model):
+    class Meta:
+        verbose_name = 'bonus accrual'
+        verbose_name_plural = 'bonus accruals'
+
+    purchase = models.OneToOneField(Purchase,
+                                    primary_key=True,
+                                    on_delete=models.CASCADE,
+                                    related_name='bonus_accrual_fk',
+                                    verbose_name='purchase')
+    card = models.ForeignKey(LoyaltyCard,
+                             on_delete=models.CASCADE,
+                             related_name='bonus_accrual_card_fk',
+                             verbose_name='loyalty card')
+    bonuses = models.PositiveIntegerField(verbose_name='accrued bonuses')
+    date_accrual = models.DateTimeField(db_default=Now(), verbose_name='time of accrual')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.pk}\''
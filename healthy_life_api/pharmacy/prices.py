@@ -0,0 +1,54 @@
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Min, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce, Now, Round
+from pharmacy import models, catalog_cache
+
+
+# info! действует акция с самым поздним окончанием, поэтому после ее окончания других действующих акций у товара нет
+def _active_promotion():
+    return (models.Promotion.objects
+            .filter(promotion_goods=OuterRef('pk'), time_end_promotion__gt=Now())
+            .order_by('-time_end_promotion'))
+
+
+def refresh_effective_prices(goods_ids=None):
+    queryset = models.Goods.objects.all() if goods_ids is None else models.Goods.objects.filter(pk__in=goods_ids)
+    percentage = Subquery(_active_promotion().values('promotion_percentage')[:1])
+
+    updated = queryset.update(
+        discount_price=Round(ExpressionWrapper(F('price') * (100 - percentage) / 100,
+                                               output_field=DecimalField(max_digits=8, decimal_places=2)), 2),
+        discount_until=Subquery(_active_promotion().values('time_end_promotion')[:1]),
+    )
+    catalog_cache.bump_version_on_commit()
+
+    return updated
+
+
+def expire_effective_prices():
+    goods_ids = list(models.Goods.objects.filter(discount_until__lte=Now()).values_list('pk', flat=True))
+
+    if not goods_ids:
+        return 0
+
+    return refresh_effective_prices(goods_ids)
+
+
+def next_price_change():
+    return models.Goods.objects.aggregate(next_change=Min('discount_until'))['next_change']
+
+
+# info! условие на текущую цену товара, например price_filter(gte=100, lt=500). Пока планировщик не сбросил
+#  закончившуюся акцию, effective_price еще со скидкой, для таких товаров сравнивается обычная цена.
+#  Для товаров без акции и с действующей акцией используется индекс по effective_price
+def price_filter(**lookups):
+    current = Q(**{f'effective_price__{lookup}': value for lookup, value in lookups.items()})
+    expired = Q(**{f'price__{lookup}': value for lookup, value in lookups.items()})
+
+    return ((current & (Q(discount_until__isnull=True) | Q(discount_until__gt=Now()))) |
+            (expired & Q(discount_until__lte=Now())))
+
+
+# info! то же, что Goods.current_price, но в sql: prefix - путь до товара, например 'goods_purchase__'
+def current_price(prefix=''):
+    return Coalesce(Case(When(**{f'{prefix}discount_until__gt': Now()}, then=F(f'{prefix}discount_price'))),
+                    F(f'{prefix}price'))
@@ -0,0 +1,94 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from user import models as user_models
+from pharmacy import models
+
+
+CHUNK_SIZE = 20_000
+
+
+def enqueue(promotion):
+    return models.PromotionFanOut.objects.create(
+        promotion=promotion, message=f'there is a new discount on the product {promotion.promotion_goods}'
+    )
+
+
+def get_subscribers():
+    return user_models.Settings.objects.filter(receive_notifications_about_discounts=True)
+
+
+def run_pending(chunk_size=CHUNK_SIZE):
+    notified = 0
+    pending = (models.PromotionFanOut.objects
+               .exclude(status=models.StatusFanOut.DONE)
+               .order_by('pk')
+               .values_list('pk', flat=True))
+
+    for fan_out_id in pending:
+        notified += fan_out(fan_out_id, chunk_size)
+
+    return notified
+
+
+def fan_out(fan_out_id, chunk_size=CHUNK_SIZE):
+    notified = 0
+
+    while (inserted := send_chunk(fan_out_id, chunk_size)) is not None:
+        notified += inserted
+
+    return notified
+
+
+# info! пачка подписчиков выбирается по id после last_user и вставляется одним INSERT ... SELECT, ids не покидают бд.
+#  Вставка и сдвиг last_user идут в одной транзакции под блокировкой строки рассылки, поэтому повтор после сбоя
+#  не дублирует уведомления, а второй обработчик пропускает занятую рассылку.
+#  Возвращает число вставленных уведомлений или None, если рассылка завершена или занята
+def send_chunk(fan_out_id, chunk_size=CHUNK_SIZE):
+    settings_meta = user_models.Settings._meta
+    notifications_meta = user_models.Notifications._meta
+    user_column = settings_meta.get_field('user_settings').column
+    notify_column = notifications_meta.get_field('user_notify').column
+
+    with transaction.atomic():
+        job = (models.PromotionFanOut.objects
+               .select_for_update(skip_locked=True)
+               .exclude(status=models.StatusFanOut.DONE)
+               .filter(pk=fan_out_id)
+               .first())
+
+        if job is None:
+            return None
+
+        if job.status == models.StatusFanOut.PENDING:
+            job.status = models.StatusFanOut.RUNNING
+            job.subscribers = get_subscribers().filter(user_settings__gt=job.last_user).count()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                WITH batch AS (
+                    SELECT {user_column} AS user_id
+                    FROM {settings_meta.db_table}
+                    WHERE receive_notifications_about_discounts AND {user_column} > %s
+                    ORDER BY {user_column}
+                    LIMIT %s
+                ),
+                inserted AS (
+                    INSERT INTO {notifications_meta.db_table} ({notify_column}, message, date_notify, viewed)
+                    SELECT user_id, %s, NOW(), FALSE FROM batch
+                    RETURNING {notify_column} AS user_id
+                )
+                SELECT COUNT(*), MAX(user_id) FROM inserted
+            ''', (job.last_user, chunk_size, job.message))
+            inserted, last_user = cursor.fetchone()
+
+        if inserted:
+            job.notified += inserted
+            job.last_user = last_user
+
+        if inserted < chunk_size:
+            job.status = models.StatusFanOut.DONE
+            job.date_finish = timezone.now()
+
+        job.save()
+
+    return inserted
@@ -0,0 +1,70 @@
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+from django.conf import settings
+from pharmacy import models
+import datetime
+
+
+def get_expiry():
+    return timezone.now() + datetime.timedelta(minutes=settings.STOCK_RESERVATION_TTL_MINUTES)
+
+
+# info! сумма действующих резервов товара другими покупками, считается по индексу reservation_active_idx
+def held_by_others(purchase, goods_ref='pk'):
+    held = (models.StockReservation.objects
+            .filter(goods_reservation=OuterRef(goods_ref), expires_at__gt=Now())
+            .exclude(purchase=purchase)
+            .order_by()
+            .values('goods_reservation')
+            .annotate(held=Sum('amount'))
+            .values('held'))
+
+    return Coalesce(Subquery(held, output_field=IntegerField()), 0)
+
+
+# info! строки товаров блокируются на время транзакции вызывающего кода, чтобы параллельный резерв
+#  тех же товаров дождался записи этого. Вызывать внутри transaction.atomic()
+def get_available(purchase, goods_ids):
+    goods = (models.Goods.objects
+             .filter(pk__in=goods_ids)
+             .order_by('pk')
+             .select_for_update()
+             .annotate(held=held_by_others(purchase))
+             .values_list('pk', 'amount_in_stock', 'held'))
+
+    return {goods_id: amount_in_stock - held for goods_id, amount_in_stock, held in goods}
+
+
+def place(purchase, amounts):
+    expires_at = get_expiry()
+    holds = [models.StockReservation(purchase=purchase, goods_reservation_id=goods_id, amount=amount,
+                                     expires_at=expires_at)
+             for goods_id, amount in amounts.items()]
+
+    models.StockReservation.objects.bulk_create(holds, update_conflicts=True,
+                                                unique_fields=('purchase', 'goods_reservation'),
+                                                update_fields=('amount', 'expires_at'))
+
+
+def release(purchase, goods_ids=None):
+    holds = models.StockReservation.objects.filter(purchase=purchase)
+
+    if goods_ids is not None:
+        if not goods_ids:
+            return 0
+
+        holds = holds.filter(goods_reservation__in=goods_ids)
+
+    return holds.delete()[0]
+
+
+# info! просроченные резервы уже не уменьшают доступный остаток, удаление только освобождает место в таблице
+def release_expired(batch_size=10_000):
+    released = 0
+    expired = models.StockReservation.objects.filter(expires_at__lte=Now())
+
+    while batch := list(expired.values_list('pk', flat=True)[:batch_size]):
+        released += models.StockReservation.objects.filter(pk__in=batch).delete()[0]
+
+    return released
@@ -0,0 +1,126 @@
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.conf import settings
+from pharmacy import models
+import datetime
+
+
+WATERMARK = 'sales_daily'
+BATCH_SIZE = 5_000
+# info! оплаты моложе этого не учитываются: транзакция оплаты с более ранним paid_at могла еще не зафиксироваться
+SAFETY_LAG = datetime.timedelta(seconds=30)
+
+
+# info! покупки после отметки (paid_at, id) берутся пачкой по индексу purchase_paid_at_idx, их позиции складываются
+#  в SalesDaily одним INSERT ... ON CONFLICT DO UPDATE, и отметка сдвигается в той же транзакции.
+#  Бонусы покупки делятся между позициями пропорционально их сумме. День считается в часовом поясе проекта
+def roll_up(batch_size=BATCH_SIZE):
+    processed = 0
+
+    while True:
+        with transaction.atomic():
+            models.PaymentWatermark.objects.get_or_create(name=WATERMARK)
+            watermark = models.PaymentWatermark.objects.select_for_update().get(name=WATERMARK)
+            purchases = _roll_up_batch(watermark, batch_size)
+
+        processed += purchases
+
+        if purchases < batch_size:
+            return processed
+
+
+# info! строки без цены на момент оплаты пропускаются, такие есть только у старых покупок без total_price,
+#  см. миграцию 0010_sales_rollup
+def _roll_up_batch(watermark, batch_size):
+    purchase_table = models.Purchase._meta.db_table
+    purchase_goods_table = models.PurchaseGoods._meta.db_table
+    goods_table = models.Goods._meta.db_table
+    sales_table = models.SalesDaily._meta.db_table
+    after = watermark.paid_at or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            WITH batch AS (
+                SELECT id, paid_at, paid_with_bonuses
+                FROM {purchase_table}
+                WHERE is_paid AND (paid_at, id) > (%s, %s) AND paid_at < %s
+                ORDER BY paid_at, id
+                LIMIT %s
+            ),
+            lines AS (
+                SELECT (batch.paid_at AT TIME ZONE %s)::date AS day,
+                       purchase_goods.goods_purchase_id AS goods_id,
+                       purchase_goods.amount AS units,
+                       purchase_goods.amount * purchase_goods.unit_price AS revenue,
+                       batch.paid_with_bonuses * %s * purchase_goods.amount * purchase_goods.unit_price
+                           / NULLIF(SUM(purchase_goods.amount * purchase_goods.unit_price)
+                                    OVER (PARTITION BY batch.id), 0) AS bonus_spend
+                FROM batch
+                JOIN {purchase_goods_table} AS purchase_goods ON purchase_goods.purchase_id = batch.id
+                WHERE purchase_goods.unit_price IS NOT NULL
+            ),
+            rolled_up AS (
+                INSERT INTO {sales_table} AS sales (day, goods_sales_id, type_goods, units, revenue, bonus_spend)
+                SELECT lines.day, lines.goods_id, goods.type_goods, SUM(lines.units),
+                       COALESCE(SUM(lines.revenue), 0), ROUND(COALESCE(SUM(lines.bonus_spend), 0), 2)
+                FROM lines
+                JOIN {goods_table} AS goods ON goods.id = lines.goods_id
+                GROUP BY lines.day, lines.goods_id, goods.type_goods
+                ON CONFLICT (day, goods_sales_id) DO UPDATE
+                SET units = sales.units + EXCLUDED.units,
+                    revenue = sales.revenue + EXCLUDED.revenue,
+                    bonus_spend = sales.bonus_spend + EXCLUDED.bonus_spend
+            )
+            SELECT COUNT(*), MAX(paid_at), (ARRAY_AGG(id ORDER BY paid_at DESC, id DESC))[1] FROM batch
+        ''', (after, watermark.purchase_id, timezone.now() - SAFETY_LAG, batch_size,
+              settings.TIME_ZONE, models.LoyaltyCard.BONUS_IN_CURRENCY))
+        purchases, paid_at, purchase_id = cursor.fetchone()
+
+    if purchases:
+        watermark.paid_at = paid_at
+        watermark.purchase_id = purchase_id
+        watermark.save(update_fields=('paid_at', 'purchase_id',))
+
+    return purchases
+
+
+def get_sales(date_from, date_to):
+    return models.SalesDaily.objects.filter(day__range=(date_from, date_to)).order_by()
+
+
+def _totals():
+    return {'units': Sum('units'), 'revenue': Sum('revenue'), 'bonus_spend': Sum('bonus_spend')}
+
+
+def top_sellers(date_from, date_to, limit=20, order='units'):
+    return list(get_sales(date_from, date_to)
+                .values('goods_sales', name=F('goods_sales__name'))
+                .annotate(**_totals())
+                .order_by(f'-{order}', 'goods_sales')[:limit])
+
+
+def revenue_by_type(date_from, date_to, limit=20, order='revenue'):
+    rows = (get_sales(date_from, date_to)
+            .values('type_goods')
+            .annotate(**_totals())
+            .order_by(f'-{order}', 'type_goods')[:limit])
+
+    return [{**row, 'type_goods': models.TypeGoods(row['type_goods']).label} for row in rows]
+
+
+def trend(date_from, date_to, goods=None):
+    sales = get_sales(date_from, date_to)
+
+    if goods is not None:
+        sales = sales.filter(goods_sales__name=goods)
+
+    return list(sales.values('day').annotate(**_totals()).order_by('day'))
+
+
+# info! отчет: (функция, параметры запроса помимо периода)
+REPORTS = {
+    'top-sellers': (top_sellers, ('limit', 'order',)),
+    'revenue-by-type': (revenue_by_type, ('limit', 'order',)),
+    'trend': (trend, ('goods',)),
+}
@@ -1,20 +1,22 @@
 from rest_framework import serializers
-from django.utils import timezone
-from django.db.models import Avg
+from common.serializers import ImageVariantsField
 from common import validators
-from pharmacy import models
-import decimal
+from pharmacy import models, stock, cart, sales_rollup
+from django.utils import timezone
+import datetime
 
 
 class GoodsListSerializer(serializers.ModelSerializer):
     in_stock = serializers.SerializerMethodField()
     price_with_promotion = serializers.SerializerMethodField()
     goods_rating = serializers.SerializerMethodField()
+    photo_variants = ImageVariantsField(source='photo')
 
     class Meta:
         model = models.Goods
-        fields = ('pk', 'name', 'photo', 'type_goods', 'price', 'in_stock', 'price_with_promotion', 'goods_rating',)
-        read_only_fields = ('pk', 'name', 'photo', 'type_goods', 'price',
+        fields = ('pk', 'name', 'photo', 'photo_variants', 'type_goods', 'price', 'in_stock',
+                  'price_with_promotion', 'goods_rating',)
+        read_only_fields = ('pk', 'name', 'photo', 'photo_variants', 'type_goods', 'price',
                             'in_stock', 'price_with_promotion', 'goods_rating',)
 
     def get_in_stock(self, obj):
@@ -28,18 +30,12 @@ class GoodsListSerializer(serializers.ModelSerializer):
 
         return representation
 
+    # info! значения берутся из аннотаций models.Goods.catalog
     def get_price_with_promotion(self, obj):
-        promotion = models.Promotion.objects.filter(promotion_goods=obj,
-                                                    time_end_promotion__gt=timezone.now()
-                                                    ).order_by('-time_end_promotion').first()
-
-        return str(((obj.price * decimal.Decimal(100 - promotion.promotion_percentage) / 100)
-                    .quantize(decimal.Decimal('0.01'), rounding=decimal.ROUND_HALF_UP))) if promotion else None
+        return str(obj.promotion_price) if obj.promotion_price is not None else None
 
     def get_goods_rating(self, obj):
-        rating = models.GoodsReview.objects.filter(goods_review=obj).aggregate(result_avg=Avg('grade'))['result_avg']
-
-        return round(rating, 2) if rating else .00
+        return round(obj.goods_rating, 2) if obj.goods_rating else .00
 
 
 class GoodsSerializer(serializers.ModelSerializer):
@@ -60,12 +56,13 @@ class GoodsSerializer(serializers.ModelSerializer):
     )
     price_with_promotion = serializers.SerializerMethodField()
     goods_rating = serializers.SerializerMethodField()
+    photo_variants = ImageVariantsField(source='photo')
 
     class Meta:
         model = models.Goods
-        fields = ('pk', 'name', 'photo', 'type_goods', 'goods_info', 'price',
+        fields = ('pk', 'name', 'photo', 'photo_variants', 'type_goods', 'goods_info', 'price',
                   'amount_in_stock', 'price_with_promotion', 'goods_rating',)
-        read_only_fields = ('pk', 'price_with_promotion', 'goods_rating',)
+        read_only_fields = ('pk', 'photo_variants', 'price_with_promotion', 'goods_rating',)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -75,18 +72,22 @@ class GoodsSerializer(serializers.ModelSerializer):
 
         return representation
 
+    # info! значения берутся из аннотаций models.Goods.catalog
     def get_price_with_promotion(self, obj):
-        promotion = models.Promotion.objects.filter(promotion_goods=obj,
-                                                    time_end_promotion__gt=timezone.now()
-                                                    ).order_by('-time_end_promotion').first()
-
-        return str(((obj.price * decimal.Decimal(100 - promotion.promotion_percentage) / 100)
-                    .quantize(decimal.Decimal('0.01'), rounding=decimal.ROUND_HALF_UP))) if promotion else None
+        return str(obj.promotion_price) if obj.promotion_price is not None else None
 
     def get_goods_rating(self, obj):
-        rating = models.GoodsReview.objects.filter(goods_review=obj).aggregate(result_avg=Avg('grade'))['result_avg']
+        return round(obj.goods_rating, 2) if obj.goods_rating else .00
+
+    # info! пишутся только переданные поля: discount_price и discount_until меняет только pharmacy.prices,
+    #  а в прочитанном экземпляре они могли устареть
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+
+        instance.save(update_fields=tuple(validated_data))
 
-        return round(rating, 2) if rating else .00
+        return instance
 
 
 class PromotionSerializer(serializers.ModelSerializer):
@@ -115,6 +116,14 @@ class PromotionSerializer(serializers.ModelSerializer):
         return instance
 
 
+class PromotionFanOutSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source='get_status_display')
+
+    class Meta:
+        model = models.PromotionFanOut
+        fields = ('promotion', 'status', 'subscribers', 'notified', 'date_create', 'date_finish',)
+
+
 class GoodsReviewSerializer(serializers.ModelSerializer):
     grade = serializers.DecimalField(validators=[
         lambda value: validators.number_between(value, 0.00, 5.00)
@@ -177,3 +186,132 @@ class PurchaseGoodsSerializer(serializers.ModelSerializer):
         model = models.PurchaseGoods
         fields = ('purchase', 'goods_purchase', 'amount',)
         read_only_fields = ('purchase', 'goods_purchase',)
+
+
+class FulfillmentGoodsSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='goods_purchase.name')
+
+    class Meta:
+        model = models.PurchaseGoods
+        fields = ('name', 'amount',)
+
+
+class FulfillmentSerializer(serializers.ModelSerializer):
+    user_buy = serializers.CharField(source='user_buy.username')
+    goods = FulfillmentGoodsSerializer(source='purchase_fk', many=True)
+
+    class Meta:
+        model = models.Purchase
+        fields = ('pk', 'user_buy', 'date_buy', 'total_price', 'goods',)
+
+
+class FulfillmentReceivedSerializer(serializers.Serializer):
+    purchases = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                      max_length=1_000)
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1_000)
+    order = serializers.ChoiceField(choices=('units', 'revenue', 'bonus_spend',), required=False)
+    goods = serializers.CharField(required=False, max_length=1024)
+
+    # info! параметр другого отчета отклоняется, а не игнорируется молча. Значения по умолчанию у каждого
+    #  отчета свои и задаются в sales_rollup
+    def validate(self, attrs):
+        _, parameters = sales_rollup.REPORTS[self.context['report']]
+        unsupported = {'limit', 'order', 'goods'}.difference(parameters).intersection(self.initial_data)
+
+        if unsupported:
+            raise serializers.ValidationError({parameter: ['not supported by this report']
+                                               for parameter in sorted(unsupported)})
+
+        attrs.setdefault('date_to', timezone.localdate())
+        attrs.setdefault('date_from', attrs['date_to'] - datetime.timedelta(days=6))
+
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from must not be later than date_to')
+
+        return attrs
+
+
+class SalesReportSerializer(serializers.Serializer):
+    name = serializers.CharField(required=False)
+    type_goods = serializers.CharField(required=False)
+    day = serializers.DateField(required=False)
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    bonus_spend = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class LowStockGoodsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Goods
+        fields = ('pk', 'name', 'type_goods', 'amount_in_stock', 'low_stock_threshold',)
+
+
+class LowStockThresholdSerializer(serializers.Serializer):
+    threshold = serializers.IntegerField(min_value=0, max_value=stock.MAX_STOCK)
+    name = serializers.CharField(required=False, max_length=1024)
+    type_goods = serializers.ChoiceField(choices=models.TypeGoods.choices, required=False)
+
+    def validate(self, attrs):
+        if ('name' in attrs) == ('type_goods' in attrs):
+            raise serializers.ValidationError('either name or type_goods must be specified')
+
+        return attrs
+
+
+class CartOperationSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=1024)
+    action = serializers.ChoiceField(choices=cart.CartAction.choices)
+    amount = serializers.IntegerField(required=False, min_value=1, max_value=cart.MAX_AMOUNT)
+
+    def validate(self, attrs):
+        if attrs['action'] != cart.CartAction.REMOVE and 'amount' not in attrs:
+            raise serializers.ValidationError('amount must be specified for add and set')
+
+        return attrs
+
+
+class CartEditSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=cart.MAX_OPERATIONS)
+
+
+class CartLineSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    amount = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=8, decimal_places=2)
+    total_price = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class CartSerializer(serializers.Serializer):
+    purchase = serializers.IntegerField()
+    goods = CartLineSerializer(many=True)
+    total_amount = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class StockItemSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=1024)
+    delta = serializers.IntegerField(required=False, min_value=-stock.MAX_STOCK, max_value=stock.MAX_STOCK)
+    amount = serializers.IntegerField(required=False, min_value=0, max_value=stock.MAX_STOCK)
+
+    def validate(self, attrs):
+        if ('delta' in attrs) == ('amount' in attrs):
+            raise serializers.ValidationError('either delta or amount must be specified')
+
+        return attrs
+
+
+class StockAdjustmentSerializer(serializers.Serializer):
+    items = StockItemSerializer(many=True, allow_empty=False, max_length=stock.MAX_ITEMS)
+
+    def validate_items(self, items):
+        names = [item['name'] for item in items]
+
+        if len(names) != len(set(names)):
+            raise serializers.ValidationError('goods names must not repeat')
+
+        return items
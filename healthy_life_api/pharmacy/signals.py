@@ -1,14 +1,42 @@
-from django.db.models.signals import post_save
-from user.models import Notifications, User
-from pharmacy.models import Promotion
+from django.db.models.signals import post_save, post_delete
+from pharmacy.models import Goods, GoodsReview, Promotion
 from django.dispatch import receiver
+from pharmacy import catalog_cache, prices, promotion_fan_out
+from common import images
+
+
+images.register(Goods, 'photo')
 
 
 @receiver(post_save, sender=Promotion)
 def notify_about_promotion(sender, instance, created, **kwargs):
     if created:
-        users_to_notify = User.objects.filter(settings_fk__receive_notifications_about_discounts=True)
+        promotion_fan_out.enqueue(instance)
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def refresh_goods_price(sender, instance, **kwargs):
+    prices.refresh_effective_prices((instance.promotion_goods_id,))
+
 
-        for user in users_to_notify:
-            Notifications.objects.create(user_notify=user,
-                                         message=f'there is a new discount on the product {instance.promotion_goods}')
+# info! при смене цены товара со скидкой пересчитывается и цена по акции
+@receiver(post_save, sender=Goods)
+def refresh_discount_price(sender, instance, created, **kwargs):
+    if not created and instance.discount_until is not None:
+        prices.refresh_effective_prices((instance.pk,))
+
+
+@receiver(images.variants_ready, sender=Goods)
+def invalidate_catalog_cache_on_photo_variants(sender, **kwargs):
+    catalog_cache.bump_version()
+
+
+@receiver(post_save, sender=Goods)
+@receiver(post_delete, sender=Goods)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_save, sender=GoodsReview)
+@receiver(post_delete, sender=GoodsReview)
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_cache.bump_version_on_commit()
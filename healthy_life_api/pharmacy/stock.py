@@ -0,0 +1,56 @@
+from django.db import connection, transaction
+from pharmacy import models, catalog_cache
+
+
+MAX_STOCK = 32_767
+MAX_ITEMS = 10_000
+
+
+class StockStatus:
+    UPDATED = 'updated'
+    NOT_FOUND = 'not found'
+    OUT_OF_RANGE = 'out of range'
+
+
+# info! все изменения применяются одним UPDATE ... FROM (VALUES ...). Новое количество считается в sql,
+#  строки с результатом вне границ PositiveSmallIntegerField не обновляются и возвращаются со статусом out of range.
+#  Итоговый SELECT видит таблицу до UPDATE, поэтому для таких строк возвращается текущий остаток
+def adjust_stock(items):
+    goods_table = models.Goods._meta.db_table
+    values = ', '.join(['(%s::integer, %s::varchar, %s::integer, %s::integer)'] * len(items))
+    params = [param for position, item in enumerate(items)
+              for param in (position, item['name'], item.get('delta'), item.get('amount'))]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'''
+            WITH items (position, name, delta, amount) AS (VALUES {values}),
+            updated AS (
+                UPDATE {goods_table} AS goods
+                SET amount_in_stock = COALESCE(items.amount, goods.amount_in_stock + items.delta)
+                FROM items
+                WHERE goods.name = items.name
+                  AND COALESCE(items.amount, goods.amount_in_stock + items.delta) BETWEEN 0 AND %s
+                RETURNING items.position, goods.amount_in_stock
+            )
+            SELECT items.name, goods.id IS NOT NULL, updated.position IS NOT NULL,
+                   COALESCE(updated.amount_in_stock, goods.amount_in_stock)
+            FROM items
+            LEFT JOIN updated ON updated.position = items.position
+            LEFT JOIN {goods_table} AS goods ON goods.name = items.name
+            ORDER BY items.position
+        ''', params + [MAX_STOCK])
+        rows = cursor.fetchall()
+
+        if any(updated for _, _, updated, _ in rows):
+            catalog_cache.bump_version_on_commit()
+
+    return [_result(*row) for row in rows]
+
+
+def _result(name, found, updated, amount_in_stock):
+    if not found:
+        return {'name': name, 'status': StockStatus.NOT_FOUND}
+
+    return {'name': name,
+            'status': StockStatus.UPDATED if updated else StockStatus.OUT_OF_RANGE,
+            'amount_in_stock': amount_in_stock}
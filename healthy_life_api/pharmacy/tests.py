@@ -1,3 +1,801 @@
-from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient, APITestCase
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.utils import timezone
+from unittest import mock
+from django.db.models import Sum
+from django.db import connection
+from django.urls import reverse
+from django.conf import settings
+from pharmacy import (models, promotion_fan_out, reservations, sales_rollup, low_stock,
+                      loyalty_bonus, cart, checkout, serializers, stock)
+from django.contrib.auth.models import Group
+from common.models import IdempotencyKey
+from common.utils import Role
+from user.models import Notifications, User
+import datetime
+import importlib
+import threading
+import json
+import uuid
+import decimal
+import time
 
-# Create your tests here.
+
+class GoodsListQueryCountTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.reviewer = User.objects.create(username='reviewer', email='reviewer@mail.com')
+
+    def _create_goods(self, start, amount, promotion_lifetime=datetime.timedelta(days=1)):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(start, start + amount):
+                goods = models.Goods.objects.create(name=f'goods_{i}', goods_info='info',
+                                                    price=decimal.Decimal('100.00'), amount_in_stock=i)
+                models.Promotion.objects.create(promotion_goods=goods, promotion_percentage=15,
+                                                time_end_promotion=timezone.now() + promotion_lifetime)
+                review = models.GoodsReview.objects.create(goods_review=goods, wrote=self.reviewer,
+                                                           message='review', grade=decimal.Decimal('4.50'))
+                models.GoodsRatingStats.apply_review(goods.pk, new_grade=review.grade)
+
+    def _get_goods_list(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('goods_list'), params)
+
+        return response, len(queries)
+
+    def test_goods_list_query_count_does_not_depend_on_catalog_size(self):
+        self._create_goods(0, 2)
+        _, small_catalog_queries = self._get_goods_list()
+
+        self._create_goods(2, 20)
+        response, large_catalog_queries = self._get_goods_list()
+
+        self.assertEqual(small_catalog_queries, large_catalog_queries)
+        # info! запрос списка и запрос ближайшего окончания акции для времени жизни записи в кеше
+        self.assertEqual(large_catalog_queries, 2)
+
+        goods = response.data['results'][0]
+        self.assertEqual(goods['price_with_promotion'], '85.00')
+        self.assertEqual(goods['goods_rating'], decimal.Decimal('4.50'))
+
+    def test_repeated_request_is_served_from_cache(self):
+        self._create_goods(0, 2)
+        self._get_goods_list(type_goods=0, name='')
+
+        response, queries = self._get_goods_list(name='', type_goods=0)
+
+        self.assertEqual(queries, 0)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_goods_change_invalidates_cache(self):
+        self._create_goods(0, 2)
+        self._get_goods_list()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Goods.objects.filter(name='goods_0').get().delete()
+
+        response, queries = self._get_goods_list()
+
+        self.assertNotEqual(queries, 0)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_promotion_expiry_invalidates_cache(self):
+        self._create_goods(0, 2, promotion_lifetime=datetime.timedelta(minutes=1))
+        self._get_goods_list()
+
+        _, queries = self._get_goods_list()
+        self.assertEqual(queries, 0)
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            _, queries = self._get_goods_list()
+
+        self.assertNotEqual(queries, 0)
+
+    def test_unchanged_goods_list_is_not_modified(self):
+        self._create_goods(0, 2)
+        response, _ = self._get_goods_list()
+
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(reverse('goods_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        self._create_goods(2, 1)
+        modified = self.client.get(reverse('goods_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(modified.status_code, 200)
+        self.assertNotEqual(modified['ETag'], response['ETag'])
+
+    def test_etag_expires_with_cache_entries(self):
+        self._create_goods(0, 2)
+        response, _ = self._get_goods_list()
+
+        with mock.patch('time.time', return_value=time.time() + settings.CATALOG_CACHE_TIMEOUT + 1):
+            expired = self.client.get(reverse('goods_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(expired.status_code, 200)
+
+
+def _rating_stats(goods):
+    stats = models.GoodsRatingStats.objects.filter(rating_goods=goods).first()
+
+    if stats is None:
+        return None
+
+    return (stats.review_count, stats.grade_sum, *(getattr(stats, field) for field in stats.GRADE_FIELDS))
+
+
+class GoodsReviewTest(APITestCase):
+    def setUp(self):
+        self.goods = models.Goods.objects.create(name='goods', goods_info='info', price=decimal.Decimal('100.00'),
+                                                 amount_in_stock=1)
+        self.reviewer = User.objects.create(username='reviewer', email='reviewer@mail.com')
+        self.client.force_authenticate(self.reviewer)
+
+    def test_stats_follow_review_create_edit_and_delete(self):
+        response = self.client.post(reverse('goods_review', kwargs={'name': self.goods.name}),
+                                    {'message': 'review', 'grade': '4.60'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        review = models.GoodsReview.objects.get(goods_review=self.goods)
+
+        self.assertEqual(_rating_stats(self.goods), (1, decimal.Decimal('4.60'), 0, 0, 0, 0, 0, 1))
+
+        response = self.client.put(reverse('goods_review_action', kwargs={'pk': review.pk}),
+                                   {'grade': '1.20'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(_rating_stats(self.goods), (1, decimal.Decimal('1.20'), 0, 1, 0, 0, 0, 0))
+
+        response = self.client.put(reverse('goods_review_action', kwargs={'pk': review.pk}),
+                                   {'grade': '7.00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(User.objects.create(username='other', email='other@mail.com'))
+        response = self.client.delete(reverse('goods_review_action', kwargs={'pk': review.pk}))
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(self.reviewer)
+        response = self.client.delete(reverse('goods_review_action', kwargs={'pk': review.pk}))
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(_rating_stats(self.goods), (0, decimal.Decimal('0.00'), 0, 0, 0, 0, 0, 0))
+
+
+class GoodsReviewConcurrentEditTest(TransactionTestCase):
+    def test_concurrent_edits_keep_stats_consistent(self):
+        goods = models.Goods.objects.create(name='goods', goods_info='info', price=decimal.Decimal('100.00'),
+                                            amount_in_stock=1)
+        reviewer = User.objects.create(username='reviewer', email='reviewer@mail.com')
+        client = APIClient()
+        client.force_authenticate(reviewer)
+        client.post(reverse('goods_review', kwargs={'name': goods.name}), {'message': 'review', 'grade': '1.00'},
+                    format='json')
+
+        review = models.GoodsReview.objects.get(goods_review=goods)
+        barrier, statuses = threading.Barrier(2), []
+        apply_review = models.GoodsRatingStats.apply_review
+
+        # info! пауза перед обновлением статистики расширяет окно между чтением старой оценки и фиксацией
+        def slow_apply_review(*args, **kwargs):
+            time.sleep(0.2)
+            apply_review(*args, **kwargs)
+
+        def edit(grade):
+            editor = APIClient(raise_request_exception=False)
+            editor.force_authenticate(reviewer)
+            barrier.wait()
+
+            try:
+                statuses.append(editor.put(reverse('goods_review_action', kwargs={'pk': review.pk}),
+                                           {'grade': grade}, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=edit, args=(grade,)) for grade in ('3.00', '5.00')]
+
+        with mock.patch.object(models.GoodsRatingStats, 'apply_review', side_effect=slow_apply_review):
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        review.refresh_from_db()
+        expected = [0] * 6
+        expected[int(review.grade)] = 1
+
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(_rating_stats(goods), (1, review.grade, *expected))
+
+
+class GoodsPriceTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+
+        # info! скидки пишутся напрямую, как если бы планировщик еще не сбросил закончившуюся акцию
+        for name, price, discount_price, discount_until in (('expired', 100, 50, now - datetime.timedelta(hours=1)),
+                                                            ('active', 100, 60, now + datetime.timedelta(hours=1)),
+                                                            ('regular', 70, None, None)):
+            goods = models.Goods.objects.create(name=name, goods_info='info', price=decimal.Decimal(price))
+            models.Goods.objects.filter(pk=goods.pk).update(discount_price=discount_price,
+                                                            discount_until=discount_until)
+
+    def _names(self, **params):
+        response = self.client.get(reverse('goods_list'), params)
+
+        return sorted(goods['name'] for goods in response.data['results'])
+
+    def test_price_filter_uses_price_shown_in_catalog(self):
+        self.assertEqual(self._names(price_min=40, price_max=65), ['active'])
+        self.assertEqual(self._names(price_min=90), ['expired'])
+
+    def test_price_facets_use_price_shown_in_catalog(self):
+        response = self.client.get(reverse('goods_facets'), {'price_buckets': '0,65,90'})
+
+        self.assertEqual([bucket['count'] for bucket in response.data['price']], [1, 1, 1])
+
+    def test_facet_counts_follow_filters(self):
+        models.Goods.objects.filter(name='regular').update(type_goods=models.TypeGoods.MEDICINE, amount_in_stock=3)
+
+        response = self.client.get(reverse('goods_facets'), {'price_buckets': '0,80', 'price_min': 65})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual({facet['value']: facet['count'] for facet in response.data['type_goods']},
+                         {0: 1, 1: 1, 2: 0, 3: 0, 4: 0, 5: 0})
+        self.assertEqual([facet['count'] for facet in response.data['in_stock']], [1, 1])
+        self.assertEqual(response.data['price'], [{'min': '0', 'max': '80', 'count': 1},
+                                                  {'min': '80', 'max': None, 'count': 1}])
+
+    def test_too_many_price_buckets_are_rejected(self):
+        response = self.client.get(reverse('goods_facets'), {'price_buckets': ','.join(map(str, range(21)))})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('goods_facets'),
+                                         {'price_buckets': ','.join(map(str, range(20)))}).status_code, 200)
+
+    def test_goods_update_does_not_overwrite_discount(self):
+        goods = models.Goods.catalog.get(name='regular')
+        # info! акция началась после чтения товара, в экземпляре остались старые discount_*
+        models.Goods.objects.filter(pk=goods.pk).update(discount_price=decimal.Decimal('35.00'),
+                                                        discount_until=timezone.now() + datetime.timedelta(hours=1))
+
+        serializer = serializers.GoodsSerializer(goods, data={'goods_info': 'new info'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+
+        goods.refresh_from_db()
+        self.assertEqual((goods.goods_info, goods.discount_price), ('new info', decimal.Decimal('35.00')))
+
+    def test_goods_partial_update_without_price(self):
+        self.client.force_authenticate(User.objects.create(username='staff', email='staff@mail.com', is_staff=True))
+
+        response = self.client.put(reverse('goods_action', kwargs={'name': 'regular'}), {'goods_info': 'new info'},
+                                   format='json')
+
+        self.assertEqual(response.status_code, 200)
+
+
+class GoodsSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+        for name, goods_info in (('vitamin c', 'paracetamol free'), ('paracetamol tablets', 'pain relief'),
+                                 ('cream', 'for dry skin')):
+            models.Goods.objects.create(name=name, goods_info=goods_info, price=decimal.Decimal('10.00'))
+
+    def _search(self, value):
+        response = self.client.get(reverse('goods_list'), {'search': value})
+
+        return [goods['name'] for goods in response.data['results']]
+
+    def test_name_match_ranks_above_description_match(self):
+        self.assertEqual(self._search('para'), ['paracetamol tablets', 'vitamin c'])
+
+    def test_every_term_is_required_as_prefix(self):
+        self.assertEqual(self._search('para tab'), ['paracetamol tablets'])
+        self.assertEqual(self._search('para skin'), [])
+        self.assertEqual(len(self._search('!!!')), 3)
+
+    @override_settings(DEBUG=True)
+    def test_benchmark_requires_separate_database(self):
+        with mock.patch.dict('os.environ', {'NAME_TEST_DB': ''}):
+            with self.assertRaisesMessage(CommandError, 'NAME_TEST_DB'):
+                call_command('benchgoodssearch', rows=1)
+
+        self.assertEqual(models.Goods.objects.count(), 3)
+
+
+class GoodsStockTest(APITestCase):
+    def setUp(self):
+        for name, amount_in_stock in (('goods_0', 5), ('goods_1', 2), ('goods_2', 0)):
+            models.Goods.objects.create(name=name, goods_info='info', price=decimal.Decimal('100.00'),
+                                        amount_in_stock=amount_in_stock)
+
+        self.client.force_authenticate(User.objects.create(username='staff', email='staff@mail.com', is_staff=True))
+
+    def _adjust(self, *items):
+        return self.client.post(reverse('goods_stock'), {'items': list(items)}, format='json')
+
+    def _stock(self):
+        return dict(models.Goods.objects.values_list('name', 'amount_in_stock'))
+
+    def test_failed_items_do_not_block_the_rest(self):
+        response = self._adjust({'name': 'goods_0', 'delta': -3},
+                                {'name': 'goods_1', 'delta': -5},
+                                {'name': 'missing', 'delta': 1},
+                                {'name': 'goods_2', 'amount': 7})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 2, 'results': [
+            {'name': 'goods_0', 'status': stock.StockStatus.UPDATED, 'amount_in_stock': 2},
+            {'name': 'goods_1', 'status': stock.StockStatus.OUT_OF_RANGE, 'amount_in_stock': 2},
+            {'name': 'missing', 'status': stock.StockStatus.NOT_FOUND},
+            {'name': 'goods_2', 'status': stock.StockStatus.UPDATED, 'amount_in_stock': 7},
+        ]})
+        self.assertEqual(self._stock(), {'goods_0': 2, 'goods_1': 2, 'goods_2': 7})
+
+    def test_stock_does_not_go_negative_or_overflow(self):
+        response = self._adjust({'name': 'goods_0', 'delta': -6},
+                                {'name': 'goods_1', 'delta': stock.MAX_STOCK},
+                                {'name': 'goods_2', 'delta': -1})
+
+        self.assertEqual(response.data['updated'], 0)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         [stock.StockStatus.OUT_OF_RANGE] * 3)
+        self.assertEqual(self._stock(), {'goods_0': 5, 'goods_1': 2, 'goods_2': 0})
+
+    def test_invalid_request_changes_nothing(self):
+        for items in (({'name': 'goods_0', 'delta': 1}, {'name': 'goods_0', 'delta': 1}),
+                      ({'name': 'goods_0', 'delta': 1, 'amount': 1},),
+                      ({'name': 'goods_0', 'amount': -1},)):
+            with self.subTest(items=items):
+                self.assertEqual(self._adjust(*items).status_code, 400)
+
+        self.assertEqual(self._stock(), {'goods_0': 5, 'goods_1': 2, 'goods_2': 0})
+
+
+@override_settings(STORAGES={**settings.STORAGES, 'private': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}})
+class GoodsImportTest(APITestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create(username='pharmacist', email='pharmacist@mail.com', is_staff=True)
+        self.client.force_authenticate(self.pharmacist)
+
+    def _import(self, *rows):
+        content = '\n'.join(json.dumps(row) for row in rows).encode()
+        response = self.client.post(reverse('goods_import'),
+                                    {'file': SimpleUploadedFile('goods.jsonl', content)}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        return response.data
+
+    def test_fractional_and_boolean_integers_are_rejected(self):
+        result = self._import({'name': 'whole', 'price': '1.00', 'stock': 3.0, 'type': 1},
+                              {'name': 'fraction', 'price': '1.00', 'stock': 3.7},
+                              {'name': 'flag', 'price': '1.00', 'stock': True},
+                              {'name': 'flag_type', 'price': '1.00', 'type': True})
+
+        self.assertEqual((result['created'], result['failed']), (1, 3))
+        self.assertEqual(models.Goods.objects.values_list('name', 'amount_in_stock', 'type_goods').get(),
+                         ('whole', 3, 1))
+
+    def test_errors_report_is_private_and_served_to_staff_only(self):
+        result = self._import({'name': 'fraction', 'price': '1.00', 'stock': 3.7})
+        errors_url = result['errors_file']
+
+        self.assertNotIn(settings.MEDIA_URL, errors_url)
+
+        response = self.client.get(errors_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(),
+                         ['line,error', '1,stock 3.7 is not an integer'])
+
+        self.client.force_authenticate(User.objects.create(username='user', email='user@mail.com'))
+        self.assertEqual(self.client.get(errors_url).status_code, 403)
+
+        self.client.force_authenticate(self.pharmacist)
+        self.assertEqual(self.client.get(reverse('goods_import_errors', kwargs={'report': uuid.uuid4()})).status_code,
+                         404)
+
+
+class PromotionTest(APITestCase):
+    def setUp(self):
+        self.goods = models.Goods.objects.create(name='goods', goods_info='info',
+                                                 price=decimal.Decimal('100.00'), amount_in_stock=1)
+
+    def test_duplicate_promotion_is_rejected_by_database_check(self):
+        models.Promotion.objects.create(promotion_goods=self.goods, promotion_percentage=15,
+                                        time_end_promotion=timezone.now() + datetime.timedelta(days=1))
+        self.client.force_authenticate(User.objects.create(username='staff', email='staff@mail.com', is_staff=True))
+
+        response = self.client.post(reverse('promotions'), {'promotion_goods': self.goods.name,
+                                                            'promotion_percentage': 20,
+                                                            'time_end_promotion': timezone.now() +
+                                                            datetime.timedelta(days=2)}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(models.Promotion.objects.count(), 1)
+
+
+class PromotionFanOutTest(APITestCase):
+    def test_promotion_notifications_are_sent_in_chunks_outside_request(self):
+        for i in range(5):
+            user = User.objects.create(username=f'user_{i}', email=f'user_{i}@mail.com')
+            user.settings_fk.receive_notifications_about_discounts = i != 2
+            user.settings_fk.save()
+
+        goods = models.Goods.objects.create(name='goods', goods_info='info',
+                                            price=decimal.Decimal('100.00'), amount_in_stock=1)
+        promotion = models.Promotion.objects.create(promotion_goods=goods, promotion_percentage=15,
+                                                    time_end_promotion=timezone.now() + datetime.timedelta(days=1))
+
+        self.assertFalse(Notifications.objects.exists())
+
+        self.assertEqual(promotion_fan_out.run_pending(chunk_size=3), 4)
+        self.assertEqual(promotion_fan_out.run_pending(chunk_size=3), 0)
+
+        fan_out = models.PromotionFanOut.objects.get(promotion=promotion)
+        self.assertEqual(fan_out.status, models.StatusFanOut.DONE)
+        self.assertEqual((fan_out.subscribers, fan_out.notified), (4, 4))
+        self.assertEqual(Notifications.objects.filter(message__contains=goods.name).count(), 4)
+
+
+class CheckoutTest(APITestCase):
+    def setUp(self):
+        self.buyer = User.objects.create(username='buyer', email='buyer@mail.com', balance=decimal.Decimal('10000'))
+        models.LoyaltyCard.objects.filter(user_card=self.buyer).update(bonuses=1000)
+        self.client.force_authenticate(self.buyer)
+
+    def _create_purchase(self, lines):
+        purchase = models.Purchase.objects.create(user_buy=self.buyer)
+
+        for i in range(lines):
+            goods = models.Goods.objects.create(name=f'goods_{purchase.pk}_{i}', goods_info='info',
+                                                price=decimal.Decimal('100.00'), amount_in_stock=5)
+            models.PurchaseGoods.objects.create(purchase=purchase, goods_purchase=goods, amount=2)
+
+        return purchase
+
+    def _buy(self, purchase, paid_with_bonuses=0):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('purchase_buy', kwargs={'pk': purchase.pk}),
+                                        {'paid_with_bonuses': paid_with_bonuses}, format='json')
+
+        return response, len(queries)
+
+    def test_checkout_query_count_does_not_depend_on_lines(self):
+        _, one_line_queries = self._buy(self._create_purchase(1), paid_with_bonuses=100)
+        response, many_lines_queries = self._buy(self._create_purchase(10), paid_with_bonuses=100)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(one_line_queries, many_lines_queries)
+
+    def test_checkout_debits_stock_balance_and_bonuses(self):
+        purchase = self._create_purchase(2)
+        response, _ = self._buy(purchase, paid_with_bonuses=1000)
+
+        self.assertEqual(response.status_code, 201)
+        purchase.refresh_from_db()
+        self.buyer.refresh_from_db()
+
+        self.assertTrue(purchase.is_paid)
+        self.assertEqual(purchase.total_price, decimal.Decimal('390.00'))
+        self.assertEqual(self.buyer.balance, decimal.Decimal('9610.00'))
+        self.assertEqual(models.LoyaltyCard.objects.get(user_card=self.buyer).bonuses, 0)
+        self.assertEqual(set(models.Goods.objects.filter(goods_purchase_fk__purchase=purchase)
+                             .values_list('amount_in_stock', flat=True)), {3})
+
+        response, _ = self._buy(purchase)
+        self.assertEqual(response.status_code, 400)
+
+    def test_retry_with_idempotency_key_is_answered_from_stored_response(self):
+        purchase = self._create_purchase(2)
+        url = reverse('purchase_buy', kwargs={'pk': purchase.pk})
+
+        first = self.client.post(url, {'paid_with_bonuses': 0}, format='json', HTTP_IDEMPOTENCY_KEY='buy-1')
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.client.post(url, {'paid_with_bonuses': 0}, format='json', HTTP_IDEMPOTENCY_KEY='buy-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(queries), 1)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.balance, decimal.Decimal('9600.00'))
+
+        other = self.client.post(url, {'paid_with_bonuses': 1}, format='json', HTTP_IDEMPOTENCY_KEY='buy-1')
+        self.assertEqual(other.status_code, 422)
+
+    def test_idempotency_key_abandoned_by_crashed_request_is_reclaimed(self):
+        purchase = self._create_purchase(1)
+        url = reverse('purchase_buy', kwargs={'pk': purchase.pk})
+
+        # info! процесс упал посреди запроса и не освободил ключ
+        with mock.patch('common.idempotency._release'), \
+                mock.patch('pharmacy.checkout.pay', side_effect=RuntimeError('worker killed')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, {'paid_with_bonuses': 0}, format='json', HTTP_IDEMPOTENCY_KEY='buy-1')
+
+        in_progress = self.client.post(url, {'paid_with_bonuses': 0}, format='json', HTTP_IDEMPOTENCY_KEY='buy-1')
+        self.assertEqual(in_progress.status_code, 409)
+
+        IdempotencyKey.objects.update(date_create=timezone.now() - datetime.timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_LEASE_SECONDS + 1))
+        retry = self.client.post(url, {'paid_with_bonuses': 0}, format='json', HTTP_IDEMPOTENCY_KEY='buy-1')
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get(key='buy-1').status_code, 201)
+
+    def test_paid_purchases_are_rolled_up_once(self):
+        purchases = [self._create_purchase(2), self._create_purchase(1)]
+
+        for purchase in purchases:
+            self._buy(purchase, paid_with_bonuses=1000 if purchase is purchases[0] else 0)
+
+        paid_at = timezone.now() - datetime.timedelta(minutes=5)
+        models.Purchase.objects.update(paid_at=paid_at)
+
+        self.assertEqual(sales_rollup.roll_up(batch_size=1), 2)
+        self.assertEqual(sales_rollup.roll_up(), 0)
+
+        self.buyer.is_staff = True
+        self.buyer.save()
+        day = timezone.localdate(paid_at)
+        response = self.client.get(reverse('sales_report', kwargs={'report': 'revenue-by-type'}),
+                                   {'date_from': day, 'date_to': day})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'type_goods': 'other', 'units': 6, 'revenue': '600.00',
+                                                     'bonus_spend': '10.00'}])
+
+    def test_backfill_splits_paid_amount_across_lines(self):
+        day = timezone.localdate() - datetime.timedelta(days=1)
+        purchases = [self._create_purchase(2), self._create_purchase(1)]
+        models.Goods.objects.filter(name=f'goods_{purchases[0].pk}_1').update(price=decimal.Decimal('40.00'))
+        models.PurchaseGoods.objects.filter(goods_purchase__name=f'goods_{purchases[0].pk}_1').update(amount=1)
+        models.Purchase.objects.filter(pk=purchases[0].pk).update(is_paid=True, date_buy=day,
+                                                                  total_price=decimal.Decimal('150.00'),
+                                                                  paid_with_bonuses=1000)
+        # info! у покупки без total_price уплаченная сумма неизвестна
+        models.Purchase.objects.filter(pk=purchases[1].pk).update(is_paid=True, date_buy=day, total_price=None)
+
+        backfill = importlib.import_module('pharmacy.migrations.0010_sales_rollup').Migration.operations[-1]
+        with connection.cursor() as cursor:
+            cursor.execute(backfill.sql)
+
+        self.assertEqual(sorted(models.PurchaseGoods.objects.values_list('unit_price', flat=True), key=str),
+                         [decimal.Decimal('26.67'), decimal.Decimal('66.67'), None])
+        self.assertEqual(models.Purchase.objects.get(pk=purchases[0].pk).paid_at,
+                         datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc))
+
+        self.assertEqual(sales_rollup.roll_up(), 2)
+        self.assertEqual(models.SalesDaily.objects.aggregate(units=Sum('units'), revenue=Sum('revenue'),
+                                                             bonus_spend=Sum('bonus_spend')),
+                         {'units': 3, 'revenue': decimal.Decimal('160.01'), 'bonus_spend': decimal.Decimal('10.00')})
+
+    def test_report_rejects_parameters_of_other_reports(self):
+        self.buyer.is_staff = True
+        self.buyer.save()
+
+        for report, params, errors in (('top-sellers', {'goods': 'goods_0', 'limit': 5}, ['goods']),
+                                       ('revenue-by-type', {'goods': 'goods_0'}, ['goods']),
+                                       ('trend', {'limit': 5, 'order': 'revenue'}, ['limit', 'order']),
+                                       ('trend', {'goods': 'goods_0'}, None),
+                                       ('top-sellers', {'limit': 5, 'order': 'revenue'}, None)):
+            with self.subTest(report=report, params=params):
+                response = self.client.get(reverse('sales_report', kwargs={'report': report}), params)
+
+                if errors is None:
+                    self.assertEqual(response.status_code, 200)
+                else:
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(sorted(response.data), errors)
+
+    @override_settings(LOYALTY_BONUS_PERCENT='1', LOYALTY_BONUS_TYPE_MULTIPLIERS='1:2')
+    def test_bonuses_are_accrued_once_per_purchase(self):
+        purchases = [self._create_purchase(2), self._create_purchase(1)]
+        models.Goods.objects.filter(goods_purchase_fk__purchase=purchases[0], name__endswith='_0').update(
+            type_goods=models.TypeGoods.MEDICINE)
+
+        for purchase in purchases:
+            self._buy(purchase, paid_with_bonuses=1000 if purchase is purchases[0] else 0)
+
+        models.Purchase.objects.update(paid_at=timezone.now() - datetime.timedelta(minutes=5))
+
+        self.assertEqual(loyalty_bonus.accrue(batch_size=1), (2, 785))
+        self.assertEqual(loyalty_bonus.accrue(), (0, 0))
+        self.assertEqual(models.LoyaltyCard.objects.get(user_card=self.buyer).bonuses, 785)
+        self.assertEqual(dict(models.BonusAccrual.objects.values_list('purchase', 'bonuses')),
+                         {purchases[0].pk: 585, purchases[1].pk: 200})
+
+        models.LoyaltyCard.objects.filter(user_card=self.buyer).update(card_status=models.StatusCart.BLOCKED)
+        blocked = self._create_purchase(1)
+        self._buy(blocked)
+        models.Purchase.objects.filter(pk=blocked.pk).update(paid_at=timezone.now() - datetime.timedelta(minutes=1))
+
+        self.assertEqual(loyalty_bonus.accrue(), (1, 0))
+        self.assertEqual(models.BonusAccrual.objects.get(purchase=blocked).bonuses, 0)
+        self.assertEqual(models.LoyaltyCard.objects.get(user_card=self.buyer).bonuses, 785)
+
+    def test_invalid_bonus_settings_are_reported(self):
+        for value in ('1', '9:2', '1:x', '1:-1', '1:2,1:3'):
+            with self.subTest(value=value), override_settings(LOYALTY_BONUS_TYPE_MULTIPLIERS=value):
+                with self.assertRaisesMessage(ImproperlyConfigured, 'LOYALTY_BONUS_TYPE_MULTIPLIERS'):
+                    loyalty_bonus.get_type_multipliers()
+
+        with override_settings(LOYALTY_BONUS_TYPE_MULTIPLIERS=' 1:2 , 5:0.5 '):
+            self.assertEqual(loyalty_bonus.get_type_multipliers(),
+                             {models.TypeGoods.MEDICINE: decimal.Decimal('2'),
+                              models.TypeGoods.SUPPLEMENTS_VITAMINS: decimal.Decimal('0.5')})
+
+    def test_stock_held_by_others_is_not_taken_without_own_hold(self):
+        purchase = self._create_purchase(1)
+        goods = models.Goods.objects.get(goods_purchase_fk__purchase=purchase)
+        other = models.Purchase.objects.create(user_buy=User.objects.create(username='other', email='other@mail.com'))
+        # info! чужой резерв появился после проверки наличия в pay, последней защитой остается UPDATE остатков
+        reservations.place(other, {goods.pk: 4})
+
+        with self.assertRaises(checkout.CheckoutError) as error:
+            checkout._take_from_stock(purchase.pk, set(purchase.purchase_fk.values_list('pk', flat=True)))
+
+        self.assertEqual(error.exception.status_code, 409)
+        self.assertEqual(models.Goods.objects.get(pk=goods.pk).amount_in_stock, 5)
+
+        reservations.place(purchase, {goods.pk: 2})
+        models.StockReservation.objects.filter(purchase=other).update(amount=5)
+        checkout._take_from_stock(purchase.pk, set(purchase.purchase_fk.values_list('pk', flat=True)))
+
+        self.assertEqual(models.Goods.objects.get(pk=goods.pk).amount_in_stock, 3)
+
+    def test_failed_checkout_changes_nothing(self):
+        purchase = self._create_purchase(2)
+        User.objects.filter(pk=self.buyer.pk).update(balance=decimal.Decimal('1.00'))
+
+        response, _ = self._buy(purchase)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.Purchase.objects.get(pk=purchase.pk).is_paid)
+        self.assertEqual(set(models.Goods.objects.filter(goods_purchase_fk__purchase=purchase)
+                             .values_list('amount_in_stock', flat=True)), {5})
+
+
+class CartTest(APITestCase):
+    def setUp(self):
+        self.buyer = User.objects.create(username='buyer', email='buyer@mail.com')
+        self.purchase = models.Purchase.objects.create(user_buy=self.buyer)
+        self.client.force_authenticate(self.buyer)
+
+        for i in range(30):
+            models.Goods.objects.create(name=f'goods_{i}', goods_info='info',
+                                        price=decimal.Decimal('10.00'), amount_in_stock=5)
+
+    def _edit(self, operations):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('purchase_cart', kwargs={'pk': self.purchase.pk}),
+                                        {'operations': operations}, format='json')
+
+        return response, len(queries)
+
+    def test_cart_is_edited_with_constant_number_of_queries(self):
+        _, one_item_queries = self._edit([{'name': 'goods_0', 'action': 'add', 'amount': 1}])
+        _, many_items_queries = self._edit([{'name': f'goods_{i}', 'action': 'set', 'amount': 1}
+                                            for i in range(1, 30)])
+        self.assertEqual(one_item_queries, many_items_queries)
+
+        response, _ = self._edit([{'name': f'goods_{i}', 'action': 'set', 'amount': 2} for i in range(1, 30)] +
+                                 [{'name': 'goods_0', 'action': 'add', 'amount': 2},
+                                  {'name': 'goods_1', 'action': 'remove'}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['goods']), 29)
+        self.assertEqual(response.data['total_amount'], 3 + 28 * 2)
+        self.assertEqual(response.data['total_price'], '590.00')
+
+    def test_invalid_operation_leaves_cart_unchanged(self):
+        response, _ = self._edit([{'name': 'goods_0', 'action': 'set', 'amount': 1},
+                                  {'name': 'goods_1', 'action': 'set', 'amount': 6},
+                                  {'name': 'missing', 'action': 'remove'}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['operations']), {1, 2})
+        self.assertFalse(models.PurchaseGoods.objects.filter(purchase=self.purchase).exists())
+
+    def test_cart_paid_concurrently_is_not_changed(self):
+        # info! self.purchase прочитана до оплаты, как в запросе, который ждал блокировку оплачиваемой покупки
+        models.Purchase.objects.filter(pk=self.purchase.pk).update(is_paid=True)
+
+        with self.assertRaisesMessage(cart.CartError, 'paid purchase cannot be changed'):
+            cart.edit_cart(self.purchase, [{'name': 'goods_0', 'action': 'add', 'amount': 1}])
+
+        self.assertFalse(models.PurchaseGoods.objects.filter(purchase=self.purchase).exists())
+        self.assertFalse(models.StockReservation.objects.filter(purchase=self.purchase).exists())
+
+    def test_reserved_goods_are_not_available_to_other_purchases(self):
+        self._edit([{'name': 'goods_0', 'action': 'set', 'amount': 4}])
+
+        other_buyer = User.objects.create(username='other', email='other@mail.com')
+        other_purchase = models.Purchase.objects.create(user_buy=other_buyer)
+        self.client.force_authenticate(other_buyer)
+        url = reverse('purchase_cart', kwargs={'pk': other_purchase.pk})
+
+        response = self.client.post(url, {'operations': [{'name': 'goods_0', 'action': 'set', 'amount': 2}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+        models.StockReservation.objects.update(expires_at=timezone.now())
+
+        response = self.client.post(url, {'operations': [{'name': 'goods_0', 'action': 'set', 'amount': 2}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reservations.release_expired(), 1)
+
+
+class FulfillmentQueueTest(APITestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create(username='pharmacist', email='pharmacist@mail.com', is_staff=True)
+        self.client.force_authenticate(self.pharmacist)
+        self.goods = models.Goods.objects.create(name='goods', goods_info='info',
+                                                 price=decimal.Decimal('10.00'), amount_in_stock=5)
+
+    def _create_purchases(self, amount, **fields):
+        purchases = models.Purchase.objects.bulk_create([models.Purchase(user_buy=self.pharmacist, **fields)
+                                                         for _ in range(amount)])
+        models.PurchaseGoods.objects.bulk_create([models.PurchaseGoods(purchase=purchase, goods_purchase=self.goods)
+                                                  for purchase in purchases])
+
+        return [purchase.pk for purchase in purchases]
+
+    def test_queue_lists_paid_not_received_purchases_in_fixed_queries(self):
+        paid = self._create_purchases(3, is_paid=True, date_buy=datetime.date(2026, 1, 1))
+        self._create_purchases(2)
+        self._create_purchases(1, is_paid=True, goods_is_received=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('fulfillment'), {'limit': 2})
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([purchase['pk'] for purchase in response.data['results']], paid[:2])
+        self.assertEqual(response.data['results'][0]['goods'], [{'name': 'goods', 'amount': 1}])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([purchase['pk'] for purchase in response.data['results']], paid[2:])
+
+    def test_bulk_mark_received(self):
+        paid = self._create_purchases(2, is_paid=True)
+        not_paid = self._create_purchases(1)
+
+        response = self.client.post(reverse('fulfillment_received'), {'purchases': paid + not_paid}, format='json')
+
+        self.assertEqual(response.data, {'received': paid, 'skipped': not_paid})
+        self.assertFalse(models.Purchase.objects.filter(is_paid=True, goods_is_received=False).exists())
+
+
+class LowStockTest(APITestCase):
+    def test_pharmacists_are_notified_once_per_crossing(self):
+        pharmacist = User.objects.create(username='pharmacist', email='pharmacist@mail.com')
+        pharmacist.groups.add(Group.objects.get_or_create(name=Role.PHARMACIST.value)[0])
+        User.objects.create(username='buyer', email='buyer@mail.com')
+
+        for i in range(3):
+            models.Goods.objects.create(name=f'goods_{i}', goods_info='info', price=decimal.Decimal('10.00'),
+                                        amount_in_stock=i * 5)
+
+        self.assertEqual(low_stock.notify(), 2)
+        self.assertEqual(low_stock.notify(), 0)
+        self.assertEqual(list(Notifications.objects.values_list('user_notify__username', 'message')),
+                         [('pharmacist', 'low stock: goods_0 (0), goods_1 (5)')])
+
+        models.Goods.objects.filter(name='goods_0').update(amount_in_stock=20)
+        low_stock.notify()
+        models.Goods.objects.filter(name='goods_0').update(amount_in_stock=1)
+
+        self.assertEqual(low_stock.notify(), 1)
+        self.assertEqual(Notifications.objects.count(), 2)
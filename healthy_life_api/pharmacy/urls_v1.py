@@ -4,6 +4,11 @@ from pharmacy import views
 
 urlpatterns = [
     path('goods/', views.GoodsListAPIView.as_view(), name='goods_list'),
+    path('goods/facets/', views.GoodsFacetsAPIView.as_view(), name='goods_facets'),
+    path('goods/import/', views.GoodsImportAPIView.as_view(), name='goods_import'),
+    path('goods/import/errors/<uuid:report>/', views.GoodsImportErrorsAPIView.as_view(), name='goods_import_errors'),
+    path('goods/stock/', views.GoodsStockAPIView.as_view(), name='goods_stock'),
+    path('goods/low-stock/', views.LowStockAPIView.as_view(), name='goods_low_stock'),
     path('goods/new/', views.GoodsViewSet.as_view({'post': 'create'}), name='goods_new'),
     path('goods/<str:name>/', views.GoodsViewSet.as_view({'get': 'retrieve',
                                                           'put': 'update',
@@ -15,6 +20,8 @@ urlpatterns = [
                                                                  'put': 'update',
                                                                  'delete': 'destroy'}
                                                                 ), name='promotions_action'),
+    path('promotions/<int:promotion>/notifications/', views.PromotionFanOutAPIView.as_view(),
+         name='promotions_notifications'),
 
     path('goods/<slug:name>/review/', views.GoodsReviewViewSet.as_view({'get': 'list',
                                                                         'post': 'create'}), name='goods_review'),
@@ -31,6 +38,12 @@ urlpatterns = [
     path('unban/loyaltycard/<slug:username>/', views.LoyaltyCardViewSet.as_view({'patch': 'patch_unban_card'}
                                                                                 ), name='loyaltycard_unban'),
 
+    path('exports/<slug:dataset>.<slug:file_format>', views.ExportAPIView.as_view(), name='export'),
+    path('analytics/<slug:report>/', views.SalesReportAPIView.as_view(), name='sales_report'),
+
+    path('fulfillment/', views.FulfillmentQueueAPIView.as_view(), name='fulfillment'),
+    path('fulfillment/received/', views.FulfillmentReceivedAPIView.as_view(), name='fulfillment_received'),
+
     path('purchase/<slug:username>/', views.PurchaseViewSet.as_view({'get': 'list'}), name='purchase'),
     path('purchase/', views.PurchaseViewSet.as_view({'post': 'create'}), name='purchase_new'),
     path('purchase/view/<int:pk>/', views.PurchaseViewSet.as_view({'get': 'retrieve',
@@ -40,6 +53,7 @@ urlpatterns = [
     path('purchase/<int:pk>/buy/', views.PurchaseViewSet.as_view({'post': 'post_buy'}), name='purchase_buy'),
 
     path('purchase/<int:pk>/goods/', views.PurchaseGoodsViewSet.as_view({'get': 'list'}), name='purchase_goods'),
+    path('purchase/<int:pk>/cart/', views.PurchaseGoodsViewSet.as_view({'post': 'bulk_edit'}), name='purchase_cart'),
     path('purchase/<int:pk>/goods/<str:goods>/', views.PurchaseGoodsViewSet.as_view({'post': 'create',
                                                                                      'put': 'update',
                                                                                      'delete': 'destroy'}
@@ -1,38 +1,148 @@
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.db import IntegrityError, DatabaseError, transaction
+from django.db import IntegrityError, transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import generics, viewsets, status
-from pharmacy import serializers, models, filters
+from pharmacy import (serializers, models, filters, catalog_cache, goods_import, stock, exports,
+                      checkout, cart, reservations, sales_rollup, low_stock, prices)
 from rest_framework.response import Response
+from django.http import FileResponse, StreamingHttpResponse
+from django.core.files.storage import storages
+from rest_framework.parsers import MultiPartParser
+from django.core.files import File
+from django.urls import reverse
 from django.db import models as dj_model
 from user import models as user_models
 from django.utils import timezone
-from common import permissions
+from django.conf import settings
+from common import permissions, conditional
+from common.idempotency import idempotent
+from common.uploads import UploadSizeLimitMixin
 from common.utils import Role
+import tempfile
 import decimal
+import uuid
+import csv
+import io
 
 
 class GoodsListAPIView(generics.ListAPIView):
-    queryset = models.Goods.objects.all()
+    queryset = models.Goods.catalog.all()
     serializer_class = serializers.GoodsListSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = filters.GoodsListFilter
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        cache_key = catalog_cache.make_key(request, 'goods_list')
+        etag = catalog_cache.get_etag(cache_key)
+        not_modified = conditional.get_not_modified(request, 'goods_list', etag)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if not_modified is not None:
+            return not_modified
+
+        data = catalog_cache.load(cache_key)
+
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            serializer = self.get_serializer(page, many=True)
+            data = self.get_paginated_response(serializer.data).data
 
+            catalog_cache.store(cache_key, data)
 
-class GoodsViewSet(viewsets.ModelViewSet):
+        return conditional.set_validators(Response(data, status=status.HTTP_200_OK), etag)
+
+
+class GoodsFacetsAPIView(generics.GenericAPIView):
     queryset = models.Goods.objects.all()
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = filters.GoodsListFilter
+
+    price_buckets_query_param = 'price_buckets'
+    # info! каждая граница добавляет FILTER в агрегат, поэтому их число ограничено
+    max_price_buckets = 20
+
+    def get(self, request, *args, **kwargs):
+        cache_key = catalog_cache.make_key(request, 'goods_facets')
+        etag = catalog_cache.get_etag(cache_key)
+        not_modified = conditional.get_not_modified(request, 'goods_facets', etag)
+
+        if not_modified is not None:
+            return not_modified
+
+        try:
+            price_buckets = self.get_price_buckets(request)
+        except (decimal.InvalidOperation, ValueError):
+            return Response({self.price_buckets_query_param: [f'expected at most {self.max_price_buckets} '
+                                                              f'ascending comma-separated prices']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        data = catalog_cache.load(cache_key)
+
+        if data is None:
+            data = self.get_facets(self.filter_queryset(self.get_queryset()), price_buckets)
+
+            catalog_cache.store(cache_key, data)
+
+        return conditional.set_validators(Response(data, status=status.HTTP_200_OK), etag)
+
+    def get_price_buckets(self, request):
+        raw = request.query_params.get(self.price_buckets_query_param)
+
+        if not raw:
+            return tuple(decimal.Decimal(bound) for bound in settings.GOODS_PRICE_BUCKETS)
+
+        raw_bounds = raw.split(',')
+
+        if len(raw_bounds) > self.max_price_buckets:
+            raise ValueError(f'no more than {self.max_price_buckets} price buckets')
+
+        bounds = tuple(decimal.Decimal(bound.strip()) for bound in raw_bounds)
+
+        if any(not bound.is_finite() or bound < 0 for bound in bounds) or list(bounds) != sorted(set(bounds)):
+            raise ValueError('price buckets must be ascending non-negative numbers')
+
+        return bounds
+
+    # info! все счетчики считаются одним агрегатом с FILTER по отфильтрованному каталогу, без группировки в python
+    @staticmethod
+    def get_facets(queryset, price_buckets):
+        upper_bounds = price_buckets[1:] + (None,)
+        counters = {'total': dj_model.Count('pk')}
+
+        for value, _ in models.TypeGoods.choices:
+            counters[f'type_{value}'] = dj_model.Count('pk', filter=dj_model.Q(type_goods=value))
+
+        counters['in_stock'] = dj_model.Count('pk', filter=dj_model.Q(amount_in_stock__gt=0))
+        counters['out_of_stock'] = dj_model.Count('pk', filter=dj_model.Q(amount_in_stock=0))
+
+        for i, (lower, upper) in enumerate(zip(price_buckets, upper_bounds)):
+            bucket = prices.price_filter(gte=lower, **({'lt': upper} if upper is not None else {}))
+            counters[f'price_{i}'] = dj_model.Count('pk', filter=bucket)
+
+        counts = queryset.aggregate(**counters)
+
+        return {
+            'total': counts['total'],
+            'type_goods': [{'value': value, 'label': label, 'count': counts[f'type_{value}']}
+                           for value, label in models.TypeGoods.choices],
+            'in_stock': [{'value': True, 'count': counts['in_stock']},
+                         {'value': False, 'count': counts['out_of_stock']}],
+            'price': [{'min': str(lower),
+                       'max': str(upper) if upper is not None else None,
+                       'count': counts[f'price_{i}']}
+                      for i, (lower, upper) in enumerate(zip(price_buckets, upper_bounds))],
+        }
+
+
+class GoodsViewSet(UploadSizeLimitMixin, viewsets.ModelViewSet):
+    queryset = models.Goods.catalog.all()
     serializer_class = serializers.GoodsSerializer
     permission_classes = (permissions.IsPharmacistOrSuperUser,)
     lookup_field = 'name'
 
     http_method_names = ('get', 'post', 'put', 'delete',)
+    max_upload_size_MB = 3
 
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -42,15 +152,26 @@ class GoodsViewSet(viewsets.ModelViewSet):
 
     def retrieve(self, request, *args, **kwargs):
         name_goods = kwargs.get('name', None)
+        cache_key = catalog_cache.make_key(request, 'goods_detail', name_goods)
+        etag = catalog_cache.get_etag(cache_key)
+        not_modified = conditional.get_not_modified(request, 'goods_detail', etag)
 
-        try:
-            goods = self.get_queryset().get(name=name_goods)
-        except ObjectDoesNotExist:
-            return Response({'detail': 'goods not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not_modified is not None:
+            return not_modified
 
-        serializer = self.get_serializer(goods)
+        data = catalog_cache.load(cache_key)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if data is None:
+            try:
+                goods = self.get_queryset().get(name=name_goods)
+            except ObjectDoesNotExist:
+                return Response({'detail': 'goods not found'}, status=status.HTTP_404_NOT_FOUND)
+
+            data = self.get_serializer(goods).data
+
+            catalog_cache.store(cache_key, data)
+
+        return conditional.set_validators(Response(data, status=status.HTTP_200_OK), etag)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -80,7 +201,7 @@ class GoodsViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             price = serializer.validated_data.get('price')
 
-            if price < 0:
+            if price is not None and price < 0:
                 return Response({'price': ['price is negative']}, status=status.HTTP_400_BAD_REQUEST)
 
             updated_goods = serializer.save()
@@ -103,6 +224,152 @@ class GoodsViewSet(viewsets.ModelViewSet):
         return Response({'message': f'goods {str_goods} successfully deleted'}, status=status.HTTP_204_NO_CONTENT)
 
 
+class GoodsImportAPIView(generics.GenericAPIView):
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file', None)
+
+        if upload is None:
+            return Response({'file': ['file is required']}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('format') or goods_import.detect_format(upload.name)
+
+        if file_format not in goods_import.FORMATS:
+            return Response({'format': [f'format must be one of {goods_import.FORMATS}']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # info! загруженный файл и отчет об ошибках читаются и пишутся потоком, без загрузки целиком в память
+        with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as errors_stream:
+            try:
+                result = goods_import.import_goods(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                                                   file_format, errors_stream)
+            except (UnicodeDecodeError, csv.Error) as error:
+                return Response({'detail': f'import failed: {error}'}, status=status.HTTP_400_BAD_REQUEST)
+
+            if result['failed']:
+                report = uuid.uuid4()
+                errors_stream.seek(0)
+                storages[goods_import.ERRORS_STORAGE].save(goods_import.errors_file_name(report), File(errors_stream))
+                result['errors_file'] = request.build_absolute_uri(reverse('goods_import_errors',
+                                                                           kwargs={'report': report}))
+
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+class GoodsImportErrorsAPIView(generics.GenericAPIView):
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+
+    def get(self, request, *args, **kwargs):
+        report = kwargs.get('report', None)
+        storage = storages[goods_import.ERRORS_STORAGE]
+        errors_name = goods_import.errors_file_name(report)
+
+        if not storage.exists(errors_name):
+            return Response({'detail': 'report not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return FileResponse(storage.open(errors_name, 'rb'), as_attachment=True,
+                            filename=f'{report}.errors.csv', content_type='text/csv')
+
+
+class GoodsStockAPIView(generics.GenericAPIView):
+    serializer_class = serializers.StockAdjustmentSerializer
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+
+        if serializer.is_valid():
+            results = stock.adjust_stock(serializer.validated_data['items'])
+            updated = sum(result['status'] == stock.StockStatus.UPDATED for result in results)
+
+            return Response({'updated': updated, 'results': results}, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# info! ход рассылки уведомлений о новой акции
+class PromotionFanOutAPIView(generics.RetrieveAPIView):
+    queryset = models.PromotionFanOut.objects.all()
+    serializer_class = serializers.PromotionFanOutSerializer
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+    lookup_field = 'promotion'
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            fan_out = self.get_queryset().get(promotion=kwargs.get('promotion', None))
+        except ObjectDoesNotExist:
+            return Response({'detail': 'promotion notifications not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = self.get_serializer(fan_out)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# info! отчеты по продажам строятся только по сводкам SalesDaily, без обращения к покупкам
+class SalesReportAPIView(generics.GenericAPIView):
+    serializer_class = serializers.SalesReportQuerySerializer
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+
+    def get(self, request, *args, **kwargs):
+        name_report = kwargs.get('report', None)
+
+        if name_report not in sales_rollup.REPORTS:
+            return Response({'detail': 'report not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        report, _ = sales_rollup.REPORTS[name_report]
+        serializer = self.get_serializer(data=request.query_params,
+                                         context={**self.get_serializer_context(), 'report': name_report})
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = report(**serializer.validated_data)
+
+        return Response({'date_from': serializer.validated_data['date_from'],
+                         'date_to': serializer.validated_data['date_to'],
+                         'results': serializers.SalesReportSerializer(rows, many=True).data},
+                        status=status.HTTP_200_OK)
+
+
+class LowStockAPIView(generics.ListAPIView):
+    queryset = low_stock.get_low_stock().order_by('pk')
+    serializer_class = serializers.LowStockGoodsSerializer
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = serializers.LowStockThresholdSerializer(data=request.data)
+
+        if serializer.is_valid():
+            updated = low_stock.set_threshold(**serializer.validated_data)
+
+            return Response({'updated': updated}, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ExportAPIView(generics.GenericAPIView):
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+
+    def get(self, request, *args, **kwargs):
+        dataset = kwargs.get('dataset', None)
+        file_format = kwargs.get('file_format', None)
+
+        if dataset not in exports.DATASETS:
+            return Response({'detail': 'dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if file_format not in exports.FORMATS:
+            return Response({'detail': f'format must be one of {exports.FORMATS}'}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(exports.stream_rows(dataset, file_format),
+                                         content_type=exports.CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+
+        return response
+
+
 class PromotionViewSet(viewsets.ModelViewSet):
     queryset = models.Promotion.objects.all()
     serializer_class = serializers.PromotionSerializer
@@ -118,10 +385,11 @@ class PromotionViewSet(viewsets.ModelViewSet):
         return (permission() for permission in self.permission_classes)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        queryset = self.get_queryset().select_related('promotion_goods')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         pk_promotion = kwargs.get('pk', None)
@@ -147,11 +415,17 @@ class PromotionViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             promotion_goods = serializer.validated_data.get('promotion_goods')
 
-            if self.get_queryset().filter(promotion_goods=promotion_goods,
-                                          time_end_promotion__gt=timezone.now()).exists():
-                return Response({'detail': 'promotion goods already exists'}, status=status.HTTP_400_BAD_REQUEST)
+            # info! строка товара блокируется, чтобы параллельные запросы не создали две действующие акции
+            #  на один товар. Проверка идет по базе: индекс акций в памяти процесса может отставать
+            with transaction.atomic():
+                models.Goods.objects.select_for_update().filter(pk=promotion_goods.pk).first()
+
+                if self.get_queryset().filter(promotion_goods=promotion_goods,
+                                              time_end_promotion__gt=timezone.now()).exists():
+                    return Response({'detail': 'promotion goods already exists'},
+                                    status=status.HTTP_400_BAD_REQUEST)
 
-            new_promotion = serializer.save()
+                new_promotion = serializer.save()
 
             return Response({'message': f'promotion {new_promotion} successfully created'},
                             status=status.HTTP_201_CREATED)
@@ -169,12 +443,18 @@ class PromotionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(promotion, data=request.data, partial=True)
 
         if serializer.is_valid():
-            if self.get_queryset().filter(~dj_model.Q(pk=promotion.pk),
-                                          promotion_goods=promotion.promotion_goods,
-                                          time_end_promotion__gt=timezone.now()).exists():
-                return Response({'detail': 'promotion goods already exists'}, status=status.HTTP_400_BAD_REQUEST)
+            promotion_goods = serializer.validated_data.get('promotion_goods', promotion.promotion_goods)
 
-            updated_goods = serializer.save()
+            with transaction.atomic():
+                models.Goods.objects.select_for_update().filter(pk=promotion_goods.pk).first()
+
+                if self.get_queryset().filter(~dj_model.Q(pk=promotion.pk),
+                                              promotion_goods=promotion_goods,
+                                              time_end_promotion__gt=timezone.now()).exists():
+                    return Response({'detail': 'promotion goods already exists'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+
+                updated_goods = serializer.save()
 
             return Response({'message': f'promotion {updated_goods} successfully edit'}, status=status.HTTP_200_OK)
 
@@ -216,10 +496,11 @@ class GoodsReviewViewSet(viewsets.ModelViewSet):
         except ObjectDoesNotExist:
             return Response({'detail': 'goods not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        queryset = self.get_queryset().filter(goods_review=goods)
-        serializer = self.get_serializer(queryset, many=True)
+        queryset = self.get_queryset().select_related('goods_review').filter(goods_review=goods)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         pk_review = kwargs.get('pk', None)
@@ -246,7 +527,9 @@ class GoodsReviewViewSet(viewsets.ModelViewSet):
 
         if serializer.is_valid():
             try:
-                new_review = serializer.save(goods_review=goods, wrote=me)
+                with transaction.atomic():
+                    new_review = serializer.save(goods_review=goods, wrote=me)
+                    models.GoodsRatingStats.apply_review(goods.pk, new_grade=new_review.grade)
             except IntegrityError:
                 return Response({'detail': 'review already exists'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -258,36 +541,47 @@ class GoodsReviewViewSet(viewsets.ModelViewSet):
         pk_review = kwargs.get('pk', None)
         me = request.user
 
-        try:
-            review = self.get_queryset().get(pk=pk_review)
-        except ObjectDoesNotExist:
-            return Response({'detail': 'review not found'}, status=status.HTTP_404_NOT_FOUND)
+        # info! строка отзыва блокируется до чтения старой оценки, чтобы параллельные изменения и удаление
+        #  одного отзыва не применили к статистике оценок разницу от устаревшей оценки
+        with transaction.atomic():
+            try:
+                review = self.get_queryset().select_for_update().get(pk=pk_review)
+            except ObjectDoesNotExist:
+                return Response({'detail': 'review not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if review.wrote != me:
-            return Response({'detail': 'you can\'t change someone else\'s review'}, status=status.HTTP_403_FORBIDDEN)
+            if review.wrote != me:
+                return Response({'detail': 'you can\'t change someone else\'s review'},
+                                status=status.HTTP_403_FORBIDDEN)
 
-        serializer = self.get_serializer(review, data=request.data, partial=True)
+            serializer = self.get_serializer(review, data=request.data, partial=True)
 
-        if serializer.is_valid():
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            old_grade = review.grade
             updated_review = serializer.save()
-            return Response({'message': f'review {updated_review} successfully edit'}, status=status.HTTP_200_OK)
+            models.GoodsRatingStats.apply_review(updated_review.goods_review_id,
+                                                 old_grade=old_grade, new_grade=updated_review.grade)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': f'review {updated_review} successfully edit'}, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
         pk_review = kwargs.get('pk', None)
         me = request.user
 
-        try:
-            review = self.get_queryset().get(pk=pk_review)
-        except ObjectDoesNotExist:
-            return Response({'detail': 'review not found'}, status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            try:
+                review = self.get_queryset().select_for_update().get(pk=pk_review)
+            except ObjectDoesNotExist:
+                return Response({'detail': 'review not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if review.wrote != me:
-            return Response({'detail': 'you can\'t delete someone else\'s review'}, status=status.HTTP_403_FORBIDDEN)
+            if review.wrote != me:
+                return Response({'detail': 'you can\'t delete someone else\'s review'},
+                                status=status.HTTP_403_FORBIDDEN)
 
-        str_review = f'{review}'
-        review.delete()
+            str_review = f'{review}'
+            review.delete()
+            models.GoodsRatingStats.apply_review(review.goods_review_id, old_grade=review.grade)
 
         return Response({'message': f'review {str_review} successfully deleted'}, status=status.HTTP_204_NO_CONTENT)
 
@@ -381,9 +675,10 @@ class PurchaseViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'user not found'}, status=status.HTTP_404_NOT_FOUND)
 
         queryset = self.get_queryset().filter(user_buy=purchase_user)
-        serializer = self.get_serializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         purchase_pk = kwargs.get('pk', None)
@@ -397,6 +692,7 @@ class PurchaseViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
 
@@ -430,97 +726,25 @@ class PurchaseViewSet(viewsets.ModelViewSet):
 
         return Response({'message': f'purchase successfully deleted {str_purchase}'}, status=status.HTTP_204_NO_CONTENT)
 
+    @idempotent
     def post_buy(self, request, *args, **kwargs):
         purchase_pk = kwargs.get('pk', None)
         me = request.user
 
-        try:
-            purchase = self.get_queryset().get(pk=purchase_pk)
-        except ObjectDoesNotExist:
-            return Response({'detail': 'purchase not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        if me != purchase.user_buy:
-            return Response({'detail': 'you can\'t pay for someone else\'s purchase'},
-                            status=status.HTTP_403_FORBIDDEN)
-
-        if purchase.is_paid:
-            return Response({'detail': 'the purchase has already been paid for'},
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        now = timezone.now()
-        purchase_goods = models.PurchaseGoods.objects.filter(purchase=purchase)
-        current_total_price = decimal.Decimal('0')
-
-        for pg in purchase_goods:
-            promotions = pg.goods_purchase.promotion_goods_fk.filter(time_end_promotion__gt=now)
-
-            if promotions.exists():
-                latest_promotion = promotions.first()
-                discounted_price = (pg.goods_purchase.price *
-                                    decimal.Decimal(1 - (latest_promotion.promotion_percentage / 100)
-                                                    ).quantize(decimal.Decimal('0.01')))
-            else:
-                discounted_price = pg.goods_purchase.price
-
-            discounted_total_price = pg.amount * discounted_price
-            current_total_price += discounted_total_price
-
-        current_total_price = current_total_price.quantize(decimal.Decimal('0.01'))
-
         paid_with_bonuses = request.data.get('paid_with_bonuses', 0)
 
-        if not isinstance(paid_with_bonuses, (float, int,)):
+        if not isinstance(paid_with_bonuses, int) or isinstance(paid_with_bonuses, bool):
             return Response({'paid_with_bonuses': ['paid_with_bonuses must be a number']},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        if models.LoyaltyCard.objects.get(user_card=me).bonuses < paid_with_bonuses:
-            return Response({'detail': 'you don\'t have that many bonuses on your loyalty card'},
-                            status=status.HTTP_400_BAD_REQUEST)
-
         if paid_with_bonuses < 0:
             return Response({'paid_with_bonuses': ['paid_with_bonuses is negative number']},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # info только 25% покупки можно оплатить бонусами
-        if current_total_price * decimal.Decimal('0.25') < paid_with_bonuses * models.LoyaltyCard.BONUS_IN_CURRENCY:
-            return Response({'detail': 'no more than 25% of the purchase can be paid with bonuses'},
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        balance = me.balance
-
-        if balance < current_total_price - paid_with_bonuses * models.LoyaltyCard.BONUS_IN_CURRENCY:
-            return Response({'detail': 'insufficient funds to purchase'}, status=status.HTTP_400_BAD_REQUEST)
-
-        not_available = (models.PurchaseGoods.objects
-                         .filter(purchase=purchase,
-                                 goods_purchase__amount_in_stock__lt=dj_model.F('amount')
-                                 ).values_list('pk', flat=True))
-
-        if len(not_available):
-            return Response({'detail': f'the following items are not available in such quantities in the purchase: '
-                                       f'{list(not_available)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
         try:
-            purchase_goods = models.PurchaseGoods.objects.filter(purchase=purchase).prefetch_related('goods_purchase')
-
-            with transaction.atomic():
-                for pg in purchase_goods:
-                    pg.goods_purchase.amount_in_stock -= pg.amount
-                    pg.goods_purchase.save()
-        except DatabaseError:
-            return Response({'detail': 'error when reserving product for purchase'},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        me.balance -= current_total_price - paid_with_bonuses * models.LoyaltyCard.BONUS_IN_CURRENCY
-        models.LoyaltyCard.objects.filter(user_card=me).update(bonuses=dj_model.F('bonuses') - paid_with_bonuses)
-
-        purchase.is_paid = True
-        purchase.date_buy = timezone.now()
-        purchase.paid_with_bonuses = paid_with_bonuses
-        purchase.total_amount = current_total_price - paid_with_bonuses * models.LoyaltyCard.BONUS_IN_CURRENCY
-
-        me.save()
-        purchase.save()
+            purchase = checkout.pay(purchase_pk, me, paid_with_bonuses)
+        except checkout.CheckoutError as error:
+            return Response({'detail': error.detail}, status=error.status_code)
 
         return Response({'message': f'purchase {purchase} is successfully paid'}, status=status.HTTP_201_CREATED)
 
@@ -550,6 +774,43 @@ class PurchaseViewSet(viewsets.ModelViewSet):
         return Response({'message': f'purchase successfully delivered {purchase}'}, status=status.HTTP_201_CREATED)
 
 
+# info! очередь выдачи от самых старых покупок, строки покупок и названия товаров загружаются вторым запросом
+class FulfillmentQueueAPIView(generics.ListAPIView):
+    queryset = (models.Purchase.objects
+                .filter(is_paid=True, goods_is_received=False)
+                .order_by('date_buy')
+                .select_related('user_buy')
+                .only('pk', 'date_buy', 'total_price', 'user_buy__username')
+                .prefetch_related(dj_model.Prefetch('purchase_fk', queryset=(models.PurchaseGoods.objects
+                                                                             .select_related('goods_purchase')
+                                                                             .only('purchase', 'amount',
+                                                                                   'goods_purchase__name')
+                                                                             .order_by('pk')))))
+    serializer_class = serializers.FulfillmentSerializer
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+
+
+class FulfillmentReceivedAPIView(generics.GenericAPIView):
+    serializer_class = serializers.FulfillmentReceivedSerializer
+    permission_classes = (permissions.IsPharmacistOrSuperUser,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        purchases = set(serializer.validated_data['purchases'])
+
+        with transaction.atomic():
+            queue = models.Purchase.objects.filter(pk__in=purchases, is_paid=True, goods_is_received=False)
+            received = sorted(queue.select_for_update().values_list('pk', flat=True))
+            models.Purchase.objects.filter(pk__in=received).update(goods_is_received=True)
+
+        return Response({'received': received, 'skipped': sorted(purchases.difference(received))},
+                        status=status.HTTP_200_OK)
+
+
 class PurchaseGoodsViewSet(viewsets.ModelViewSet):
     queryset = models.PurchaseGoods.objects.all()
     serializer_class = serializers.PurchaseGoodsSerializer
@@ -566,10 +827,12 @@ class PurchaseGoodsViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'purchase not found '}, status=status.HTTP_404_NOT_FOUND)
 
         queryset = self.get_queryset().filter(purchase=purchase)
-        serializer = self.get_serializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         purchase_pk = kwargs.get('pk', None)
         goods_name = kwargs.get('goods', None)
@@ -598,11 +861,18 @@ class PurchaseGoodsViewSet(viewsets.ModelViewSet):
                 return Response({'detail': 'you cannot change items in someone else\'s purchase'},
                                 status=status.HTTP_403_FORBIDDEN)
 
-            if goods.amount_in_stock < amount_in_stock:
-                return Response({'detail': 'there is not enough goods in stock'}, status=status.HTTP_400_BAD_REQUEST)
-
             try:
-                new_purchase_goods = serializer.save(purchase=purchase, goods_purchase=goods)
+                with transaction.atomic():
+                    if models.Purchase.objects.select_for_update().get(pk=purchase.pk).is_paid:
+                        return Response({'detail': 'paid purchase cannot be changed'},
+                                        status=status.HTTP_400_BAD_REQUEST)
+
+                    if reservations.get_available(purchase, (goods.pk,))[goods.pk] < amount_in_stock:
+                        return Response({'detail': 'there is not enough goods in stock'},
+                                        status=status.HTTP_400_BAD_REQUEST)
+
+                    new_purchase_goods = serializer.save(purchase=purchase, goods_purchase=goods)
+                    reservations.place(purchase, {goods.pk: amount_in_stock})
             except IntegrityError:
                 return Response({'detail': 'purchase already has goods'},  status=status.HTTP_400_BAD_REQUEST)
 
@@ -612,6 +882,38 @@ class PurchaseGoodsViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @idempotent
+    def bulk_edit(self, request, *args, **kwargs):
+        purchase_pk = kwargs.get('pk', None)
+        me = request.user
+
+        try:
+            purchase = models.Purchase.objects.get(pk=purchase_pk)
+        except ObjectDoesNotExist:
+            return Response({'detail': 'purchase not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if purchase.is_paid:
+            return Response({'detail': 'paid purchase cannot be changed'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if purchase.user_buy != me:
+            return Response({'detail': 'you cannot change items in someone else\'s purchase'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        serializer = serializers.CartEditSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            errors = cart.edit_cart(purchase, serializer.validated_data['operations'])
+        except cart.CartError as error:
+            return Response({'detail': error.detail}, status=error.status_code)
+
+        if errors:
+            return Response({'operations': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(serializers.CartSerializer(cart.get_cart(purchase)).data, status=status.HTTP_200_OK)
+
     def update(self, request, *args, **kwargs):
         purchase_pk = kwargs.get('pk', None)
         goods_name = kwargs.get('goods', None)
@@ -638,10 +940,16 @@ class PurchaseGoodsViewSet(viewsets.ModelViewSet):
         if new_amount <= 0:
             return Response({'new_amount': ['select at least one goods']}, status=status.HTTP_400_BAD_REQUEST)
 
-        if goods.amount_in_stock < new_amount:
-            return Response({'detail': 'there is not enough goods in stock'}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            if models.Purchase.objects.select_for_update().get(pk=purchase.pk).is_paid:
+                return Response({'detail': 'a paid purchase cannot be supplemented'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            if reservations.get_available(purchase, (goods.pk,))[goods.pk] < new_amount:
+                return Response({'detail': 'there is not enough goods in stock'}, status=status.HTTP_400_BAD_REQUEST)
 
-        self.get_queryset().filter(purchase=purchase, goods_purchase=goods).update(amount=new_amount)
+            if self.get_queryset().filter(purchase=purchase, goods_purchase=goods).update(amount=new_amount):
+                reservations.place(purchase, {goods.pk: new_amount})
 
         return Response({'message': f'successfully changed the amount of goods {new_amount}'},
                         status=status.HTTP_200_OK)
@@ -668,9 +976,16 @@ class PurchaseGoodsViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'you cannot change the quantity of an item in someone else\'s purchase'},
                             status=status.HTTP_403_FORBIDDEN)
 
-        try:
-            self.get_queryset().get(purchase=purchase, goods_purchase=goods).delete()
-        except ObjectDoesNotExist:
-            return Response({'detail': 'goods in purchase not found'}, status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            if models.Purchase.objects.select_for_update().get(pk=purchase.pk).is_paid:
+                return Response({'detail': 'a paid purchase cannot be supplemented'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                self.get_queryset().get(purchase=purchase, goods_purchase=goods).delete()
+            except ObjectDoesNotExist:
+                return Response({'detail': 'goods in purchase not found'}, status=status.HTTP_404_NOT_FOUND)
+
+            reservations.release(purchase, (goods.pk,))
 
         return Response({'message': f'successfully delete goods in {purchase}'}, status=status.HTTP_204_NO_CONTENT)
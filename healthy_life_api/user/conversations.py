@@ -0,0 +1,71 @@
+from django.db.models.functions import Greatest
+from django.db import connection
+from django.db.models import F, Q
+from user import models
+
+
+def get_chats(user):
+    return models.Conversation.objects.filter(owner=user).order_by('-last_message_date')
+
+
+# info! одна вставка на обе стороны переписки: отправителю сообщение уже прочитано, получателю добавляется
+#  непрочитанное. Последнее сообщение меняется, только если оно новее сохраненного, на случай если
+#  параллельная отправка зафиксировалась позже. Вызывать в той же транзакции, что и создание сообщения
+def message_sent(message):
+    sides = {message.wrote_id: (message.received_id, 0)}
+    sides[message.received_id] = (message.wrote_id, 1)
+
+    rows = [(owner, user_with, message.pk, message.message, message.date_create, not_read)
+            for owner, (user_with, not_read) in sides.items()]
+
+    newer = ('(EXCLUDED.last_message_date, EXCLUDED.last_message_id) '
+             '> (conversation.last_message_date, conversation.last_message_id)')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            INSERT INTO {models.Conversation._meta.db_table} AS conversation
+                (owner_id, user_with_id, last_message_id, last_message_text, last_message_date, amount_not_read)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))}
+            ON CONFLICT (owner_id, user_with_id) DO UPDATE
+            SET last_message_id = CASE WHEN {newer} THEN EXCLUDED.last_message_id
+                                       ELSE conversation.last_message_id END,
+                last_message_text = CASE WHEN {newer} THEN EXCLUDED.last_message_text
+                                         ELSE conversation.last_message_text END,
+                last_message_date = CASE WHEN {newer} THEN EXCLUDED.last_message_date
+                                         ELSE conversation.last_message_date END,
+                amount_not_read = conversation.amount_not_read + EXCLUDED.amount_not_read
+        ''', [value for row in rows for value in row])
+
+
+def message_read(message):
+    (models.Conversation.objects
+     .filter(owner=message.received_id, user_with=message.wrote_id)
+     .update(amount_not_read=Greatest(F('amount_not_read') - 1, 0)))
+
+
+def message_changed(message):
+    models.Conversation.objects.filter(last_message=message).update(last_message_text=message.message)
+
+
+# info! если удалено последнее сообщение, последним становится предыдущее видимое, а переписка без видимых
+#  сообщений пропадает из списка чатов обоих собеседников
+def message_deleted(message):
+    if not message.it_read:
+        message_read(message)
+
+    if not models.Conversation.objects.filter(last_message=message).exists():
+        return
+
+    chat = (Q(owner=message.wrote_id, user_with=message.received_id) |
+            Q(owner=message.received_id, user_with=message.wrote_id))
+    previous = (models.PrivateMessage.displayed
+                .filter(Q(wrote=message.wrote_id, received=message.received_id) |
+                        Q(wrote=message.received_id, received=message.wrote_id))
+                .order_by('-date_create', '-pk')
+                .first())
+
+    if previous is None:
+        models.Conversation.objects.filter(chat).delete()
+    else:
+        models.Conversation.objects.filter(chat).update(last_message=previous, last_message_text=previous.message,
+                                                        last_message_date=previous.date_create)
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='settings',
+            index=models.Index(condition=models.Q(('receive_notifications_about_discounts', True)), fields=['user_settings'], name='settings_discounts_subscr_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_settings_discounts_subscr_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_text', models.TextField(max_length=4096, verbose_name='text of last message')),
+                ('last_message_date', models.DateTimeField(verbose_name='time of last message')),
+                ('amount_not_read', models.PositiveIntegerField(default=0, verbose_name='amount of unread messages')),
+                ('last_message', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='conversation_last_message_fk', to='user.privatemessage', verbose_name='last message')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_owner_fk', to=settings.AUTH_USER_MODEL, verbose_name='owner of chat list')),
+                ('user_with', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_with_fk', to=settings.AUTH_USER_MODEL, verbose_name='interlocutor')),
+            ],
+            options={
+                'verbose_name': 'conversation',
+                'verbose_name_plural': 'conversations',
+                'indexes': [models.Index(fields=['owner', '-last_message_date', '-id'], name='conversation_activity_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'user_with'), name='conversation_UQ'), models.CheckConstraint(condition=models.Q(('amount_not_read__gte', 0)), name='conversation_not_read_CK')],
+            },
+        ),
+        migrations.RunSQL(
+            sql='''
+                INSERT INTO user_conversation (owner_id, user_with_id, last_message_id, last_message_text,
+                                               last_message_date, amount_not_read)
+                SELECT DISTINCT ON (owner_id, user_with_id)
+                       owner_id, user_with_id, id, message, date_create,
+                       COUNT(*) FILTER (WHERE received_id = owner_id AND NOT it_read)
+                           OVER (PARTITION BY owner_id, user_with_id)
+                FROM (
+                    SELECT wrote_id AS owner_id, received_id AS user_with_id, * FROM user_privatemessage
+                    WHERE status = 0
+                    UNION ALL
+                    SELECT received_id, wrote_id, * FROM user_privatemessage
+                    WHERE status = 0 AND received_id <> wrote_id
+                ) AS messages
+                ORDER BY owner_id, user_with_id, date_create DESC, id DESC;
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
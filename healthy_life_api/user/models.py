@@ -33,6 +33,10 @@ class User(AbstractUser):
 
 class Settings(models.Model):
     class Meta:
+        indexes = [
+            models.Index(fields=('user_settings',), condition=models.Q(receive_notifications_about_discounts=True),
+                         name='settings_discounts_subscr_idx'),
+        ]
         verbose_name = 'settings'
         verbose_name_plural = 'settings'
 
@@ -58,6 +62,36 @@ class PrivateMessage(IMessage):
     it_read = models.BooleanField(default=False, verbose_name='read')
 
 
+# info! сводка переписки для списка чатов: по строке на каждого собеседника у каждого пользователя,
+#  обновляется в user.conversations при отправке, прочтении, изменении и удалении личных сообщений
+class Conversation(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('owner', 'user_with'), name='conversation_UQ'),
+            models.CheckConstraint(check=models.Q(amount_not_read__gte=0), name='conversation_not_read_CK'),
+        ]
+        indexes = [
+            models.Index(fields=('owner', '-last_message_date', '-id'), name='conversation_activity_idx'),
+        ]
+        verbose_name = 'conversation'
+        verbose_name_plural = 'conversations'
+
+    owner = models.ForeignKey(AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversation_owner_fk',
+                              verbose_name='owner of chat list')
+    user_with = models.ForeignKey(AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversation_with_fk',
+                                  verbose_name='interlocutor')
+    last_message = models.ForeignKey(PrivateMessage, null=True, on_delete=models.SET_NULL,
+                                     related_name='conversation_last_message_fk', verbose_name='last message')
+    last_message_text = models.TextField(max_length=4_096, verbose_name='text of last message')
+    last_message_date = models.DateTimeField(verbose_name='time of last message')
+    amount_not_read = models.PositiveIntegerField(default=0, verbose_name='amount of unread messages')
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f'@\'{self.pk}\''
+
+
 class Friend(models.Model):
     class Meta:
         verbose_name = 'friend'
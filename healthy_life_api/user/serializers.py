@@ -1,8 +1,8 @@
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth.models import Group
-from django.db import models as dj_models
 from rest_framework import serializers
 from common.utils import Role
+from common.serializers import ImageVariantsField
 from common import validators
 from user import models
 
@@ -21,11 +21,14 @@ class ProfileSerializer(serializers.ModelSerializer):
     background = serializers.ImageField(validators=[lambda image: validators.validate_image(image,
                                                                                             5, 64,
                                                                                             1920, 1080)])
+    avatar_variants = ImageVariantsField(source='avatar')
+    background_variants = ImageVariantsField(source='background')
 
     class Meta:
         model = models.User
-        fields = ('username', 'first_name', 'last_name', 'about', 'avatar', 'background', 'date_joined',)
-        read_only_fields = ('username', 'date_joined',)
+        fields = ('username', 'first_name', 'last_name', 'about', 'avatar', 'avatar_variants',
+                  'background', 'background_variants', 'date_joined',)
+        read_only_fields = ('username', 'avatar_variants', 'background_variants', 'date_joined',)
 
 
 class BalanceSerializer(serializers.ModelSerializer):
@@ -117,11 +120,12 @@ class AwardSerializer(serializers.ModelSerializer):
     image = serializers.ImageField(validators=[lambda image: validators.validate_image(image,
                                                                                        1, 64,
                                                                                        200, 200)])
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = models.Awards
-        fields = ('pk', 'image', 'description',)
-        read_only_fields = ('pk',)
+        fields = ('pk', 'image', 'image_variants', 'description',)
+        read_only_fields = ('pk', 'image_variants',)
 
 
 class AwardUserListSerializer(serializers.ModelSerializer):
@@ -153,31 +157,12 @@ class BanCommunicationSerializer(serializers.ModelSerializer):
         read_only_fields = ('pk', 'got_banned', 'banned_date', 'active',)
 
 
-class ChatSerializer(serializers.Serializer):
-    user_with = serializers.PKOnlyObject(pk=serializers.IntegerField())
-    last_message = serializers.CharField()
-    amount_not_read = serializers.IntegerField(default=0)
-
-    def to_representation(self, id_user_with_chat):
-        me = self.context['request'].user
-
-        other_user = models.User.objects.get(pk=id_user_with_chat)
-
-        last_message = models.PrivateMessage.displayed.filter(
-            (dj_models.Q(wrote=me) & dj_models.Q(received=other_user)) |
-            (dj_models.Q(wrote=other_user) & dj_models.Q(received=me))
-        ).order_by('-date_create').first()
-
-        unread_count = models.PrivateMessage.displayed.filter(
-            received=me,
-            wrote=other_user,
-            it_read=False
-        ).count()
-        return {
-            'user_with': id_user_with_chat,
-            'last_message_text': last_message.message,
-            'amount_not_read': unread_count,
-        }
+class ChatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Conversation
+        fields = ('user_with', 'last_message', 'last_message_text', 'last_message_date', 'amount_not_read',)
+        read_only_fields = ('user_with', 'last_message', 'last_message_text', 'last_message_date',
+                            'amount_not_read',)
 
 
 class PrivateMessageSerializer(serializers.ModelSerializer):
@@ -3,9 +3,14 @@ from django.contrib.auth.models import Group
 from pharmacy.models import LoyaltyCard
 from django.dispatch import receiver
 from common.utils import Role
+from common import images
 from user import models
 
 
+images.register(models.User, 'avatar', 'background')
+images.register(models.Awards, 'image')
+
+
 @receiver(post_migrate)
 def create_base_roles_if_not_exists(sender, **kwargs):
     Group.objects.get_or_create(name=Role.MODERATOR.value)
@@ -1,3 +1,126 @@
-from django.test import TestCase
+from rest_framework.test import APIClient, APITestCase
+from django.test.utils import CaptureQueriesContext
+from django.test import TransactionTestCase
+from django.db import connection
+from django.urls import reverse
+from user.models import Conversation, PrivateMessage, User
+import importlib
+import threading
 
-# Create your tests here.
+
+class ConversationTest(APITestCase):
+    def setUp(self):
+        self.me = User.objects.create(username='me', email='me@mail.com')
+        self.friend = User.objects.create(username='friend', email='friend@mail.com')
+
+    def _send(self, sender, receiver, message='hello'):
+        self.client.force_authenticate(sender)
+        response = self.client.post(reverse('chat_messages', kwargs={'username': receiver.username}),
+                                    {'message': message}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        return PrivateMessage.objects.latest('pk')
+
+    def _chat(self, owner, user_with):
+        return Conversation.objects.filter(owner=owner, user_with=user_with).first()
+
+    def test_sent_message_is_unread_only_for_recipient_until_read(self):
+        message = self._send(self.friend, self.me)
+
+        self.assertEqual(self._chat(self.me, self.friend).amount_not_read, 1)
+        self.assertEqual(self._chat(self.friend, self.me).amount_not_read, 0)
+
+        self.client.force_authenticate(self.me)
+        for _ in range(2):
+            self.client.patch(reverse('message_action', kwargs={'pk': message.pk}), {}, format='json')
+
+        self.assertEqual(self._chat(self.me, self.friend).amount_not_read, 0)
+
+    def test_deleting_last_message_falls_back_to_previous_then_drops_chat(self):
+        first = self._send(self.me, self.friend, 'first')
+        last = self._send(self.me, self.friend, 'last')
+
+        self.client.delete(reverse('message_action', kwargs={'pk': last.pk}))
+
+        for owner, user_with in ((self.me, self.friend), (self.friend, self.me)):
+            chat = self._chat(owner, user_with)
+            self.assertEqual((chat.last_message_id, chat.last_message_text), (first.pk, 'first'))
+
+        self.assertEqual(self._chat(self.friend, self.me).amount_not_read, 1)
+
+        self.client.delete(reverse('message_action', kwargs={'pk': first.pk}))
+
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_message_to_yourself_is_one_chat(self):
+        self._send(self.me, self.me)
+
+        self.assertEqual(list(Conversation.objects.values_list('owner', 'user_with', 'amount_not_read')),
+                         [(self.me.pk, self.me.pk, 1)])
+
+    def test_chat_list_is_one_query_for_any_number_of_chats(self):
+        for i in range(30):
+            self._send(User.objects.create(username=f'user_{i}', email=f'user_{i}@mail.com'), self.me)
+
+        self.client.force_authenticate(self.me)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('chats'), {'limit': 30})
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([chat['user_with'] for chat in response.data['results']],
+                         list(User.objects.filter(username__startswith='user_').order_by('-pk')
+                              .values_list('pk', flat=True)))
+
+    def test_backfill_matches_maintained_conversations(self):
+        self._send(self.me, self.friend, 'first')
+        read = self._send(self.friend, self.me, 'second')
+        self._send(self.friend, self.me, 'third')
+        self._send(self.me, self.me, 'note')
+        self.client.force_authenticate(self.me)
+        self.client.patch(reverse('message_action', kwargs={'pk': read.pk}), {}, format='json')
+
+        fields = ('owner', 'user_with', 'last_message', 'last_message_text', 'last_message_date', 'amount_not_read')
+        maintained = set(Conversation.objects.values_list(*fields))
+        Conversation.objects.all().delete()
+
+        backfill = importlib.import_module('user.migrations.0003_conversation').Migration.operations[-1]
+        with connection.cursor() as cursor:
+            cursor.execute(backfill.sql)
+
+        self.assertEqual(set(Conversation.objects.values_list(*fields)), maintained)
+
+
+class ConversationConcurrentReadTest(TransactionTestCase):
+    def test_concurrent_reads_decrement_unread_once(self):
+        me = User.objects.create(username='me', email='me@mail.com')
+        friend = User.objects.create(username='friend', email='friend@mail.com')
+        client = APIClient()
+        client.force_authenticate(friend)
+
+        for message in ('first', 'second'):
+            client.post(reverse('chat_messages', kwargs={'username': me.username}), {'message': message},
+                        format='json')
+
+        message = PrivateMessage.objects.earliest('pk')
+        barrier = threading.Barrier(2)
+
+        def read():
+            reader = APIClient()
+            reader.force_authenticate(me)
+            barrier.wait()
+
+            try:
+                reader.patch(reverse('message_action', kwargs={'pk': message.pk}), {}, format='json')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=read) for _ in range(2)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Conversation.objects.get(owner=me, user_with=friend).amount_not_read, 1)
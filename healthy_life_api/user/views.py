@@ -1,12 +1,14 @@
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from common import models as common_models, permissions
+from common import models as common_models, permissions, conditional
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import generics, viewsets, status
 from rest_framework.response import Response
 from django.contrib.auth.models import Group
 from django.db import models as dj_models
-from django.db import IntegrityError
-from user import serializers, models
+from django.db import IntegrityError, transaction
+from user import serializers, models, conversations
+from common.uploads import UploadSizeLimitMixin
+from common.idempotency import idempotent
 from common.utils import Role
 import requests
 import decimal
@@ -34,12 +36,13 @@ class UserAPIView(generics.RetrieveAPIView):
         return Response(serialize.data, status=status.HTTP_200_OK)
 
 
-class ProfileAPIView(generics.RetrieveUpdateAPIView):
+class ProfileAPIView(UploadSizeLimitMixin, generics.RetrieveUpdateAPIView):
     queryset = models.User.objects.all()
     serializer_class = serializers.ProfileSerializer
     lookup_field = 'username'
 
     http_method_names = ('get', 'put',)
+    max_upload_size_MB = 6
 
     def get(self, request, *args, **kwargs):
         username = kwargs.get('username', None)
@@ -145,9 +148,10 @@ class GroupAPIView(generics.ListAPIView,
             return Response({'detail': 'user not found'}, status=status.HTTP_404_NOT_FOUND)
 
         group_user = user.groups.all()
-        serializer = self.get_serializer(group_user, many=True)
+        page = self.paginate_queryset(group_user)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         username = kwargs.get('username', None)
@@ -221,9 +225,10 @@ class FriendAPIView(generics.ListAPIView,
 
         # info! полноценно друзья можно считать только если оба добавили друг друга
         friends_user = models.Friend.objects.filter(friends_user=user).all()
-        serializer = self.get_serializer(friends_user, many=True)
+        page = self.paginate_queryset(friends_user)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         username = kwargs.get('username', None)
@@ -294,9 +299,10 @@ class BlackListAPIView(generics.ListAPIView,
             return Response({'detail': 'you can\'t see someone else\'s blacklist'}, status=status.HTTP_403_FORBIDDEN)
 
         blacklist_user = models.BlackList.objects.filter(user_black_list=user).all()
-        serializer = self.get_serializer(blacklist_user, many=True)
+        page = self.paginate_queryset(blacklist_user)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         username = kwargs.get('username', None)
@@ -340,13 +346,14 @@ class BlackListAPIView(generics.ListAPIView,
                         status=status.HTTP_204_NO_CONTENT)
 
 
-class AwardViewSet(viewsets.ModelViewSet):
+class AwardViewSet(UploadSizeLimitMixin, viewsets.ModelViewSet):
     queryset = models.Awards.objects.all()
     serializer_class = serializers.AwardSerializer
     permission_classes = (IsAdminUser,)
     lookup_field = 'pk'
 
     http_method_names = ('get', 'post', 'put', 'delete',)
+    max_upload_size_MB = 1
 
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -359,9 +366,10 @@ class AwardViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         pk = kwargs.get('pk', None)
@@ -444,10 +452,11 @@ class AwardUserViewSet(viewsets.ModelViewSet):
         except ObjectDoesNotExist:
             return Response({'detail': 'user not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        award_user = models.AwardsUser.objects.filter(award_user=user).all()
-        serializer = self.serializer_class(award_user, many=True)
+        award_user = models.AwardsUser.objects.select_related('award').filter(award_user=user).all()
+        page = self.paginate_queryset(award_user)
+        serializer = self.serializer_class(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         username = kwargs.get('username', None)
@@ -516,9 +525,10 @@ class BanCommunicationViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
-        serializer = serializers.BanCommunicationSerializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = serializers.BanCommunicationSerializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         pk = kwargs.get('pk', None)
@@ -583,21 +593,15 @@ class BanCommunicationViewSet(viewsets.ModelViewSet):
         return Response({'message': f'user {unbanned} unblocked'}, status=status.HTTP_204_NO_CONTENT)
 
 
+# info! список чатов читается из сводки Conversation одним запросом по индексу conversation_activity_idx,
+#  сначала чаты с последней активностью
 class ChatListAPIView(generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
-    queryset = models.PrivateMessage.objects.all()
+    queryset = models.Conversation.objects.all()
     serializer_class = serializers.ChatSerializer
 
-    def list(self, request, *args, **kwargs):
-        wrote = self.get_queryset().filter(received=request.user).values_list('wrote', flat=True)
-        receive = self.get_queryset().filter(wrote=request.user).values_list('received', flat=True)
-        chat_with = wrote.union(receive)
-
-        chat_data = []
-        for user in chat_with:
-            chat_data.append(serializers.ChatSerializer(user, context={'request': request}).data)
-
-        return Response(chat_data, status=status.HTTP_200_OK)
+    def get_queryset(self):
+        return conversations.get_chats(self.request.user)
 
 
 class PrivateMessageViewSet(viewsets.ModelViewSet):
@@ -622,11 +626,12 @@ class PrivateMessageViewSet(viewsets.ModelViewSet):
         messages = models.PrivateMessage.displayed.filter(
             (dj_models.Q(wrote=other_user) & dj_models.Q(received=me)) |
             (dj_models.Q(wrote=me) & dj_models.Q(received=other_user))
-        ).order_by('date_create')
+        ).order_by('pk')
 
-        serializer = serializers.PrivateMessageSerializer(messages, many=True)
+        page = self.paginate_queryset(messages)
+        serializer = serializers.PrivateMessageSerializer(page, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         username = kwargs.get('username', None)
@@ -652,7 +657,10 @@ class PrivateMessageViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid():
-            serializer.save(wrote=me, received=other_user)
+            with transaction.atomic():
+                message = serializer.save(wrote=me, received=other_user)
+                conversations.message_sent(message)
+
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -690,7 +698,10 @@ class PrivateMessageViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(message, data=request.data, partial=True)
 
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                conversations.message_changed(message)
+
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -699,17 +710,22 @@ class PrivateMessageViewSet(viewsets.ModelViewSet):
         pk = kwargs.get('pk', None)
         me = request.user
 
-        try:
-            message = self.get_queryset().get(pk=pk)
-        except ObjectDoesNotExist:
-            return Response({'detail': 'message not found'}, status=status.HTTP_404_NOT_FOUND)
+        # info! строка сообщения блокируется, чтобы параллельные прочтение и удаление не уменьшили
+        #  счетчик непрочитанных в сводке дважды
+        with transaction.atomic():
+            try:
+                message = self.get_queryset().select_for_update().get(pk=pk)
+            except ObjectDoesNotExist:
+                return Response({'detail': 'message not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if message.received != me:
-            return Response({'detail': 'you can\'t mark a message as read by a recipient who is someone else'},
-                            status=status.HTTP_403_FORBIDDEN)
+            if message.received_id != me.pk:
+                return Response({'detail': 'you can\'t mark a message as read by a recipient who is someone else'},
+                                status=status.HTTP_403_FORBIDDEN)
 
-        message.it_read = True
-        message.save()
+            if not message.it_read:
+                message.it_read = True
+                message.save()
+                conversations.message_read(message)
 
         serializer = self.get_serializer(message, data=request.data, partial=True)
 
@@ -722,17 +738,19 @@ class PrivateMessageViewSet(viewsets.ModelViewSet):
         pk = kwargs.get('pk', None)
         me = request.user
 
-        try:
-            message = self.get_queryset().get(pk=pk)
-        except ObjectDoesNotExist:
-            return Response({'detail': 'message not found'}, status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            try:
+                message = self.get_queryset().select_for_update().get(pk=pk)
+            except ObjectDoesNotExist:
+                return Response({'detail': 'message not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if message.wrote != me:
-            return Response({'detail': 'only the one who created it can delete their message'},
-                            status=status.HTTP_403_FORBIDDEN)
+            if message.wrote_id != me.pk:
+                return Response({'detail': 'only the one who created it can delete their message'},
+                                status=status.HTTP_403_FORBIDDEN)
 
-        message.status = common_models.StatusMessage.DELETED
-        message.save()
+            message.status = common_models.StatusMessage.DELETED
+            message.save()
+            conversations.message_deleted(message)
 
         return Response({'message': f'{message} was successfully deleted'}, status=status.HTTP_204_NO_CONTENT)
 
@@ -761,9 +779,20 @@ class NotificationViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_403_FORBIDDEN)
 
         queryset = self.get_queryset().filter(user_notify=user)
-        serializer = self.get_serializer(queryset, many=True)
+        # info! уведомления меняются только отметкой о просмотре, поэтому она входит в etag вместе с количеством
+        state = queryset.aggregate(last_notify=dj_models.Max('date_notify'), total=dj_models.Count('pk'),
+                                   viewed=dj_models.Count('pk', filter=dj_models.Q(viewed=True)))
+        etag = conditional.make_etag(request.build_absolute_uri(), state['last_notify'],
+                                     state['total'], state['viewed'])
+        not_modified = conditional.get_not_modified(request, 'notification_list', etag)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if not_modified is not None:
+            return not_modified
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+
+        return conditional.set_validators(self.get_paginated_response(serializer.data), etag)
 
     def retrieve(self, request, *args, **kwargs):
         pk = kwargs.get('pk', None)
@@ -774,9 +803,15 @@ class NotificationViewSet(viewsets.ModelViewSet):
         except ObjectDoesNotExist:
             return Response({'detail': 'notification not found'}, status=status.HTTP_404_NOT_FOUND)
 
+        etag = conditional.make_etag(notification.pk, notification.viewed)
+        not_modified = conditional.get_not_modified(request, 'notification_detail', etag)
+
+        if not_modified is not None:
+            return not_modified
+
         serializer = self.get_serializer(notification)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional.set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag)
 
     def partial_update(self, request, *args, **kwargs):
         pk = kwargs.get('pk', None)
@@ -815,6 +850,7 @@ class CryptoCloudViewAPI(viewsets.ViewSet):
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @idempotent
     def top_up_balance(self, request, *args, **kwargs):
         replenishment_amount = request.data.get('replenishment_amount_usdt', None)
         me = request.user